@@ -1,21 +1,68 @@
 # app.py
 from flask import Flask, render_template, request, jsonify, Response, send_from_directory, redirect, url_for
 from flask_socketio import SocketIO
+from markupsafe import escape
 import core_logic
 import database
+import whisper_processor
+import audio_archive
+import group_formation
+import seat_store
+import streaming
 import logging
 import os
+import base64
+import json
+import datetime
+import csv
+import io
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 app_logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-socketio = SocketIO(app)
+# streaming.SERVER_MODE es 'threading' con python app.py y 'gevent' con serve.py
+socketio = SocketIO(app, async_mode=streaming.SERVER_MODE)
+# socketio.emit para los hilos en segundo plano (trabajos de transcripción, LLM)
+emit_from_thread = streaming.threadsafe(socketio.emit)
 
 app.config['RECORDS_FOLDER'] = 'records'
-
-with app.app_context():
-    database.init_db()
+# Tamaño máximo del cuerpo de cualquier petición.  Flask lo comprueba al
+# leer el cuerpo, también en subidas chunked sin Content-Length, y responde 413
+MAX_REQUEST_BYTES = 16 * 2**20
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"success": False, "message": "La petición es demasiado grande."}), 413
+
+def _read_body():
+    """Lee el cuerpo entero de la petición.
+
+    request.get_data() corta en silencio un cuerpo chunked que supera
+    MAX_CONTENT_LENGTH; leyendo el stream hasta el final se lanza el 413.
+    """
+    return b''.join(iter(lambda: request.stream.read(64 * 1024), b''))
+
+# Los procesos hijos creados con 'spawn' (pool de Whisper, proceso del LLM)
+# vuelven a ejecutar este módulo como __mp_main__: en ellos no se arrancan los
+# servicios en segundo plano.
+if __name__ != '__mp_main__':
+    with app.app_context():
+        database.init_db()
+        core_logic.recover_incomplete_recordings()
+        # Dejar el modelo Whisper por defecto residente para que la primera
+        # transcripción no pague el tiempo de carga
+        whisper_processor.preload_default_model()
+        # Avisar a los navegadores conectados de cada cambio en los trabajos de transcripción
+        core_logic.TRANSCRIPTION_JOBS.add_listener(lambda job: emit_from_thread('transcription_job', job))
+        core_logic.TRANSCRIPTION_JOBS.start()
+        # Compresión en segundo plano de las grabaciones transcritas y retención de los WAV
+        audio_archive.ARCHIVER.start()
+        # Proceso(s) del LLM para la mejora de transcripciones
+        core_logic.LLM_POOL.start()
+        # Distribución de asientos: guardado diferido y recarga al cambiar los archivos
+        seat_store.SEAT_STORE.start()
 
 @app.route('/')
 def index():
@@ -31,13 +78,13 @@ def group_formation_page():
 
 @app.route('/questionnaire/<student_id>')
 def show_questionnaire(student_id):
-    student = database.get_student_by_id(student_id)
+    student = streaming.run_blocking(database.get_student_by_id, student_id)
     if not student: return "Estudiante no encontrado.", 404
     return render_template('questionnaire.html', student=student, questions=core_logic.ALL_QUESTIONS)
 
 @app.route('/student/<student_id>')
 def student_details(student_id):
-    student_info = database.get_student_details_with_styles(student_id)
+    student_info = streaming.run_blocking(database.get_student_details_with_styles, student_id)
     if not student_info:
         return "Estudiante no encontrado o sin datos de personalidad.", 404
     return render_template('student_detail.html', student=student_info)
@@ -47,25 +94,57 @@ def register():
     student_id = request.form['student_id']
     nombre = request.form['nombre']
     apellido = request.form['apellido']
-    result = core_logic.register_student_from_camera(student_id, nombre, apellido)
+    result = streaming.run_blocking(core_logic.register_student_from_camera, student_id, nombre, apellido)
     return jsonify(result)
 
 @app.route('/submit_questionnaire/<student_id>', methods=['POST'])
 def submit_questionnaire(student_id):
     responses = {int(k): int(v) for k, v in request.form.items()}
     kolb, felder, vak = core_logic.calculate_learning_styles(responses)
-    database.add_learning_styles(student_id, kolb, felder, vak)
+    streaming.run_blocking(database.add_learning_styles(student_id, kolb, felder, vak).result)
     return redirect(url_for('dashboard'))
 
+# Tamaño máximo del CSV de cuestionarios
+QUESTIONNAIRE_CSV_MAX_BYTES = 5 * 2**20
+
+@app.route('/api/questionnaires/import', methods=['POST'])
+def import_questionnaires():
+    """Importa un CSV de cuestionarios (campo 'file' de un formulario o el cuerpo de la petición).
+
+    Formato: ver /api/questionnaires/template.csv.  Todos los estilos se
+    puntúan juntos y se guardan en una sola transacción.
+    """
+    upload = request.files.get('file')
+    raw = upload.read(QUESTIONNAIRE_CSV_MAX_BYTES + 1) if upload else request.get_data()
+    if not raw:
+        return jsonify({"success": False, "message": "No se recibió ningún archivo."}), 400
+    if len(raw) > QUESTIONNAIRE_CSV_MAX_BYTES:
+        return jsonify({"success": False, "message": "El archivo es demasiado grande."}), 413
+    try:
+        text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return jsonify({"success": False, "message": "El archivo debe estar en UTF-8."}), 400
+    result = streaming.run_blocking(core_logic.import_questionnaires_csv, text)
+    return jsonify(result), 200 if result['success'] else 400
+
+@app.route('/api/questionnaires/template.csv')
+def questionnaire_template():
+    """CSV vacío con las columnas que espera /api/questionnaires/import."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(['student_id', *core_logic.QUESTION_IDS])
+    return Response(buffer.getvalue(), mimetype='text/csv; charset=utf-8',
+                    headers={'Content-Disposition': 'attachment; filename=cuestionarios.csv'})
+
 # --- Rutas de Video Streaming ---
+# Todos los espectadores de un stream comparten una única captura de la cámara
 @app.route('/video_feed/attendance')
 def video_feed_attendance():
-    return Response(core_logic.generate_attendance_frames(),
+    return Response(core_logic.ATTENDANCE_STREAM.stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/video_feed/pose')
 def video_feed_pose():
-    return Response(core_logic.generate_pose_frames(),
+    return Response(core_logic.POSE_STREAM.stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # --- Rutas de Control de Monitoreo ---
@@ -88,82 +167,331 @@ def status():
         attendance_active=core_logic.get_attendance_monitor_status(),
         pose_active=core_logic.get_pose_monitor_status(),
         recording_active=core_logic.get_manual_recording_status(),
+        whisper_models=whisper_processor.MODEL_REGISTRY.loaded_models(),
+        archive_pending=audio_archive.ARCHIVER.pending(),
+        streams=core_logic.get_stream_status(),
         periodo=periodo if periodo else msg
     )
 
 # --- Rutas de Grabación y Transcripción ---
 @app.route('/start_manual_recording', methods=['POST'])
-def start_manual_recording(): return jsonify(core_logic.start_manual_audio_recording())
+def start_manual_recording():
+    model_size = request.form.get('model_size', 'base')
+    # Abrir el micrófono (PyAudio) bloquea
+    return jsonify(streaming.run_blocking(core_logic.start_manual_audio_recording, model_size))
+
+@app.route('/api/live_transcript')
+def api_live_transcript():
+    """Texto parcial de la clase que se está grabando."""
+    return jsonify(core_logic.get_live_transcript())
 
 @app.route('/stop_manual_recording', methods=['POST'])
 def stop_manual_recording():
     model_size = request.form.get('model_size', 'base')
-    return jsonify(core_logic.stop_manual_audio_recording_and_transcribe(model_size))
+    # Espera a los hilos de captura y escritura y a que se guarde el trabajo de transcripción
+    return jsonify(streaming.run_blocking(core_logic.stop_manual_audio_recording_and_transcribe, model_size))
+
+@app.route('/api/transcription_jobs')
+def api_transcription_jobs():
+    """Últimos trabajos de transcripción con su estado."""
+    jobs = streaming.run_blocking(database.get_recent_transcription_jobs, request.args.get('limit', 20, type=int))
+    for job in jobs:
+        job['position'] = core_logic.TRANSCRIPTION_JOBS.position(job['id'])
+    return jsonify(jobs)
+
+@app.route('/api/transcription_jobs/<int:job_id>')
+def api_transcription_job(job_id):
+    """Estado, progreso (0-1) y posición en cola de un trabajo de transcripción."""
+    job = core_logic.TRANSCRIPTION_JOBS.get_status(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Trabajo no encontrado."}), 404
+    return jsonify(job)
+
+ENHANCE_STATUS_CODES = {'not_found': 404, 'duplicate': 409, 'rejected': 503}
 
 @app.route('/api/enhance_transcription/<int:transcription_id>', methods=['POST'])
 def enhance_transcription_route(transcription_id):
-    result = core_logic.enhance_transcript_with_llm(transcription_id)
-    return jsonify(result)
+    """Encola la mejora; el texto llega por SocketIO ('enhance_started', 'enhance_progress' y 'enhance_done').
+
+    Si la cola del LLM está llena responde 503 en lugar de acumular peticiones.
+    """
+    result = core_logic.start_transcript_enhancement(transcription_id, emit_from_thread)
+    return jsonify(result), ENHANCE_STATUS_CODES.get(result['status'], 202)
+
+@app.route('/api/enhance_transcription/<int:transcription_id>/cancel', methods=['POST'])
+def cancel_enhancement_route(transcription_id):
+    return jsonify(core_logic.cancel_transcript_enhancement(transcription_id))
+
+@app.route('/api/llm/status')
+def llm_status():
+    """Salud de los procesos del LLM, ocupación de la cola y latencias recientes."""
+    return jsonify(core_logic.LLM_POOL.status())
+
+# --- Paginación por cursor ---
+# Los listados devuelven páginas de tamaño `limit` junto con un `next_cursor`
+# opaco (la clave del último registro, en base64) que se reenvía como
+# `cursor` para obtener la página siguiente.  `fields=` limita las columnas.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _encode_cursor(key):
+    if key is None: return None
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    if not cursor: return None
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+
+def _page_args(allowed_fields, default_fields, default_limit=DEFAULT_PAGE_SIZE):
+    """Lee fields, cursor y limit de la query string. Lanza ValueError si son inválidos."""
+    raw_fields = request.args.get('fields')
+    fields = tuple(f.strip() for f in raw_fields.split(',') if f.strip()) if raw_fields else tuple(default_fields)
+    unknown = [f for f in fields if f not in allowed_fields]
+    if unknown or not fields:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown) or '(vacío)'}")
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    try:
+        after = _decode_cursor(request.args.get('cursor'))
+    except Exception:
+        raise ValueError("cursor inválido")
+    return fields, after, limit
+
+def _public_transcription(record):
+    """Convierte rutas de disco en URLs servibles y normaliza banderas."""
+    if 'file_path' in record:
+        record['file_path'] = f"/records/{os.path.basename(record['file_path'])}" if record.get('file_path') else None
+    if 'text_file_path' in record:
+        record['text_file_path'] = f"/records/texts/{os.path.basename(record['text_file_path'])}" if record.get('text_file_path') else None
+    if 'has_enhanced' in record:
+        record['has_enhanced'] = bool(record['has_enhanced'])
+    return record
 
 # --- Rutas de API para Datos ---
 @app.route('/api/students_list')
 def api_students_list():
-    """Devuelve lista normalizada y deshabilita caché."""
-    raw = database.get_all_students_basic_info()  # puede ser lista de dicts o tuplas
-
-    normed = []
-    for s in (raw or []):
-        # si viene como tupla (id,nombre,apellido,fecha) ajústalo aquí
-        if isinstance(s, (list, tuple)) and len(s) >= 3:
-            _id, _nom, _ape = s[0], s[1], s[2]
-            _reg = s[3] if len(s) > 3 else None
-            normed.append({
-                "id": _id,
-                "nombre": _nom or "",
-                "apellido": _ape or "",
-                "registro_fecha": _reg
-            })
-            continue
-        # si viene como dict, normaliza claves
-        _id = s.get("id") or s.get("student_id") or s.get("uid") or s.get("_id")
-        _nom = s.get("nombre") or s.get("first_name") or s.get("name") or s.get("nombres") or ""
-        _ape = s.get("apellido") or s.get("last_name") or s.get("surname") or s.get("apellidos") or ""
-        _reg = (
-            s.get("registro_fecha") or s.get("fecha_registro")
-            or s.get("created_at") or s.get("createdAt") or s.get("registro")
-        )
-        normed.append({
-            "id": _id, "nombre": _nom, "apellido": _ape, "registro_fecha": _reg
-        })
+    """Devuelve una página de estudiantes (?limit=&cursor=&fields=).
 
-    resp = jsonify({"students": normed})
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp.headers["Pragma"] = "no-cache"
-    return resp
+    La respuesta lleva ETag para que el navegador revalide con 304 en lugar
+    de volver a descargar la lista completa.
+    """
+    try:
+        fields, after, limit = _page_args(database.STUDENT_FIELDS, database.STUDENT_DEFAULT_FIELDS)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if after is not None and not isinstance(after, str):
+        return jsonify({"success": False, "message": "cursor inválido"}), 400
+    students, next_after = streaming.run_blocking(database.get_students_page, fields, after, limit)
+    resp = jsonify({"students": students, "next_cursor": _encode_cursor(next_after)})
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+# Límite del tiempo de búsqueda que puede pedir el navegador
+GROUPS_MAX_TIME_BUDGET_SECONDS = 10.0
+
+@app.route('/api/groups', methods=['POST'])
+def api_form_groups():
+    """Forma grupos balanceados por estilos de aprendizaje.
+
+    JSON: num_groups o group_size, y opcionalmente seed y time_budget
+    (segundos).  Devuelve los grupos y las métricas del optimizador; con la
+    misma seed se obtiene el mismo reparto.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        num_groups = int(data['num_groups']) if data.get('num_groups') else None
+        group_size = int(data['group_size']) if data.get('group_size') else None
+        seed = int(data['seed']) if data.get('seed') not in (None, '') else None
+        time_budget = min(float(data.get('time_budget') or group_formation.GROUP_TIME_BUDGET_SECONDS), GROUPS_MAX_TIME_BUDGET_SECONDS)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Parámetros inválidos."}), 400
+    if not num_groups and not group_size:
+        return jsonify({"success": False, "message": "Indica num_groups o group_size."}), 400
+    groups, stats, error = streaming.run_blocking(core_logic.form_smart_groups, num_groups, group_size, seed=seed, time_budget=time_budget)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+    fields = ('id', 'nombre', 'apellido', 'kolb_style', 'vak_style', 'felder_styles')
+    return jsonify({"success": True, "groups": [[{f: s.get(f) for f in fields} for s in group] for group in groups], "stats": stats})
 
 @app.route('/api/delete_student/<student_id>', methods=['DELETE'])
-def delete_student_route(student_id): return jsonify(core_logic.delete_student(student_id))
+def delete_student_route(student_id): return jsonify(streaming.run_blocking(core_logic.delete_student, student_id))
 
 @app.route('/api/attendance_summary_today')
-def api_attendance_summary_today(): return jsonify(database.get_attendance_summary_by_period())
+def api_attendance_summary_today(): return jsonify(streaming.run_blocking(database.get_attendance_summary_by_period))
 
 @app.route('/api/participation_summary_today')
-def api_participation_summary_today(): return jsonify(database.get_participation_summary_by_period())
+def api_participation_summary_today(): return jsonify(streaming.run_blocking(database.get_participation_summary_by_period))
+
+# --- Estadísticas históricas (agregados diarios) ---
+
+def _date_range_args():
+    """Lee ?start=&end= (YYYY-MM-DD). Sin valores, abarca todo el historial."""
+    start = request.args.get('start') or '0001-01-01'
+    end = request.args.get('end') or '9999-12-31'
+    for value in (start, end):
+        datetime.date.fromisoformat(value)
+    if start > end:
+        raise ValueError("start debe ser anterior o igual a end")
+    return start, end
+
+@app.route('/api/stats/students')
+def api_stats_students():
+    """Asistencia y participación por estudiante en un rango (?start=&end=&periodo=)."""
+    try:
+        start, end = _date_range_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Rango de fechas inválido: {e}"}), 400
+    return jsonify(streaming.run_blocking(database.get_student_stats_range, start, end, request.args.get('periodo')))
+
+@app.route('/api/stats/periods')
+def api_stats_periods():
+    """Asistencia y participación agregadas por período en un rango (?start=&end=)."""
+    try:
+        start, end = _date_range_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Rango de fechas inválido: {e}"}), 400
+    return jsonify(streaming.run_blocking(database.get_period_stats_range, start, end))
+
+@app.route('/api/stats/rebuild', methods=['POST'])
+def api_stats_rebuild():
+    """Recalcula los agregados diarios desde los registros crudos (opcionalmente en un rango)."""
+    try:
+        start, end = _date_range_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Rango de fechas inválido: {e}"}), 400
+    if streaming.run_blocking(database.rebuild_rollups, start, end):
+        return jsonify({"success": True, "message": "Agregados recalculados."})
+    return jsonify({"success": False, "message": "No se pudieron recalcular los agregados."}), 500
+
+# --- Exportación masiva (CSV / JSON Lines en streaming) ---
+
+def _export_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel detecte UTF-8 (nombres con tildes)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % database.EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0); buffer.truncate(0)
+    yield buffer.getvalue()
+
+def _export_jsonl(columns, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        if len(chunk) >= database.EXPORT_CHUNK_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def _export_rows(chunks):
+    """Recorre los bloques de la exportación leyendo cada uno fuera del bucle de eventos."""
+    try:
+        while True:
+            chunk = streaming.run_blocking(next, chunks, None)
+            if chunk is None:
+                return
+            yield from chunk
+    finally:
+        chunks.close()
+
+EXPORT_FORMATS = {
+    'csv': (_export_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (_export_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
+
+@app.route('/api/export/<dataset>.<fmt>')
+def api_export(dataset, fmt):
+    """Exporta attendance, participation, learning_styles o students (?start=&end=) en CSV o JSONL."""
+    if dataset not in database.EXPORT_QUERIES or fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": "Exportación no soportada."}), 404
+    try:
+        start, end = _date_range_args()
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Rango de fechas inválido: {e}"}), 400
+    columns = streaming.run_blocking(database.get_export_columns, dataset)
+    formatter, mimetype = EXPORT_FORMATS[fmt]
+    body = formatter(columns, _export_rows(database.iter_export_chunks(dataset, start, end, columns)))
+    filename = f"{dataset}_{request.args.get('start', 'inicio')}_{request.args.get('end', 'hoy')}.{fmt}"
+    return Response(body, mimetype=mimetype, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.route('/api/transcriptions')
 def api_transcriptions():
-    transcriptions = database.get_all_transcriptions()
-    for record in transcriptions:
-        record['file_path'] = f"/records/{os.path.basename(record['file_path'])}" if record.get('file_path') else None
-        record['text_file_path'] = f"/records/texts/{os.path.basename(record['text_file_path'])}" if record.get('text_file_path') else None
-    return jsonify(transcriptions)
+    """Devuelve una página de transcripciones; por defecto solo el resumen, sin textos."""
+    try:
+        fields, after, limit = _page_args(database.TRANSCRIPTION_FIELDS, database.TRANSCRIPTION_SUMMARY_FIELDS, default_limit=20)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    # El cursor es la clave [start_timestamp, id] del último registro
+    if after is not None and not (isinstance(after, list) and len(after) == 2):
+        return jsonify({"success": False, "message": "cursor inválido"}), 400
+    transcriptions, next_after = streaming.run_blocking(database.get_transcriptions_page, fields, tuple(after) if after else None, limit)
+    return jsonify({"transcriptions": [_public_transcription(t) for t in transcriptions], "next_cursor": _encode_cursor(next_after)})
+
+@app.route('/api/transcriptions/<int:transcription_id>')
+def api_transcription_detail(transcription_id):
+    """Devuelve una transcripción con sus textos completos (o los campos de ?fields=)."""
+    try:
+        fields, _, _ = _page_args(database.TRANSCRIPTION_FIELDS, tuple(database.TRANSCRIPTION_FIELDS))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    record = streaming.run_blocking(database.get_transcription_by_id, transcription_id, fields)
+    if not record:
+        return jsonify({"success": False, "message": "Transcripción no encontrada."}), 404
+    return jsonify(_public_transcription(record))
+
+@app.route('/api/transcriptions/<int:transcription_id>/segments')
+def api_transcription_segments(transcription_id):
+    """Segmentos con marcas de tiempo (segundos desde el inicio del audio)."""
+    return jsonify(streaming.run_blocking(database.get_transcription_segments, transcription_id))
+
+def _highlight_html(text):
+    """Escapa un fragmento de búsqueda y convierte sus marcadores en <mark>."""
+    start, end = database.SEARCH_HIGHLIGHT
+    return str(escape(text or "")).replace(start, "<mark>").replace(end, "</mark>")
+
+@app.route('/api/search')
+def api_search_transcriptions():
+    """Búsqueda de texto completo (?q=&limit=) con fragmentos resaltados y enlaces al instante del audio."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"success": False, "message": "Falta el parámetro q."}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_PAGE_SIZE))
+    results = []
+    for r in streaming.run_blocking(database.search_transcriptions, query, limit):
+        audio_url = f"/records/{os.path.basename(r['file_path'])}?inline=1" if r['file_path'] else None
+        results.append({
+            "id": r['id'],
+            "class_name": r['class_name'],
+            "start_timestamp": r['start_timestamp'],
+            "score": round(r['score'], 3),
+            "snippet": _highlight_html(r['snippet']),
+            "audio_url": audio_url,
+            "segments": [dict(seg, text=_highlight_html(seg['text']),
+                              audio_url=f"{audio_url}#t={seg['start_seconds']:.1f}" if audio_url else None)
+                         for seg in r['segments']],
+        })
+    return jsonify({"query": query, "results": results})
 
 @app.route('/api/delete_transcription/<int:transcription_id>', methods=['DELETE'])
 def delete_transcription_route(transcription_id):
-    return jsonify(core_logic.delete_transcription_files(transcription_id))
+    return jsonify(streaming.run_blocking(core_logic.delete_transcription_files, transcription_id))
+
+AUDIO_MIMETYPES = {'.wav': 'audio/wav', '.ogg': 'audio/ogg', '.flac': 'audio/flac'}
 
 @app.route('/records/<path:filename>')
-def serve_record(filename): return send_from_directory(app.config['RECORDS_FOLDER'], filename, as_attachment=True)
+def serve_record(filename):
+    # ?inline=1 para reproducir en el navegador (p. ej. saltando a un instante con #t=).
+    # conditional=True responde a cabeceras Range con 206 Partial Content, así
+    # el reproductor puede empezar a sonar y saltar sin descargar el archivo entero.
+    return send_from_directory(app.config['RECORDS_FOLDER'], filename, mimetype=AUDIO_MIMETYPES.get(os.path.splitext(filename)[1]),
+                               as_attachment=request.args.get('inline') != '1', conditional=True)
 
 @app.route('/records/texts/<path:filename>')
 def serve_text_record(filename): return send_from_directory(os.path.join(app.config['RECORDS_FOLDER'], 'texts'), filename)
@@ -193,7 +521,7 @@ def stop_calibration_monitor_route():
 # Stream de vídeo para calibración
 @app.route('/video_feed/calibrate')
 def video_feed_calibrate():
-    return Response(core_logic.generate_calibrate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(core_logic.CALIBRATION_STREAM.stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # Devuelve las cajas de asientos actuales
 @app.route('/api/seat_boxes')
@@ -213,7 +541,7 @@ def api_add_seat():
     if None in (x, y, w, h):
         return jsonify({"success": False, "message": "Datos incompletos"}), 400
     try:
-        seat_id = core_logic.add_seat_box(x, y, w, h, normalized=normalized)
+        seat_id = streaming.run_blocking(core_logic.add_seat_box, x, y, w, h, normalized=normalized)
         return jsonify({"success": True, "seat_id": seat_id})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
@@ -221,7 +549,7 @@ def api_add_seat():
 # Elimina la última caja de asiento
 @app.route('/api/remove_last_seat', methods=['POST'])
 def api_remove_last_seat():
-    success = core_logic.remove_last_seat_box()
+    success = streaming.run_blocking(core_logic.remove_last_seat_box)
     return jsonify({"success": success})
 
 # Asigna un estudiante a un asiento
@@ -232,7 +560,7 @@ def api_assign_seat():
     student_id = data.get('student_id')
     if not seat_id:
         return jsonify({"success": False, "message": "seat_id faltante"}), 400
-    success = core_logic.assign_student_to_seat(student_id, seat_id)
+    success = streaming.run_blocking(core_logic.assign_student_to_seat, student_id, seat_id)
     return jsonify({"success": success})
 
 # Renombra un asiento existente
@@ -243,7 +571,7 @@ def api_rename_seat():
     new_id = data.get('new_id')
     if not old_id or not new_id:
         return jsonify({"success": False, "message": "old_id y new_id son requeridos"}), 400
-    success = core_logic.rename_seat(old_id, new_id)
+    success = streaming.run_blocking(core_logic.rename_seat, old_id, new_id)
     return jsonify({"success": success})
 
 # --- Página y APIs para escaneo rápido de asistencia ---
@@ -257,7 +585,7 @@ def quick_scan_page():
 def api_quick_scan():
     """Realiza un escaneo facial rápido de ~3 segundos y devuelve la mejor coincidencia."""
     try:
-        result = core_logic.quick_scan_and_identify()
+        result = streaming.run_blocking(core_logic.quick_scan_and_identify)
         return jsonify(result)
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
@@ -270,12 +598,40 @@ def api_quick_scan_image():
         b64 = data.get('image_base64')
         if not b64:
             return jsonify({"success": False, "message": "image_base64 faltante"}), 400
-        result = core_logic.quick_identify_from_base64(b64)
+        result = streaming.run_blocking(core_logic.quick_identify_from_base64, b64)
         return jsonify(result)
     except Exception as e:
         app_logger.exception("Error en /api/quick_scan_image")
         return jsonify({"success": False, "message": str(e)}), 500
 
+# Imágenes por petición en /api/quick_scan_frames (el tamaño total lo limita MAX_REQUEST_BYTES)
+QUICK_SCAN_MAX_FRAMES = 8
+
+@app.route('/api/quick_scan_frames', methods=['POST'])
+def api_quick_scan_frames():
+    """Identifica a partir de una ráfaga de imágenes en binario y devuelve el mejor match.
+
+    Acepta multipart/form-data con uno o varios archivos en el campo
+    'frames', o una sola imagen JPEG/PNG como cuerpo de la petición
+    (Content-Type image/jpeg, image/png o application/octet-stream).
+    """
+    if request.files:
+        uploads = request.files.getlist('frames') or list(request.files.values())
+        images = [upload.read() for upload in uploads]
+    else:
+        body = _read_body()
+        images = [body] if body else []
+    images = [image for image in images if image]
+    if not images:
+        return jsonify({"success": False, "message": "No se recibió ninguna imagen."}), 400
+    if len(images) > QUICK_SCAN_MAX_FRAMES:
+        return jsonify({"success": False, "message": f"Como mucho {QUICK_SCAN_MAX_FRAMES} imágenes por petición."}), 400
+    try:
+        return jsonify(streaming.run_blocking(core_logic.quick_identify_from_images, images))
+    except Exception as e:
+        app_logger.exception("Error en /api/quick_scan_frames")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 
 @app.route('/api/confirm_attendance', methods=['POST'])
 def api_confirm_attendance():
@@ -284,7 +640,7 @@ def api_confirm_attendance():
     student_id = data.get('student_id')
     if not student_id:
         return jsonify({"success": False, "message": "student_id faltante"}), 400
-    result = core_logic.confirm_attendance(student_id)
+    result = streaming.run_blocking(core_logic.confirm_attendance, student_id)
     return jsonify(result)
 
 if __name__ == '__main__':
@@ -292,4 +648,5 @@ if __name__ == '__main__':
     # reinicie al detectar cambios en librerías de terceros (por ejemplo, durante
     # la transcripción de audio con Whisper).  El modo debug está desactivado
     # porque el reloader causa problemas en la grabación/transcripción.
+    # Para producción (bucle de eventos con gevent) usar serve.py.
     socketio.run(app, debug=False, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
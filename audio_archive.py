@@ -0,0 +1,125 @@
+# audio_archive.py
+import os
+import threading
+import collections
+import subprocess
+import datetime
+import database
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+aa_logger = logging.getLogger(__name__)
+
+# Formato del archivo comprimido: extensión, formato de contenedor de ffmpeg y
+# opciones del códec.  Opus a 32 kbps es más que suficiente para voz (≈14 MB
+# por hora frente a ≈110 MB del WAV a 16 kHz); FLAC es sin pérdidas.
+ARCHIVE_FORMATS = {
+    "opus": (".ogg", "ogg", ["-c:a", "libopus", "-b:a", "32k", "-application", "voip"]),
+    "flac": (".flac", "flac", ["-c:a", "flac", "-compression_level", "8"]),
+}
+ARCHIVE_FORMAT = "opus"
+ARCHIVE_ENCODER = "ffmpeg"
+# Días que se conserva el WAV original después de archivarlo
+# (0 = borrarlo en cuanto se archiva, None = no borrarlo nunca)
+ARCHIVE_KEEP_ORIGINAL_DAYS = 7
+# Cada cuánto se revisa la política de retención si no hay nada que archivar
+RETENTION_CHECK_SECONDS = 3600
+
+
+class AudioArchiver:
+    """Comprime en segundo plano los WAV ya transcritos y aplica la retención.
+
+    El archivo comprimido se guarda junto al WAV con otra extensión y su ruta
+    queda en transcriptions.archive_path.  Pasados ARCHIVE_KEEP_ORIGINAL_DAYS
+    el WAV se borra y file_path pasa a apuntar al archivo comprimido.
+    """
+
+    def __init__(self, fmt=ARCHIVE_FORMAT, keep_original_days=ARCHIVE_KEEP_ORIGINAL_DAYS):
+        self.fmt = fmt
+        self.keep_original_days = keep_original_days
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._disabled = False
+
+    def start(self):
+        """Arranca el hilo y encola las transcripciones que aún no tienen archivo comprimido."""
+        if self._thread:
+            return
+        for record in database.get_unarchived_transcriptions():
+            self.submit(record['id'], record['file_path'])
+        self._thread = threading.Thread(target=self._worker, name="audio-archiver", daemon=True)
+        self._thread.start()
+
+    def submit(self, transcription_id, wav_path):
+        with self._cond:
+            if any(item[0] == transcription_id for item in self._pending):
+                return
+            self._pending.append((transcription_id, wav_path))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _worker(self):
+        self.apply_retention()
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(RETENTION_CHECK_SECONDS)
+                item = self._pending.popleft() if self._pending else None
+            if item and not self._disabled:
+                self._archive(*item)
+            self.apply_retention()
+
+    def _archive(self, transcription_id, wav_path):
+        if not os.path.exists(wav_path):
+            aa_logger.warning(f"No existe el audio {wav_path}; no se archiva la transcripción {transcription_id}.")
+            return
+        ext, container, codec = ARCHIVE_FORMATS[self.fmt]
+        archive_path = os.path.splitext(wav_path)[0] + ext
+        tmp_path = archive_path + ".part"
+        cmd = [ARCHIVE_ENCODER, "-nostdin", "-y", "-loglevel", "error", "-i", wav_path, "-ac", "1", *codec, "-f", container, tmp_path]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+            os.replace(tmp_path, archive_path)
+        except FileNotFoundError:
+            aa_logger.warning(f"No se encontró el codificador '{ARCHIVE_ENCODER}'; se desactiva el archivado de audio.")
+            self._disabled = True
+            return
+        except subprocess.CalledProcessError as e:
+            aa_logger.error(f"Error al comprimir {wav_path}: {e.stderr.decode(errors='replace').strip()}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if not database.set_transcription_archive(transcription_id, archive_path).result():
+            os.remove(archive_path)
+            return
+        original, compressed = os.path.getsize(wav_path), os.path.getsize(archive_path)
+        aa_logger.info(f"Archivado {wav_path} -> {archive_path} ({original / 2**20:.1f} MB -> {compressed / 2**20:.1f} MB).")
+
+    def apply_retention(self):
+        """Borra los WAV archivados hace más de keep_original_days. Devuelve cuántos se borraron."""
+        if self.keep_original_days is None:
+            return 0
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.keep_original_days)).isoformat()
+        pruned = 0
+        for record in database.get_archived_originals(cutoff):
+            if not os.path.exists(record['archive_path']):
+                continue
+            if not database.use_archive_as_original(record['id']).result():
+                continue
+            try:
+                os.remove(record['file_path'])
+                pruned += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                aa_logger.warning(f"No se pudo borrar {record['file_path']}: {e}")
+        if pruned:
+            aa_logger.info(f"Retención: {pruned} grabaciones WAV sustituidas por su archivo comprimido.")
+        return pruned
+
+
+ARCHIVER = AudioArchiver()
@@ -0,0 +1,714 @@
+"""Pruebas de rendimiento del sistema AI-Classroom.
+
+Cada subcomando genera datos sintéticos, mide una ruta concreta del sistema
+e imprime una tabla con los resultados.  No modifica la base de datos ni las
+grabaciones reales.
+
+Uso:
+    python benchmarks.py audio --minutes 10 --model tiny
+    python benchmarks.py vad --minutes 45 --silence 0.4
+    python benchmarks.py parallel --minutes 90 --model tiny --workers 1 2 4
+    python benchmarks.py groups --students 1000 5000 10000 --groups 50 300
+    python benchmarks.py scan --image rostros_registrados/foto.jpg
+    python benchmarks.py gallery --students 100 1000 5000
+    python benchmarks.py serve --viewers 10 50 200 500 --clients 10 --compare-per-viewer
+
+Subcomandos:
+    audio   Latencia desde "detener grabación" hasta tener el texto: ruta
+            anterior (WAV 44.1 kHz decodificado por ffmpeg) frente a la ruta
+            actual (WAV 16 kHz leído con NumPy).  Sin --model solo se mide la
+            carga del audio.
+    vad     Audio omitido por la detección de voz en una clase sintética con
+            tramos de silencio, y aceleración de la transcripción resultante.
+            Sin --model la aceleración se estima por la duración transcrita.
+    parallel
+            Transcripción de una grabación larga en 1 proceso frente a N
+            procesos con tramos cortados en silencios.
+    groups  Formación de grupos con estudiantes sintéticos: reparto anterior
+            (barajar y ordenar los grupos por tamaño en cada paso) frente al
+            optimizador por estilos de aprendizaje.
+    scan    Detección y codificación de rostros por frame en el escaneo
+            rápido: detector HOG a resolución completa frente a la imagen
+            reducida y al ROI del frame anterior.  Necesita una foto con un
+            rostro, que se coloca sobre frames del tamaño de la cámara.
+    gallery Reconocimiento contra la galería de rostros: todos los encodings
+            del registro (comparación anterior, lista a lista, y en una
+            matriz) frente a la galería compacta de centroides y plantillas
+            atípicas.  Con identidades sintéticas mide aciertos, aceptaciones
+            falsas de desconocidos y latencia por rostro; con --from-db usa
+            los encodings reales como galería y una captura de cada
+            estudiante como consulta.
+    serve   Prueba de carga del servidor web: N espectadores de un stream
+            MJPEG sintético y M clientes de la API a la vez, con el servidor
+            threading de desarrollo (app.py) y con gevent (serve.py).  Con
+            --compare-per-viewer mide también la captura anterior, con un
+            bucle de cámara por espectador.  Requiere Flask-SocketIO (y gevent
+            para ese modo); el servidor corre en un subproceso.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+
+def _synthetic_pcm(seconds, rate, seed=0):
+    """Audio int16 con tonos y ruido, suficiente para medir tiempos."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.2 * t) > 0)
+    signal += 0.02 * rng.standard_normal(t.size)
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def _synthetic_lecture(seconds, rate, silence_ratio, seed=0):
+    """Audio float32 que alterna habla (ruido modulado a ritmo silábico) y
+    silencio con ruido de fondo bajo.  Devuelve (audio, segundos de silencio)."""
+    rng = np.random.default_rng(seed)
+    audio = 0.003 * rng.standard_normal(int(seconds * rate)).astype(np.float32)
+    position, silent = 0, 0
+    while position < audio.size:
+        speech = int(rng.uniform(20, 120) * rate)
+        end = min(audio.size, position + speech)
+        t = np.arange(end - position) / rate
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+        audio[position:end] += 0.2 * envelope * rng.standard_normal(t.size).astype(np.float32)
+        gap = int(speech * silence_ratio / (1 - silence_ratio))
+        silent += max(0, min(audio.size, end + gap) - end)
+        position = end + gap
+    return audio, silent / rate
+
+
+def _write_wav(path, pcm, rate):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+def bench_audio(args):
+    import whisper
+    import whisper_processor
+
+    seconds = args.minutes * 60
+    model = whisper_processor.MODEL_REGISTRY.get(args.model) if args.model else None
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy_44k.wav")
+        fallback_path = os.path.join(tmp, "fallback_44k.wav")
+        native_path = os.path.join(tmp, "native_16k.wav")
+        _write_wav(legacy_path, _synthetic_pcm(seconds, 44100), 44100)
+        _write_wav(fallback_path, _synthetic_pcm(seconds, 44100), 44100)
+        _write_wav(native_path, _synthetic_pcm(seconds, 16000), 16000)
+
+        paths = [
+            ("44.1 kHz + ffmpeg (anterior)", legacy_path, whisper.load_audio),
+            ("44.1 kHz + NumPy (micrófono sin 16 kHz)", fallback_path, whisper_processor.load_audio),
+            ("16 kHz + NumPy (actual)", native_path, whisper_processor.load_audio),
+        ]
+        rows = []
+        for name, path, loader in paths:
+            audio, load_s = _timed(lambda: loader(path))
+            transcribe_s = 0.0
+            if model is not None:
+                _, transcribe_s = _timed(lambda: model.transcribe(audio, language="es"))
+            rows.append((name, f"{os.path.getsize(path) / 2**20:.1f} MB", f"{load_s:.2f} s",
+                         f"{transcribe_s:.2f} s" if model is not None else "-", f"{load_s + transcribe_s:.2f} s"))
+    print(f"Audio sintético de {args.minutes} min, modelo: {args.model or '(sin transcripción)'}")
+    _print_table(["Ruta", "WAV", "Carga", "Transcripción", "Total"], rows)
+
+
+def bench_vad(args):
+    import whisper_processor
+
+    seconds = args.minutes * 60
+    audio, true_silence = _synthetic_lecture(seconds, whisper_processor.WHISPER_SAMPLE_RATE, args.silence)
+    regions, detect_s = _timed(lambda: whisper_processor.detect_speech(audio))
+    compact, _ = whisper_processor.gate_silence(audio, regions)
+    speech = sum(end - start for start, end in regions)
+    rows = [
+        ("Silencio real", f"{true_silence:.0f} s ({true_silence / seconds:.0%})"),
+        ("Omitido por el VAD", f"{seconds - speech:.0f} s ({(seconds - speech) / seconds:.0%})"),
+        ("Regiones de voz", len(regions)),
+        ("Tiempo del VAD", f"{detect_s * 1000:.0f} ms"),
+        ("Audio a transcribir", f"{compact.size / whisper_processor.WHISPER_SAMPLE_RATE:.0f} s de {seconds:.0f} s"),
+        ("Aceleración estimada", f"{audio.size / max(compact.size, 1):.2f}x"),
+    ]
+    if args.model:
+        model = whisper_processor.MODEL_REGISTRY.get(args.model)
+        _, full_s = _timed(lambda: whisper_processor.transcribe(model, audio, language="es"))
+        _, gated_s = _timed(lambda: whisper_processor.transcribe_speech(model, audio, language="es"))
+        rows += [
+            ("Transcripción completa", f"{full_s:.2f} s"),
+            ("Transcripción con VAD", f"{gated_s:.2f} s"),
+            ("Aceleración medida", f"{full_s / gated_s:.2f}x"),
+        ]
+    print(f"Clase sintética de {args.minutes} min con {args.silence:.0%} de silencio, modelo: {args.model or '(sin transcripción)'}")
+    _print_table(["Métrica", "Valor"], rows)
+
+
+def bench_parallel(args):
+    import whisper_processor
+
+    seconds = args.minutes * 60
+    audio, _ = _synthetic_lecture(seconds, whisper_processor.WHISPER_SAMPLE_RATE, args.silence)
+    regions = whisper_processor.detect_speech(audio)
+    speech = sum(end - start for start, end in regions)
+    whisper_processor.PARALLEL_MIN_SECONDS = 0
+    rows, baseline = [], None
+    for workers in args.workers:
+        if workers > 1:
+            # Arrancar los procesos y cargar sus modelos fuera de la medición
+            pool = whisper_processor.PARALLEL_TRANSCRIBER._get_pool(args.model, workers)
+            silence = np.zeros(whisper_processor.WHISPER_SAMPLE_RATE, dtype=np.float32)
+            for f in [pool.submit(whisper_processor._pool_transcribe, silence, {}) for _ in range(workers)]:
+                f.result()
+        else:
+            whisper_processor.MODEL_REGISTRY.get(args.model)
+        result, elapsed = _timed(lambda: whisper_processor.transcribe_recording(args.model, audio, workers=workers, language="es"))
+        baseline = baseline or elapsed
+        rows.append((workers, len(result['segments']), f"{elapsed:.2f} s", f"{speech / elapsed:.1f}x", f"{baseline / elapsed:.2f}x"))
+    whisper_processor.PARALLEL_TRANSCRIBER.shutdown()
+    print(f"Grabación sintética de {args.minutes} min ({speech:.0f} s de voz), modelo: {args.model}")
+    _print_table(["Procesos", "Segmentos", "Tiempo", "Tiempo real", "Aceleración"], rows)
+
+
+_KOLB_STYLES = ["Activo/Divergente", "Asimilativo", "Convergente", "Acomodador"]
+_VAK_STYLES = ["Visual", "Auditivo", "Kinestésico"]
+_FELDER_DIMENSIONS = {"Sensitivo/Intuitivo": ("Sensitivo", "Intuitivo"), "Visual/Verbal": ("Visual", "Verbal"),
+                      "Activo/Reflexivo": ("Activo", "Reflexivo"), "Secuencial/Global": ("Secuencial", "Global")}
+
+
+def _synthetic_students(count, seed=0):
+    """Estudiantes con estilos de distribución desigual, como en una clase real."""
+    rng = np.random.default_rng(seed)
+    kolb = rng.choice(len(_KOLB_STYLES), count, p=[0.4, 0.3, 0.2, 0.1])
+    vak = rng.choice(len(_VAK_STYLES), count, p=[0.6, 0.3, 0.1])
+    felder = rng.random((count, len(_FELDER_DIMENSIONS))) < 0.3
+    return [{"id": str(i), "kolb_style": _KOLB_STYLES[kolb[i]], "vak_style": _VAK_STYLES[vak[i]],
+             "felder_styles": {dim: poles[int(felder[i, j])] for j, (dim, poles) in enumerate(_FELDER_DIMENSIONS.items())}}
+            for i in range(count)]
+
+
+def _legacy_groups(students, num_groups, seed):
+    """Reparto anterior de form_smart_groups: barajar y añadir cada estudiante al grupo más pequeño."""
+    import random
+
+    students = list(students)
+    random.Random(seed).shuffle(students)
+    groups = [[] for _ in range(num_groups)]
+    for student in students:
+        groups.sort(key=len)
+        groups[0].append(student)
+    return groups
+
+
+def _group_objective(groups, students):
+    """Objetivo y desviación máxima (en estudiantes) del optimizador, evaluados sobre un reparto cualquiera."""
+    import group_formation
+
+    profile_of, X, columns = group_formation._profile_matrix(students)
+    index = {s['id']: i for i, s in enumerate(students)}
+    counts = np.zeros((len(groups), X.shape[0]), dtype=np.int64)
+    for g, group in enumerate(groups):
+        for s in group:
+            counts[g, profile_of[index[s['id']]]] += 1
+    sizes = counts.sum(axis=1)
+    targets = sizes[:, None] * (counts.sum(axis=0) @ X / len(students))[None, :]
+    weights = np.sqrt(np.array([group_formation.GROUP_STYLE_WEIGHTS.get(family, 1.0) for family, _, _ in columns]))
+    deviation = counts @ X - targets
+    return float((deviation ** 2).sum()), float((np.abs(deviation) / weights).max())
+
+
+def bench_groups(args):
+    import group_formation
+
+    rows = []
+    for count in args.students:
+        students = _synthetic_students(count)
+        for num_groups in args.groups:
+            if num_groups > count:
+                continue
+            legacy, legacy_s = _timed(lambda: _legacy_groups(students, num_groups, args.seed))
+            legacy_obj, legacy_dev = _group_objective(legacy, students)
+            (groups, stats), new_s = _timed(lambda: group_formation.form_groups(students, num_groups, seed=args.seed, time_budget=args.budget))
+            new_obj, new_dev = _group_objective(groups, students)
+            rows.append((count, num_groups, f"{legacy_s:.2f} s", f"{legacy_obj:.0f}", f"{legacy_dev:.1f}",
+                         f"{new_s:.2f} s", f"{stats['objective_initial']:.0f}", f"{new_obj:.0f}", f"{new_dev:.1f}",
+                         stats['swaps'], "sí" if stats['converged'] else "no"))
+    print(f"Estudiantes sintéticos, semilla {args.seed}, presupuesto de búsqueda {args.budget} s")
+    _print_table(["Estudiantes", "Grupos", "Anterior", "Objetivo", "Desv. máx.",
+                  "Optimizador", "Obj. semilla", "Obj. final", "Desv. máx.", "Intercambios", "Convergió"], rows)
+
+
+def _serve_app(args):
+    """Servidor sintético con la misma pila que serve.py: Flask-SocketIO en el
+    modo pedido, un stream MJPEG y una API JSON sobre SQLite."""
+    import json
+    import sqlite3
+
+    import streaming
+
+    streaming.configure(args.mode)
+    from flask import Flask, Response
+    from flask_socketio import SocketIO
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode=streaming.SERVER_MODE)
+    db_path = args.db
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE students (id TEXT PRIMARY KEY, nombre TEXT, apellido TEXT)")
+        conn.executemany("INSERT INTO students VALUES (?, ?, ?)", [(str(i), f"Nombre{i}", f"Apellido{i}") for i in range(500)])
+
+    matrix = np.random.default_rng(0).random((256, 256), dtype=np.float32)
+    payload = os.urandom(args.frame_kb * 1024)
+
+    def frames():
+        """Captura simulada: args.work_ms de CPU por frame (NumPy suelta el GIL
+        como OpenCV y TensorFlow) al ritmo de args.fps."""
+        interval = 1.0 / args.fps
+        next_frame = time.monotonic()
+        while True:
+            busy_until = time.perf_counter() + args.work_ms / 1000
+            while time.perf_counter() < busy_until:
+                matrix @ matrix
+            yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + payload + b'\r\n'
+            next_frame += interval
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+    broadcaster = streaming.FrameBroadcaster("bench", frames)
+
+    @app.route('/video_feed')
+    def video_feed():
+        source = frames() if args.per_viewer else broadcaster.stream()
+        return Response(source, mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    @app.route('/api/students')
+    def students():
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute("SELECT id, nombre, apellido FROM students ORDER BY id LIMIT 50").fetchall()
+        return Response(json.dumps([{"id": r[0], "nombre": r[1], "apellido": r[2]} for r in rows]), mimetype='application/json')
+
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    socketio.run(app, host='127.0.0.1', port=args.port, log_output=False, allow_unsafe_werkzeug=True)
+
+
+def _process_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _process_threads(pid):
+    with open(f"/proc/{pid}/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('Threads:'))
+
+
+def _watch_streams(port, count, stop, counts):
+    """Abre `count` conexiones al stream en un solo hilo y cuenta los frames que recibe cada una."""
+    import selectors
+    import socket
+
+    marker = b'--frame'
+    selector = selectors.DefaultSelector()
+    tails = {}
+    for i in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(b'GET /video_feed HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, i)
+        tails[i] = b''
+    while not stop.is_set():
+        for key, _ in selector.select(timeout=0.1):
+            i = key.data
+            try:
+                data = key.fileobj.recv(262144)
+            except BlockingIOError:
+                continue
+            if not data:
+                selector.unregister(key.fileobj)
+                continue
+            chunk = tails[i] + data
+            counts[i] += chunk.count(marker)
+            tails[i] = chunk[-(len(marker) - 1):]
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+
+
+def _call_api(port, stop, latencies, errors):
+    import urllib.request
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/students", timeout=10) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(1)
+
+
+def _load_round(args, mode, per_viewer, viewers):
+    """Arranca el servidor sintético, aplica la carga y devuelve las métricas."""
+    import socket
+    import subprocess
+    import sys
+    import threading
+    import urllib.request
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    # El servidor termina con kill(): la base de datos la borra este proceso
+    tmp = tempfile.TemporaryDirectory(prefix="bench_serve_")
+    command = [sys.executable, os.path.abspath(__file__), "serve-app", "--mode", mode, "--port", str(port),
+               "--db", os.path.join(tmp.name, "bench.db"),
+               "--fps", str(args.fps), "--work-ms", str(args.work_ms), "--frame-kb", str(args.frame_kb)]
+    server = subprocess.Popen(command + (["--per-viewer"] if per_viewer else []), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/api/students", timeout=1).read()
+                break
+            except Exception:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError(f"El servidor sintético ({mode}) no arrancó.")
+                time.sleep(0.2)
+
+        stop = threading.Event()
+        counts = [0] * viewers
+        latencies, errors = [], []
+        workers = [threading.Thread(target=_watch_streams, args=(port, viewers, stop, counts), daemon=True)]
+        workers += [threading.Thread(target=_call_api, args=(port, stop, latencies, errors), daemon=True) for _ in range(args.clients)]
+        for worker in workers:
+            worker.start()
+        time.sleep(args.warmup)
+        frames_before, requests_before, errors_before = list(counts), len(latencies), len(errors)
+        cpu_before, started = _process_cpu_seconds(server.pid), time.monotonic()
+        time.sleep(args.seconds)
+        elapsed = time.monotonic() - started
+        cpu = (_process_cpu_seconds(server.pid) - cpu_before) / elapsed
+        threads = _process_threads(server.pid)
+        fps = np.array([(after - before) / elapsed for before, after in zip(frames_before, counts)])
+        window = np.array(latencies[requests_before:])
+        failed = len(errors) - errors_before
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=15)
+    finally:
+        server.kill()
+        server.wait()
+        tmp.cleanup()
+    return {
+        "fps_median": float(np.median(fps)) if fps.size else 0.0,
+        "fps_min": float(fps.min()) if fps.size else 0.0,
+        "rps": window.size / elapsed,
+        "p50_ms": float(np.percentile(window, 50) * 1000) if window.size else float('nan'),
+        "p95_ms": float(np.percentile(window, 95) * 1000) if window.size else float('nan'),
+        "errors": failed,
+        "cpu": cpu,
+        "threads": threads,
+    }
+
+
+def bench_serve(args):
+    rows, sustained = [], {}
+    for mode in args.modes:
+        # La captura por espectador es la de antes, que solo existía con el servidor threading
+        for per_viewer in ([True, False] if args.compare_per_viewer and mode == 'threading' else [False]):
+            source = "por espectador" if per_viewer else "compartida"
+            for viewers in args.viewers:
+                m = _load_round(args, mode, per_viewer, viewers)
+                ok = (m["fps_median"] >= 0.9 * args.fps and m["fps_min"] >= 0.5 * args.fps
+                      and m["errors"] == 0 and m["p95_ms"] <= args.max_p95_ms)
+                if ok:
+                    sustained[(mode, source)] = max(sustained.get((mode, source), 0), viewers)
+                rows.append((mode, source, viewers, args.clients, f"{m['fps_median']:.1f}", f"{m['fps_min']:.1f}",
+                             f"{m['rps']:.0f}", f"{m['p50_ms']:.0f}", f"{m['p95_ms']:.0f}", m['errors'],
+                             f"{m['cpu'] * 100:.0f}%", m['threads'], "sí" if ok else "no"))
+                print(f"  {mode}, captura {source}, {viewers} espectadores: {rows[-1][4]} fps, p95 API {rows[-1][8]} ms", flush=True)
+    print()
+    print(f"Stream sintético de {args.fps} fps, {args.frame_kb} KB por frame y {args.work_ms} ms de CPU por frame; "
+          f"{args.clients} clientes de API; {args.seconds} s por ronda; {os.cpu_count()} CPU")
+    _print_table(["Modo", "Captura", "Espectadores", "Clientes API", "fps mediana", "fps mín.", "API req/s",
+                  "API p50 ms", "API p95 ms", "Errores", "CPU servidor", "Hilos", "Sostenido"], rows)
+    print(f"Sostenido: fps mediana ≥ 90 % y mínima ≥ 50 % del objetivo, p95 de la API ≤ {args.max_p95_ms:.0f} ms y sin errores.")
+    for (mode, source), viewers in sorted(sustained.items()):
+        print(f"  {mode}, captura {source}: hasta {viewers} espectadores con {args.clients} clientes de API")
+
+
+def _scan_frames(image, count, width, height):
+    """Frames de cámara simulados: la foto sobre un fondo, desplazándose un poco en cada frame."""
+    import cv2
+
+    scale = min(1.0, 0.5 * height / image.shape[0])
+    image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+    h, w = image.shape[:2]
+    for i in range(count):
+        frame = np.full((height, width, 3), 90, dtype=np.uint8)
+        x = min(width - w, width // 3 + 6 * i)
+        y = min(height - h, height // 4 + 2 * i)
+        frame[y:y + h, x:x + w] = image
+        yield frame
+
+
+def bench_scan(args):
+    import cv2
+    import face_recognition
+
+    import face_scan
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"No se pudo leer {args.image}")
+    frames = list(_scan_frames(image, args.frames, args.width, args.height))
+    rgb = cv2.cvtColor(frames[0], cv2.COLOR_BGR2RGB)
+    reference_boxes = face_recognition.face_locations(rgb)
+    if not reference_boxes:
+        raise SystemExit("La foto no tiene un rostro detectable.")
+    reference = face_recognition.face_encodings(rgb, reference_boxes)[0]
+
+    rows = []
+    legacy_detect, legacy_encode, legacy_found = [], [], 0
+    for frame in frames:
+        start = time.perf_counter()
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        boxes = face_recognition.face_locations(rgb)
+        detected = time.perf_counter()
+        encodings = face_recognition.face_encodings(rgb, boxes)
+        legacy_detect.append(detected - start)
+        legacy_encode.append(time.perf_counter() - detected)
+        legacy_found += bool(encodings)
+    rows.append(("Anterior (resolución completa)", f"{np.mean(legacy_detect) * 1000:.0f}", f"{np.mean(legacy_encode) * 1000:.0f}",
+                 f"{legacy_found}/{len(frames)}", "-"))
+
+    for label, use_roi in (("Reducida, sin ROI", False), ("Reducida + ROI del frame anterior", True)):
+        detect, encode, found, distances, roi = [], [], 0, [], None
+        for frame in frames:
+            start = time.perf_counter()
+            boxes = face_scan.detect_faces(frame, roi if use_roi else None)
+            detected = time.perf_counter()
+            encodings = [e for e in face_scan.encode_faces(frame, boxes) if e is not None]
+            detect.append(detected - start)
+            encode.append(time.perf_counter() - detected)
+            roi = max(boxes, key=face_scan.box_area) if boxes else None
+            if encodings:
+                found += 1
+                distances.append(min(float(np.linalg.norm(e - reference)) for e in encodings))
+        rows.append((label, f"{np.mean(detect) * 1000:.0f}", f"{np.mean(encode) * 1000:.0f}", f"{found}/{len(frames)}",
+                     f"{max(distances):.3f}" if distances else "-"))
+
+    print(f"{len(frames)} frames de {args.width}x{args.height} con {args.image}")
+    _print_table(["Detección", "Detectar ms/frame", "Codificar ms/frame", "Frames con rostro", "Dist. máx. a la referencia"], rows)
+    print("Distancia entre el encoding de cada frame y el del primer frame a resolución completa "
+          "(el umbral de coincidencia es 0.6).  Con un resultado seguro el escaneo rápido se detiene "
+          "tras el primer frame en lugar de seguir los 3 s.")
+
+
+# Dispersión de los encodings sintéticos (128 dimensiones): entre personas la
+# distancia típica es ~0.9, entre dos sesiones de la misma persona ~0.35 y
+# entre capturas seguidas del registro ~0.05
+_FACE_DIM = 128
+_FACE_IDENTITY_SIGMA = 0.9 / np.sqrt(2 * _FACE_DIM)
+_FACE_SESSION_SIGMA = 0.35 / np.sqrt(2 * _FACE_DIM)
+_FACE_CAPTURE_SIGMA = 0.05 / np.sqrt(2 * _FACE_DIM)
+
+
+def _synthetic_faces(count, per_student, pose_change, seed=0):
+    """Encodings de registro, consultas de otra sesión y desconocidos.
+
+    Una fracción `pose_change` de los estudiantes cambia de pose a mitad del
+    registro: sus últimas capturas se alejan de las primeras como si fueran
+    de otra sesión.
+    """
+    rng = np.random.default_rng(seed)
+    identities = rng.normal(0, _FACE_IDENTITY_SIGMA, (count, _FACE_DIM))
+    session = identities + rng.normal(0, _FACE_SESSION_SIGMA, (count, _FACE_DIM))
+    captures = session[:, None, :] + rng.normal(0, _FACE_CAPTURE_SIGMA, (count, per_student, _FACE_DIM))
+    moved = rng.random(count) < pose_change
+    half = per_student // 2
+    captures[moved, half:] += rng.normal(0, _FACE_SESSION_SIGMA, (int(moved.sum()), 1, _FACE_DIM))
+    probes = identities + rng.normal(0, _FACE_SESSION_SIGMA, (count, _FACE_DIM))
+    strangers = rng.normal(0, _FACE_IDENTITY_SIGMA, (count, _FACE_DIM)) + rng.normal(0, _FACE_SESSION_SIGMA, (count, _FACE_DIM))
+    rows = [(str(i), f"Estudiante {i}", captures[i, j].tolist()) for i in range(count) for j in range(per_student)]
+    return rows, [(str(i), p) for i, p in enumerate(probes)], list(strangers)
+
+
+def _legacy_match(known_encodings, known_ids):
+    """Comparación anterior: face_recognition.face_distance sobre la lista de encodings en cada consulta."""
+    def match(encoding):
+        distances = np.linalg.norm(np.asarray(known_encodings) - encoding, axis=1)
+        i = int(np.argmin(distances))
+        return known_ids[i], float(distances[i])
+    return match
+
+
+def _gallery_match(gallery):
+    def match(encoding):
+        metadata, distance = gallery.match(encoding)
+        return (metadata['id'] if metadata else None), distance
+    return match
+
+
+def _evaluate_gallery(match, probes, strangers, tolerance):
+    """Aciertos sobre probes, aceptaciones de strangers y µs por consulta."""
+    correct = accepted = 0
+    start = time.perf_counter()
+    for student_id, encoding in probes:
+        found, distance = match(encoding)
+        correct += found == student_id and distance <= tolerance
+    for encoding in strangers:
+        accepted += match(encoding)[1] <= tolerance
+    elapsed = time.perf_counter() - start
+    return correct, accepted, elapsed / max(1, len(probes) + len(strangers)) * 1e6
+
+
+def _db_faces():
+    """Galería y consultas reales: cada estudiante se consulta con una de sus capturas, que sale de la galería."""
+    import database
+
+    rows, probes = [], []
+    for s in database.get_all_students():
+        embeddings = s['embeddings']
+        if len(embeddings) < 2:
+            continue
+        name = f"{s['nombre']} {s['apellido']}".strip()
+        probes.append((s['id'], np.asarray(embeddings[-1])))
+        rows += [(s['id'], name, e) for e in embeddings[:-1]]
+    return rows, probes, []
+
+
+def bench_gallery(args):
+    import face_gallery
+
+    if args.threshold is None:
+        args.threshold = face_gallery.GALLERY_TEMPLATE_DISTANCE
+    if args.max_templates is None:
+        args.max_templates = face_gallery.GALLERY_MAX_TEMPLATES
+    if args.from_db:
+        datasets = [("base de datos", *_db_faces())]
+        if not datasets[0][1]:
+            raise SystemExit("No hay estudiantes con al menos 2 encodings en la base de datos.")
+    else:
+        datasets = [(count, *_synthetic_faces(count, args.per_student, args.pose_change, args.seed)) for count in args.students]
+
+    rows = []
+    for label, raw_rows, probes, strangers in datasets:
+        known_ids = [r[0] for r in raw_rows]
+        known_encodings = [np.asarray(r[2]) for r in raw_rows]
+        by_student = {}
+        for student_id, name, encoding in raw_rows:
+            by_student.setdefault(student_id, (name, []))[1].append(encoding)
+        compact_rows, compact_s = _timed(lambda: [(sid, name, t) for sid, (name, encs) in by_student.items()
+                                                    for t in face_gallery.compact_templates(encs, args.threshold, args.max_templates)])
+        variants = (("Anterior (lista, todos)", len(raw_rows), _legacy_match(known_encodings, known_ids)),
+                    ("Matriz, todos", len(raw_rows), _gallery_match(face_gallery.FaceGallery(raw_rows))),
+                    ("Compacta", len(compact_rows), _gallery_match(face_gallery.FaceGallery(compact_rows))))
+        for name, templates, match in variants:
+            correct, accepted, us = _evaluate_gallery(match, probes, strangers, args.tolerance)
+            rows.append((label, name, templates, f"{correct / len(probes):.1%}",
+                         f"{accepted / len(strangers):.1%}" if strangers else "-", f"{us:.0f}",
+                         f"{compact_s:.2f} s" if name == "Compacta" else "-"))
+
+    if not args.from_db:
+        print(f"Identidades sintéticas, {args.per_student} capturas por estudiante, "
+              f"{args.pose_change:.0%} con cambio de pose, semilla {args.seed}")
+    print(f"Umbral de plantilla {args.threshold}, máximo {args.max_templates} por estudiante, coincidencia hasta {args.tolerance}")
+    _print_table(["Estudiantes", "Galería", "Plantillas", "Aciertos", "Desconocidos aceptados", "µs/rostro", "Compactar"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento de AI-Classroom.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_audio = sub.add_parser("audio", help="Latencia de detener-a-texto: ffmpeg frente a NumPy a 16 kHz.")
+    p_audio.add_argument('--minutes', type=float, default=10, help='Duración del audio sintético.')
+    p_audio.add_argument('--model', type=str, default=None, help='Tamaño de Whisper a usar (p. ej. tiny). Sin él solo se mide la carga.')
+    p_audio.set_defaults(func=bench_audio)
+
+    p_vad = sub.add_parser("vad", help="Silencio omitido por la detección de voz y aceleración resultante.")
+    p_vad.add_argument('--minutes', type=float, default=45, help='Duración de la clase sintética.')
+    p_vad.add_argument('--silence', type=float, default=0.4, help='Fracción de la clase sin voz (0-1).')
+    p_vad.add_argument('--model', type=str, default=None, help='Tamaño de Whisper a usar. Sin él solo se estima la aceleración.')
+    p_vad.set_defaults(func=bench_vad)
+
+    p_parallel = sub.add_parser("parallel", help="Transcripción secuencial frente a paralela en varios procesos.")
+    p_parallel.add_argument('--minutes', type=float, default=90, help='Duración de la grabación sintética.')
+    p_parallel.add_argument('--silence', type=float, default=0.2, help='Fracción de la grabación sin voz (0-1).')
+    p_parallel.add_argument('--model', type=str, default='tiny', help='Tamaño de Whisper a usar.')
+    p_parallel.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Números de procesos a comparar (el primero es la referencia).')
+    p_parallel.set_defaults(func=bench_parallel)
+
+    p_groups = sub.add_parser("groups", help="Formación de grupos: reparto anterior frente al optimizador por estilos.")
+    p_groups.add_argument('--students', type=int, nargs='+', default=[1000, 5000, 10000], help='Números de estudiantes a probar.')
+    p_groups.add_argument('--groups', type=int, nargs='+', default=[50, 300], help='Números de grupos a probar.')
+    p_groups.add_argument('--budget', type=float, default=10.0, help='Segundos máximos de búsqueda local.')
+    p_groups.add_argument('--seed', type=int, default=0, help='Semilla de ambos repartos.')
+    p_groups.set_defaults(func=bench_groups)
+
+    p_serve = sub.add_parser("serve", help="Prueba de carga: espectadores de un stream MJPEG y clientes de API simultáneos.")
+    p_serve.add_argument('--modes', nargs='+', choices=['threading', 'gevent'], default=['threading', 'gevent'], help='Modos de servidor a comparar.')
+    p_serve.add_argument('--viewers', type=int, nargs='+', default=[10, 50, 200, 500], help='Números de espectadores a probar.')
+    p_serve.add_argument('--clients', type=int, default=10, help='Clientes de API que piden sin pausa durante la prueba.')
+    p_serve.add_argument('--seconds', type=float, default=10, help='Duración de la medición de cada ronda.')
+    p_serve.add_argument('--warmup', type=float, default=3, help='Segundos de carga antes de medir.')
+    p_serve.add_argument('--fps', type=float, default=15, help='Frames por segundo del stream sintético.')
+    p_serve.add_argument('--work-ms', type=float, default=20, help='Milisegundos de CPU por frame (captura, visión y codificación).')
+    p_serve.add_argument('--frame-kb', type=int, default=40, help='Tamaño de cada frame JPEG.')
+    p_serve.add_argument('--max-p95-ms', type=float, default=250, help='Latencia p95 máxima de la API para considerar la carga sostenida.')
+    p_serve.add_argument('--compare-per-viewer', action='store_true', help='Medir también la captura anterior: un bucle de cámara por espectador.')
+    p_serve.set_defaults(func=bench_serve)
+
+    p_scan = sub.add_parser("scan", help="Detección de rostros del escaneo rápido: resolución completa frente a reducida con ROI.")
+    p_scan.add_argument('--image', type=str, required=True, help='Foto con un rostro (p. ej. una de rostros_registrados/).')
+    p_scan.add_argument('--frames', type=int, default=20, help='Frames simulados.')
+    p_scan.add_argument('--width', type=int, default=1920, help='Ancho del frame de cámara.')
+    p_scan.add_argument('--height', type=int, default=1080, help='Alto del frame de cámara.')
+    p_scan.set_defaults(func=bench_scan)
+
+    p_gallery = sub.add_parser("gallery", help="Reconocimiento contra todos los encodings frente a la galería compacta.")
+    p_gallery.add_argument('--students', type=int, nargs='+', default=[100, 1000, 5000], help='Números de estudiantes sintéticos.')
+    p_gallery.add_argument('--per-student', type=int, default=5, help='Capturas de registro por estudiante.')
+    p_gallery.add_argument('--pose-change', type=float, default=0.2, help='Fracción de estudiantes que cambia de pose durante el registro (0-1).')
+    p_gallery.add_argument('--threshold', type=float, default=None, help='Umbral de plantilla (por defecto el de face_gallery).')
+    p_gallery.add_argument('--max-templates', type=int, default=None, help='Plantillas máximas por estudiante (por defecto las de face_gallery).')
+    p_gallery.add_argument('--tolerance', type=float, default=0.6, help='Distancia máxima para aceptar una coincidencia.')
+    p_gallery.add_argument('--from-db', action='store_true', help='Usar los encodings de la base de datos en lugar de sintéticos.')
+    p_gallery.add_argument('--seed', type=int, default=0, help='Semilla de los datos sintéticos.')
+    p_gallery.set_defaults(func=bench_gallery)
+
+    p_serve_app = sub.add_parser("serve-app", help="(uso interno de serve) servidor sintético.")
+    p_serve_app.add_argument('--mode', choices=['threading', 'gevent'], default='threading')
+    p_serve_app.add_argument('--port', type=int, required=True)
+    p_serve_app.add_argument('--db', type=str, required=True)
+    p_serve_app.add_argument('--fps', type=float, default=15)
+    p_serve_app.add_argument('--work-ms', type=float, default=20)
+    p_serve_app.add_argument('--frame-kb', type=int, default=40)
+    p_serve_app.add_argument('--per-viewer', action='store_true')
+    p_serve_app.set_defaults(func=_serve_app)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
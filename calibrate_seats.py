@@ -34,8 +34,10 @@ import cv2
 import json
 import os
 
+import seat_store
+
 # Archivo donde se guardarán las asignaciones de estudiantes a asientos
-ASSIGNMENTS_FILE = os.path.join('data', 'seat_assignments.json')
+ASSIGNMENTS_FILE = seat_store.SEAT_ASSIGNMENTS_FILE
 
 
 def draw_boxes(frame, boxes, current_box):
@@ -96,16 +98,12 @@ def calibrate(output_path: str, camera_index: int = 0) -> None:
 
     def save_boxes_and_assignments():
         """Guarda inmediatamente las cajas y un archivo de asignaciones vacío."""
-        # Crear carpeta si no existe
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        # Guardar cajas
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(boxes, f, indent=4)
+        # Guardar cajas (escritura atómica: el servidor, si está en marcha,
+        # detecta el cambio y recarga la distribución sin leer un archivo a medias)
+        seat_store.write_json_atomic(output_path, boxes)
         # Crear archivo de asignaciones con valores nulos
         assignments = {b["seat_id"]: None for b in boxes}
-        os.makedirs(os.path.dirname(ASSIGNMENTS_FILE), exist_ok=True)
-        with open(ASSIGNMENTS_FILE, 'w', encoding='utf-8') as af:
-            json.dump(assignments, af, indent=4)
+        seat_store.write_json_atomic(ASSIGNMENTS_FILE, assignments)
         print(f"[SUCCESS] Asientos guardados automáticamente en {output_path}.")
 
     def mouse_callback(event, x, y, flags, param):
@@ -0,0 +1,52 @@
+"""Recompacta la galería de rostros desde los encodings guardados.
+
+Cada estudiante registrado tiene varios encodings en face_embeddings, casi
+siempre casi idénticos.  El reconocimiento compara contra la tabla
+face_templates: el centroide de cada estudiante y los encodings que se
+alejan de él más que el umbral (ver face_gallery.py).  Los registros nuevos
+ya guardan sus plantillas y la primera ejecución de la aplicación compacta
+los existentes; este script vuelve a calcularlas todas, p. ej. tras cambiar
+el umbral o importar encodings a mano.  face_embeddings no se modifica.
+
+Uso:
+    python compact_gallery.py
+    python compact_gallery.py --threshold 0.3 --max-templates 2
+    python compact_gallery.py --dry-run
+"""
+
+import argparse
+
+import database
+import face_gallery
+
+
+def run(args):
+    database.init_db()
+    if args.dry_run:
+        students = database.get_all_students()
+        embeddings = sum(len(s['embeddings']) for s in students)
+        templates = sum(len(face_gallery.compact_templates(s['embeddings'], args.threshold, args.max_templates)) for s in students)
+        stats = {"students": len(students), "embeddings": embeddings, "templates": templates}
+    else:
+        stats = database.rebuild_face_templates(args.threshold, args.max_templates)
+        if stats is None:
+            raise SystemExit("No se pudo recompactar la galería (ver el registro).")
+    print(f"Estudiantes: {stats['students']}  Encodings: {stats['embeddings']}  Plantillas: {stats['templates']}"
+          + ("  (sin guardar)" if args.dry_run else ""))
+    if stats['embeddings']:
+        print(f"Comparaciones por rostro: {stats['templates']} en lugar de {stats['embeddings']} "
+              f"({stats['templates'] / stats['embeddings']:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompacta la galería de rostros desde los encodings guardados.")
+    parser.add_argument('--threshold', type=float, default=face_gallery.GALLERY_TEMPLATE_DISTANCE,
+                        help='Distancia mínima para guardar un encoding como plantilla adicional.')
+    parser.add_argument('--max-templates', type=int, default=face_gallery.GALLERY_MAX_TEMPLATES,
+                        help='Plantillas máximas por estudiante, contando el centroide.')
+    parser.add_argument('--dry-run', action='store_true', help='Solo calcula cuántas plantillas quedarían.')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
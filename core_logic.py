@@ -4,30 +4,50 @@ import cv2
 import os
 import time
 import numpy as np
-import face_recognition
 import database
 import threading
 import datetime
-import pyaudio
-import wave
-import whisper
+import queue
+import struct
+import whisper_processor
+import transcription_jobs
+import group_formation
+import seat_store
+import face_scan
+import face_gallery
+import streaming
+import audio_archive
 import logging
-import random
 import llm_processor 
-import json  # Para cargar configuraciones de asientos
+import llm_worker
+import csv
+import io
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 cl_logger = logging.getLogger(__name__)
 
-try:
-    import tensorflow as tf
-    import tensorflow_hub as hub
-    MOVENET_MODEL = hub.load("https://tfhub.dev/google/movenet/multipose/lightning/1")
-    INPUT_SIZE = 256
-    cl_logger.info("✅ Modelo MoveNet MultiPose cargado exitosamente.")
-except Exception as e:
-    cl_logger.warning(f"🚨 ADVERTENCIA: TensorFlow o el modelo MoveNet no se pudo cargar ({e}). El monitoreo de pose no funcionará.")
-    MOVENET_MODEL = None
+# Los procesos hijos creados con 'spawn' (pool de Whisper, proceso del LLM)
+# importan este módulo al reejecutar app.py.  Por eso TensorFlow, MoveNet,
+# face_recognition y PyAudio se importan o cargan la primera vez que se usan.
+MOVENET_URL = "https://tfhub.dev/google/movenet/multipose/lightning/1"
+INPUT_SIZE = 256
+_movenet_model = None
+_movenet_error = None
+_movenet_lock = threading.Lock()
+
+def get_movenet_model():
+    """Modelo MoveNet MultiPose, cargado en la primera llamada; None si no está disponible."""
+    global _movenet_model, _movenet_error
+    with _movenet_lock:
+        if _movenet_model is None and _movenet_error is None:
+            try:
+                import tensorflow_hub as hub
+                _movenet_model = hub.load(MOVENET_URL)
+                cl_logger.info("✅ Modelo MoveNet MultiPose cargado exitosamente.")
+            except Exception as e:
+                _movenet_error = e
+                cl_logger.warning(f"🚨 ADVERTENCIA: TensorFlow o el modelo MoveNet no se pudo cargar ({e}). El monitoreo de pose no funcionará.")
+        return _movenet_model
 
 REGISTRO_FACIAL_DIR = "rostros_registrados"
 RECORDS_DIR = "records"
@@ -40,7 +60,11 @@ attendance_monitoring_active = False
 pose_monitoring_active = False
 is_recording_active = False
 audio_recording_thread = None
-audio_frames = []
+audio_writer_thread = None
+audio_wav_writer = None
+recording_started_at = None
+# Transcriptores en vivo por ruta WAV; el trabajo de transcripción final los recoge
+LIVE_TRANSCRIBERS = {}
 p_audio_instance = None
 
 # Indicador para el monitor de calibración.  Cuando es True, el generador de
@@ -59,9 +83,7 @@ EDGES = [(0, 1), (0, 2), (1, 3), (2, 4), (0, 5), (0, 6), (5, 7), (7, 9), (6, 8),
 # El sistema puede cargar un archivo de asientos y otro de asignaciones
 # para superponer cajas predefinidas en el streaming de pose.  También
 # permite asignar estudiantes a asientos y registrar participaciones.
-
-SEATS_FILE = os.path.join('data', 'seats.json')
-SEAT_ASSIGNMENTS_FILE = os.path.join('data', 'seat_assignments.json')
+# La distribución (cajas y asignaciones) vive en seat_store.SEAT_STORE.
 
 
 def _rect_pixels(rect, normalized, frame_shape):
@@ -72,10 +94,7 @@ def _rect_pixels(rect, normalized, frame_shape):
         return int(x*W), int(y*H), int(w*W), int(h*H)
     return int(x), int(y), int(w), int(h)
 
-# Estructuras globales que se inicializarán mediante load_seat_config().
-seat_boxes = []          # Lista de dicts con keys: seat_id, rect [x,y,w,h]
-seat_assignments = {}    # seat_id -> student_id
-participation_counts = {}  # seat_id -> int (participaciones acumuladas)
+participation_counts = {}  # seat_id -> int (participaciones acumuladas en el stream actual)
 seat_last_participation_time = {}  # seat_id -> datetime
 
 # Tiempo en segundos que debe pasar entre puntos consecutivos para un mismo asiento
@@ -89,29 +108,145 @@ VAK_QUESTIONS = {901: ("Recuerdo mejor lo que veo que lo que escucho.", "Visual"
 VAK_MAP = {"Visual": [901, 902, 903], "Auditivo": [911, 912, 913], "Kinestésico": [921, 922, 923]}
 ALL_QUESTIONS = {**KOLB_QUESTIONS, **FELDER_QUESTIONS, **VAK_QUESTIONS}
 
+# --- Puntuación de cuestionarios ---
+#
+# Las respuestas se manejan como una matriz estudiantes × QUESTION_IDS (0 =
+# sin respuesta).  Cada estilo se puntúa con una matriz de pesos fija:
+# sumas de Kolb y VAK por columna, y para cada dimensión de Felder +1 en las
+# preguntas del primer polo y -1 en las del segundo (diferencia >= 0 -> primer
+# polo).  Así un lote de cientos de cuestionarios se puntúa con tres
+# productos de matrices.
+
+QUESTION_IDS = sorted(ALL_QUESTIONS)
+_QUESTION_COLUMN = {qid: i for i, qid in enumerate(QUESTION_IDS)}
+
+def _sum_weights(style_map):
+    weights = np.zeros((len(QUESTION_IDS), len(style_map)))
+    for j, qids in enumerate(style_map.values()):
+        weights[[_QUESTION_COLUMN[q] for q in qids], j] = 1
+    return list(style_map), weights
+
+def _felder_weights():
+    weights = np.zeros((len(QUESTION_IDS), len(FELDER_DIMENSIONS)))
+    for j, (pA, pB, qids) in enumerate(FELDER_DIMENSIONS.values()):
+        for qid in qids:
+            pole = FELDER_QUESTIONS[qid][1]
+            weights[_QUESTION_COLUMN[qid], j] = 1 if pole == pA[0] else -1 if pole == pB[0] else 0
+    return weights
+
+KOLB_STYLES, KOLB_WEIGHTS = _sum_weights(KOLB_MAP)
+VAK_STYLES, VAK_WEIGHTS = _sum_weights(VAK_MAP)
+FELDER_WEIGHTS = _felder_weights()
+
+def responses_matrix(responses_list):
+    """Convierte dicts {id de pregunta: valor} en la matriz estudiantes × QUESTION_IDS."""
+    matrix = np.zeros((len(responses_list), len(QUESTION_IDS)))
+    for i, responses in enumerate(responses_list):
+        for qid, value in responses.items():
+            if qid in _QUESTION_COLUMN:
+                matrix[i, _QUESTION_COLUMN[qid]] = value
+    return matrix
+
+def score_learning_styles(matrix):
+    """Estilos dominantes de cada fila de `matrix`: lista de (kolb, felder, vak).
+
+    En caso de empate gana el primer estilo en el orden de KOLB_MAP / VAK_MAP
+    y el primer polo de cada dimensión de Felder.
+    """
+    kolb = np.argmax(matrix @ KOLB_WEIGHTS, axis=1)
+    vak = np.argmax(matrix @ VAK_WEIGHTS, axis=1)
+    first_pole = (matrix @ FELDER_WEIGHTS) >= 0
+    dimensions = list(FELDER_DIMENSIONS.items())
+    return [(KOLB_STYLES[k],
+             {dim: (pA if a else pB)[0] for (dim, (pA, pB, _)), a in zip(dimensions, row)},
+             VAK_STYLES[v])
+            for k, row, v in zip(kolb, first_pole, vak)]
+
 def calculate_learning_styles(responses):
-    kolb_scores = {k: sum(responses.get(q, 0) for q in qs) for k, qs in KOLB_MAP.items()}
-    kolb_dominant = max(kolb_scores, key=kolb_scores.get) if kolb_scores else "N/A"
-    felder_dominant = {}
-    for dim, (pA, pB, qids) in FELDER_DIMENSIONS.items():
-        a = sum(responses.get(qid, 0) for qid in qids if FELDER_QUESTIONS[qid][1] == pA[0])
-        b = sum(responses.get(qid, 0) for qid in qids if FELDER_QUESTIONS[qid][1] == pB[0])
-        felder_dominant[dim] = pA[0] if a >= b else pB[0]
-    vak_scores = {k: sum(responses.get(q, 0) for q in qs) for k, qs in VAK_MAP.items()}
-    vak_dominant = max(vak_scores, key=vak_scores.get) if vak_scores else "N/A"
-    return kolb_dominant, felder_dominant, vak_dominant
-
-def form_smart_groups(num_groups):
+    return score_learning_styles(responses_matrix([responses]))[0]
+
+# Valores válidos de cada respuesta (escala del cuestionario)
+QUESTIONNAIRE_MIN_VALUE = 1
+QUESTIONNAIRE_MAX_VALUE = 5
+
+def parse_questionnaire_csv(text):
+    """Lee un CSV con una fila por estudiante: student_id y una columna por pregunta.
+
+    Las columnas de pregunta llevan el id de ALL_QUESTIONS (con o sin 'q'
+    delante, p. ej. "101" o "q101"); las celdas vacías cuentan como sin
+    respuesta.  Devuelve (ids, matriz de respuestas, errores); las filas con
+    errores no se incluyen.
+    """
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return [], np.zeros((0, len(QUESTION_IDS))), ["El archivo está vacío."]
+    header, errors = rows[0], []
+    columns = []
+    for name in header[1:]:
+        try:
+            qid = int(name.strip().lstrip('qQ'))
+        except ValueError:
+            qid = None
+        if qid not in _QUESTION_COLUMN:
+            errors.append(f"Columna desconocida ignorada: '{name}'.")
+        columns.append(_QUESTION_COLUMN.get(qid))
+    if not any(c is not None for c in columns):
+        return [], np.zeros((0, len(QUESTION_IDS))), errors + ["El encabezado no contiene ninguna pregunta conocida."]
+    student_ids, matrix = [], []
+    for line, row in enumerate(rows[1:], start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        student_id = row[0].strip()
+        values = np.zeros(len(QUESTION_IDS))
+        try:
+            if not student_id:
+                raise ValueError("falta student_id")
+            for column, cell in zip(columns, row[1:]):
+                if column is None or not cell.strip():
+                    continue
+                value = int(cell)
+                if not QUESTIONNAIRE_MIN_VALUE <= value <= QUESTIONNAIRE_MAX_VALUE:
+                    raise ValueError(f"valor fuera de rango: {value}")
+                values[column] = value
+        except ValueError as e:
+            errors.append(f"Línea {line}: {e}")
+            continue
+        student_ids.append(student_id)
+        matrix.append(values)
+    return student_ids, np.array(matrix).reshape(-1, len(QUESTION_IDS)), errors
+
+def import_questionnaires_csv(text):
+    """Puntúa todos los cuestionarios de un CSV y los guarda en una sola transacción.
+
+    Si un estudiante aparece varias veces, se conserva su última fila.
+    """
+    student_ids, matrix, errors = parse_questionnaire_csv(text)
+    if not student_ids:
+        return {"success": False, "message": "No hay cuestionarios válidos en el archivo.", "errors": errors}
+    rows = {sid: styles for sid, styles in zip(student_ids, score_learning_styles(matrix))}
+    result = database.add_learning_styles_bulk([(sid, *styles) for sid, styles in rows.items()]).result()
+    if result is None:
+        return {"success": False, "message": "Error al guardar los estilos de aprendizaje.", "errors": errors}
+    saved, unknown = result
+    cl_logger.info(f"Cuestionarios importados: {saved} guardados, {len(unknown)} estudiantes desconocidos, {len(errors)} errores.")
+    return {"success": True, "imported": saved, "unknown_students": unknown, "errors": errors,
+            "message": f"{saved} cuestionarios importados."}
+
+def form_smart_groups(num_groups=None, group_size=None, seed=None, time_budget=group_formation.GROUP_TIME_BUDGET_SECONDS):
+    """Forma grupos balanceados por estilos de aprendizaje con los estudiantes evaluados.
+
+    Se indica el número de grupos o el tamaño deseado (el número de grupos
+    se redondea para que los tamaños difieran como mucho en uno).
+    Devuelve (grupos, métricas, error); ver group_formation.form_groups.
+    """
     students = database.get_all_students_with_learning_styles()
     eligible = [s for s in students if s.get('kolb_style')]
-    if not eligible or num_groups <= 0 or num_groups > len(eligible):
-        return [], "No hay suficientes estudiantes evaluados para formar los grupos."
-    random.shuffle(eligible)
-    groups = [[] for _ in range(num_groups)]
-    for student in eligible:
-        groups.sort(key=len)
-        groups[0].append(student)
-    return groups, None
+    if not num_groups and group_size:
+        num_groups = max(1, round(len(eligible) / group_size))
+    if not eligible or not num_groups or num_groups <= 0 or num_groups > len(eligible):
+        return [], None, "No hay suficientes estudiantes evaluados para formar los grupos."
+    groups, stats = group_formation.form_groups(eligible, num_groups, seed=seed, time_budget=time_budget)
+    return groups, stats, None
 
 def get_current_attendance_period():
     now = datetime.datetime.now()
@@ -131,77 +266,29 @@ def get_current_attendance_period():
 # streaming de pose para reconocer gestos y otorgar puntos a los estudiantes
 # asignados a cada asiento.
 
-def load_seat_config():
-    """Carga la configuración de asientos y asignaciones desde disco.
-
-    Lee los archivos definidos en SEATS_FILE y SEAT_ASSIGNMENTS_FILE.  Si
-    data/seats.json no existe o está vacío, seat_boxes permanece vacío y la
-    funcionalidad de asientos estará inactiva.
-    """
-    global seat_boxes, seat_assignments, participation_counts
-    # Cargar cajas de asientos
-    if os.path.exists(SEATS_FILE):
-        try:
-            with open(SEATS_FILE, 'r', encoding='utf-8') as f:
-                seat_boxes = json.load(f)
-        except Exception as e:
-            cl_logger.warning(f"No se pudo cargar {SEATS_FILE}: {e}")
-            seat_boxes = []
-    else:
-        seat_boxes = []
-    # Cargar asignaciones si existen
-    if os.path.exists(SEAT_ASSIGNMENTS_FILE):
-        try:
-            with open(SEAT_ASSIGNMENTS_FILE, 'r', encoding='utf-8') as f:
-                seat_assignments.update(json.load(f))
-        except Exception:
-            seat_assignments.clear()
-    else:
-        seat_assignments.clear()
-    # Inicializar contadores de participaciones
+def reset_participation_counts():
+    """Pone a cero los contadores de participación de todos los asientos (al iniciar un stream)."""
     participation_counts.clear()
-    for seat in seat_boxes:
+    for seat in seat_store.SEAT_STORE.current().boxes:
         participation_counts[seat.get('seat_id')] = 0
 
-# --- Funciones auxiliares para asientos ---
-
-def save_seat_boxes():
-    """Guarda la lista global de seat_boxes en el archivo SEATS_FILE.
-
-    También asegura que exista el directorio de datos.
-    """
-    try:
-        os.makedirs(os.path.dirname(SEATS_FILE), exist_ok=True)
-        with open(SEATS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(seat_boxes, f, indent=4)
-        cl_logger.info(f"Asientos guardados en {SEATS_FILE}.")
-    except Exception as e:
-        cl_logger.warning(f"No se pudo guardar los asientos: {e}")
-
 
 def get_seat_boxes():
-    """Devuelve la lista actual de asientos.
-
-    Carga la configuración si aún no se ha inicializado.
-    """
-    if not seat_boxes:
-        load_seat_config()
-    return seat_boxes
+    """Devuelve la lista actual de asientos."""
+    return list(seat_store.SEAT_STORE.current().boxes)
 
 
 def get_seat_assignments():
     """Devuelve las asignaciones de asientos actuales."""
-    if not seat_assignments:
-        load_seat_config()
-    return seat_assignments
+    return dict(seat_store.SEAT_STORE.current().assignments)
 
 
 def add_seat_box(x, y, w, h, normalized: bool=False) -> str:
     """Agrega un nuevo asiento a la configuración.
 
     El identificador de asiento se genera automáticamente como "Pupitre N",
-    donde N es el número siguiente basado en la longitud de seat_boxes.
-    Se actualiza inmediatamente la configuración en disco y las asignaciones.
+    donde N es el número siguiente basado en la cantidad de asientos.
+    El cambio se publica al instante y se guarda en disco poco después.
 
     Args:
         x, y, w, h (int): Coordenadas y tamaño del rectángulo en píxeles.
@@ -209,36 +296,33 @@ def add_seat_box(x, y, w, h, normalized: bool=False) -> str:
     Returns:
         str: El seat_id generado para el nuevo asiento.
     """
-    # Asegurar que la configuración esté cargada
-    if not seat_boxes:
-        load_seat_config()
-    seat_id = f"Pupitre {len(seat_boxes) + 1}"
-    seat_boxes.append({"seat_id": seat_id, "rect": [float(x), float(y), float(w), float(h)], "normalized": bool(normalized)})
-    # Inicializar contador y asignación
+    def change(boxes, assignments):
+        seat_id = f"Pupitre {len(boxes) + 1}"
+        boxes.append({"seat_id": seat_id, "rect": [float(x), float(y), float(w), float(h)], "normalized": bool(normalized)})
+        assignments[seat_id] = None
+        return seat_id
+    seat_id = seat_store.SEAT_STORE.update(change)
     participation_counts[seat_id] = 0
-    seat_assignments[seat_id] = None
-    # Guardar a disco
-    save_seat_boxes()
-    save_seat_assignments()
     return seat_id
 
 
 def remove_last_seat_box() -> bool:
-    """Elimina el último asiento de la lista y actualiza disco.
+    """Elimina el último asiento de la lista.
 
     Returns:
         bool: True si se eliminó un asiento, False si no había asientos.
     """
-    if not seat_boxes:
+    def change(boxes, assignments):
+        if not boxes:
+            return False
+        removed = boxes.pop()
+        assignments.pop(removed.get('seat_id'), None)
+        return removed
+    removed = seat_store.SEAT_STORE.update(change)
+    if not removed:
         return False
-    removed = seat_boxes.pop()
     sid = removed.get('seat_id')
-    # Eliminar asignación y contador
-    seat_assignments.pop(sid, None)
     participation_counts.pop(sid, None)
-    # Guardar cambios
-    save_seat_boxes()
-    save_seat_assignments()
     cl_logger.info(f"Se eliminó la caja de asiento {sid}")
     return True
 
@@ -271,12 +355,10 @@ def generate_calibrate_frames():
 
     Este generador se utiliza para transmitir en streaming las imágenes de la
     cámara con las cajas de asientos dibujadas.  Requiere que el monitor de
-    calibración esté activo.  Cada iteración verifica seat_boxes para
-    reflejar cambios en tiempo real.
+    calibración esté activo.  Cada iteración toma la distribución vigente
+    para reflejar cambios en tiempo real.
     """
     global calibration_monitor_active
-    # Cargar asientos iniciales
-    load_seat_config()
     cap = cv2.VideoCapture(0)
     cl_logger.info("Iniciando stream de CALIBRACIÓN.")
     while cap.isOpened() and calibration_monitor_active:
@@ -285,8 +367,8 @@ def generate_calibrate_frames():
             break
         frame_display = cv2.flip(frame, 1)
         # Dibujar cajas de asientos
-        for seat in seat_boxes:
-            x, y, w_s, h_s = _rect_pixels(seat.get('rect'), seat.get('normalized', False), frame.shape if 'frame' in locals() else frame_display.shape)
+        for seat in seat_store.SEAT_STORE.current().boxes:
+            x, y, w_s, h_s = _rect_pixels(seat.get('rect'), seat.get('normalized', False), frame_display.shape)
             sid = seat.get('seat_id')
             cv2.rectangle(frame_display, (x, y), (x + w_s, y + h_s), (0, 255, 0), 2)
             cv2.putText(frame_display, sid, (x, max(0, y - 5)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
@@ -297,16 +379,6 @@ def generate_calibrate_frames():
     cl_logger.info("Stream de CALIBRACIÓN detenido.")
 
 
-def save_seat_assignments():
-    """Guarda las asignaciones de asientos en disco."""
-    try:
-        os.makedirs(os.path.dirname(SEAT_ASSIGNMENTS_FILE), exist_ok=True)
-        with open(SEAT_ASSIGNMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(seat_assignments, f, indent=4)
-    except Exception as e:
-        cl_logger.warning(f"No se pudo guardar asignaciones en {SEAT_ASSIGNMENTS_FILE}: {e}")
-
-
 def assign_student_to_seat(student_id: str, seat_id: str) -> bool:
     """Asigna un estudiante a un asiento.
 
@@ -318,22 +390,23 @@ def assign_student_to_seat(student_id: str, seat_id: str) -> bool:
         True si la asignación se realizó correctamente, False si el asiento no
         existe.
     """
-    # Verificar que exista el asiento
-    if not any(s.get('seat_id') == seat_id for s in seat_boxes):
-        return False
-    # Permitir desasignar si student_id es vacío o None
-    if not student_id:
-        seat_assignments.pop(seat_id, None)
-    else:
-        seat_assignments[seat_id] = student_id
-    save_seat_assignments()
-    return True
+    def change(boxes, assignments):
+        # Verificar que exista el asiento
+        if not any(s.get('seat_id') == seat_id for s in boxes):
+            return False
+        # Permitir desasignar si student_id es vacío o None
+        if not student_id:
+            assignments.pop(seat_id, None)
+        else:
+            assignments[seat_id] = student_id
+        return True
+    return bool(seat_store.SEAT_STORE.update(change))
 
 
 def rename_seat(old_id: str, new_id: str) -> bool:
     """Renombra un asiento existente.
 
-    Este método modifica el identificador de un asiento en `seat_boxes` y actualiza
+    Este método modifica el identificador de un asiento en la distribución y actualiza
     las estructuras de asignaciones y contadores para reflejar el nuevo id.
 
     Args:
@@ -344,36 +417,53 @@ def rename_seat(old_id: str, new_id: str) -> bool:
         True si el renombrado se realizó con éxito, False en caso contrario (por
         ejemplo, si el id viejo no existe o el nuevo ya está en uso).
     """
-    # Cargar configuración si aún no se ha hecho
-    if not seat_boxes:
-        load_seat_config()
-    # Verificar que exista el asiento y que el nuevo id no esté en uso
-    if not any(seat.get('seat_id') == old_id for seat in seat_boxes):
-        return False
-    if any(seat.get('seat_id') == new_id for seat in seat_boxes):
+    def change(boxes, assignments):
+        # Verificar que exista el asiento y que el nuevo id no esté en uso
+        if not any(seat.get('seat_id') == old_id for seat in boxes):
+            return False
+        if any(seat.get('seat_id') == new_id for seat in boxes):
+            return False
+        for seat in boxes:
+            if seat.get('seat_id') == old_id:
+                seat['seat_id'] = new_id
+                break
+        if old_id in assignments:
+            assignments[new_id] = assignments.pop(old_id)
+        return True
+    if not seat_store.SEAT_STORE.update(change):
         return False
-    # Renombrar en seat_boxes
-    for seat in seat_boxes:
-        if seat.get('seat_id') == old_id:
-            seat['seat_id'] = new_id
-            break
-    # Actualizar asignaciones
-    if old_id in seat_assignments:
-        seat_assignments[new_id] = seat_assignments.pop(old_id)
     # Actualizar contadores y timestamps
     if old_id in participation_counts:
         participation_counts[new_id] = participation_counts.pop(old_id)
     if old_id in seat_last_participation_time:
         seat_last_participation_time[new_id] = seat_last_participation_time.pop(old_id)
-    # Guardar cambios a disco
-    save_seat_boxes()
-    save_seat_assignments()
     return True
 
+# Galería compacta en memoria; se vuelve a leer cuando cambia en la base de datos
+_face_gallery = None
+_face_gallery_signature = None
+_face_gallery_lock = threading.Lock()
+
+def get_face_gallery():
+    """Plantillas de rostro de todos los estudiantes (face_gallery.FaceGallery)."""
+    global _face_gallery, _face_gallery_signature
+    signature = database.get_face_templates_signature()
+    with _face_gallery_lock:
+        if _face_gallery is None or signature != _face_gallery_signature:
+            _face_gallery = face_gallery.FaceGallery(database.get_face_templates())
+            _face_gallery_signature = signature
+        return _face_gallery
+
+# Duración máxima del escaneo rápido con la cámara
+QUICK_SCAN_SECONDS = 3.0
+# Distancia con la que la coincidencia se da por segura y se deja de escanear
+QUICK_SCAN_CONFIDENT_DISTANCE = 0.4
+
 def quick_scan_and_identify():
     """
     Realiza un escaneo facial rápido utilizando la cámara web y devuelve
-    la mejor coincidencia encontrada en aproximadamente 3 segundos.
+    la mejor coincidencia encontrada en como mucho QUICK_SCAN_SECONDS.
+    Termina antes si encuentra una coincidencia segura.
 
     Retorna un diccionario con keys:
       - success: bool
@@ -382,52 +472,49 @@ def quick_scan_and_identify():
       - confidence: porcentaje de confianza (0-100) de la coincidencia
       - message: mensaje de error en caso de fallo
     """
-    # Obtener estudiantes registrados y sus embeddings
-    students_data = database.get_all_students()
-    if not students_data:
+    # Plantillas de los estudiantes registrados
+    gallery = get_face_gallery()
+    if not gallery.students:
         return {"success": False, "message": "No hay estudiantes registrados para reconocer."}
-    # Construir lista de encodings y metadatos
-    known_face_encodings = []
-    known_metadata = []
-    for s in students_data:
-        # Cada estudiante puede tener múltiples embeddings
-        for emb in s.get('embeddings', []):
-            known_face_encodings.append(np.array(emb))
-            nombre_completo = f"{s.get('nombre')} {s.get('apellido', '')}".strip()
-            known_metadata.append({'id': s.get('id'), 'nombre': nombre_completo})
     # Abrir cámara
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         return {"success": False, "message": "Cámara no disponible."}
-    # Escanear durante un tiempo limitado
-    start_time = time.time()
+    # Escanear durante un tiempo limitado; el rostro de un frame limita la
+    # búsqueda en el siguiente
+    start_time = time.monotonic()
     best_match = None
     best_confidence = 0.0
+    best_distance = 1.0
+    roi = None
+    frames = 0
     try:
-        while time.time() - start_time < 3.0:
+        while time.monotonic() - start_time < QUICK_SCAN_SECONDS and best_distance > QUICK_SCAN_CONFIDENT_DISTANCE:
             ret, frame = cap.read()
             if not ret:
                 continue
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
+            frames += 1
+            face_locations = face_scan.detect_faces(frame, roi)
             if not face_locations:
+                roi = None
                 continue
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            for encoding in face_encodings:
-                # Calcular distancias a los rostros conocidos
-                face_distances = face_recognition.face_distance(known_face_encodings, encoding)
-                if len(face_distances) == 0:
+            roi = max(face_locations, key=face_scan.box_area)
+            for box, encoding in zip(face_locations, face_scan.encode_faces(frame, face_locations)):
+                if encoding is None:
                     continue
-                best_match_index = np.argmin(face_distances)
-                distance = face_distances[best_match_index]
+                # Plantilla más cercana entre los rostros conocidos
+                match, distance = gallery.match(encoding)
                 # Solo consideramos coincidencias con distancia razonable
-                if distance < 0.6:
+                if match and distance < 0.6:
                     confidence = (1.0 - distance) * 100.0
                     if confidence > best_confidence:
                         best_confidence = confidence
-                        best_match = known_metadata[best_match_index]
+                        best_distance = distance
+                        best_match = match
+                        roi = box
     finally:
         cap.release()
+    cl_logger.info(f"Escaneo rápido: {frames} frames en {time.monotonic() - start_time:.1f} s.")
     if best_match:
         return {"success": True, "student_id": best_match['id'], "student_name": best_match['nombre'], "confidence": best_confidence}
     # No se encontró coincidencia
@@ -456,7 +543,8 @@ def confirm_attendance(student_id: str) -> dict:
     if database.has_attended_today_in_period(student_id, periodo):
         return {"success": False, "message": "La asistencia ya fue registrada para hoy en este período."}
     try:
-        database.record_attendance(student_id, periodo)
+        if not database.record_attendance(student_id, periodo).result():
+            return {"success": False, "message": "Error al registrar asistencia en la base de datos."}
         nombre_completo = f"{student.get('nombre')} {student.get('apellido', '')}".strip()
         return {"success": True, "message": f"Asistencia registrada para {nombre_completo}."}
     except Exception as e:
@@ -490,7 +578,7 @@ def award_participation_for_seat(seat_id: str) -> bool:
         participation_counts[seat_id] = 0
     participation_counts[seat_id] += 1
     # Registrar en base de datos si hay estudiante y período válido
-    student_id = seat_assignments.get(seat_id)
+    student_id = seat_store.SEAT_STORE.current().assignments.get(seat_id)
     if student_id:
         periodo, _ = get_current_attendance_period()
         if periodo:
@@ -503,6 +591,7 @@ def register_student_from_camera(student_id, nombre, apellido):
     cap = cv2.VideoCapture(0)
     if not cap.isOpened(): return {"success": False, "message": "Error: Cámara no disponible."}
     
+    import face_recognition
     captured_embeddings, required_embeddings, start_time = [], 5, time.time()
     try:
         while len(captured_embeddings) < required_embeddings and (time.time() - start_time) < 20:
@@ -533,14 +622,12 @@ def register_student_from_camera(student_id, nombre, apellido):
 
 def generate_attendance_frames():
     global attendance_monitoring_active
-    students_data = database.get_all_students()
-    if not students_data:
+    gallery = get_face_gallery()
+    if not gallery.students:
         cl_logger.warning("No hay estudiantes registrados para iniciar monitoreo de asistencia.")
         return
 
-    known_face_encodings = [np.array(emb) for s in students_data for emb in s['embeddings']]
-    known_face_metadata = [{'id': s['id'], 'nombre': s['nombre']} for s in students_data for _ in s['embeddings']]
-
+    import face_recognition
     cap = cv2.VideoCapture(0)
     cl_logger.info("Iniciando stream de ASISTENCIA.")
 
@@ -563,22 +650,20 @@ def generate_attendance_frames():
             face_names = []
 
             for face_encoding in face_encodings:
-                matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
                 name = "Desconocido"
                 
-                face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        metadata = known_face_metadata[best_match_index]
-                        student_id = metadata['id']
-                        confidence = (1.0 - face_distances[best_match_index]) * 100
-                        name = f"{metadata['nombre']} ({confidence:.1f}%)"
-                        
-                        periodo, _ = get_current_attendance_period()
-                        if periodo and not database.has_attended_today_in_period(student_id, periodo):
-                            database.record_attendance(student_id, periodo)
-                            cl_logger.info(f"Asistencia registrada para {metadata['nombre']} en {periodo}")
+                metadata, distance = gallery.match(face_encoding)
+                # Mismo umbral que face_recognition.compare_faces
+                if metadata and distance <= 0.6:
+                    student_id = metadata['id']
+                    confidence = (1.0 - distance) * 100
+                    name = f"{metadata['nombre']} ({confidence:.1f}%)"
+                    
+                    periodo, _ = get_current_attendance_period()
+                    if periodo and not database.has_attended_today_in_period(student_id, periodo):
+                        # Esperar la confirmación para que la siguiente comprobación la vea
+                        database.record_attendance(student_id, periodo).result()
+                        cl_logger.info(f"Asistencia registrada para {metadata['nombre']} en {periodo}")
                 
                 face_names.append(name)
 
@@ -598,18 +683,30 @@ def generate_attendance_frames():
     cl_logger.info("Stream de ASISTENCIA detenido.")
 
 def movenet(input_image):
+    import tensorflow as tf
     input_image = tf.cast(tf.image.resize_with_pad(input_image, INPUT_SIZE, INPUT_SIZE), dtype=tf.int32)
-    outputs = MOVENET_MODEL.signatures['serving_default'](input_image)
+    outputs = get_movenet_model().signatures['serving_default'](input_image)
     return outputs['output_0'].numpy()
 
+def _seat_student_name(student_id):
+    if not student_id:
+        return ""
+    try:
+        student = database.get_student_by_id(student_id)
+        return f"{student.get('nombre')} {student.get('apellido', '')}".strip() if student else ""
+    except Exception:
+        return ""
+
 def generate_pose_frames():
     global pose_monitoring_active
-    if not MOVENET_MODEL:
+    if get_movenet_model() is None:
         return
-    # Cargar configuración de asientos al iniciar el streaming
-    load_seat_config()
+    reset_participation_counts()
     cap = cv2.VideoCapture(0)
     cl_logger.info("Iniciando stream de POSE.")
+    # Datos derivados de la distribución de asientos; se rehacen cuando cambia
+    # su versión (ediciones desde la web o el archivo), sin reiniciar el stream
+    layout_version, seats = None, []
     while cap.isOpened() and pose_monitoring_active:
         ret, frame = cap.read()
         if not ret:
@@ -617,6 +714,15 @@ def generate_pose_frames():
         frame_display = cv2.flip(frame, 1)
         h, w, _ = frame_display.shape
 
+        layout = seat_store.SEAT_STORE.current()
+        if layout.version != layout_version:
+            seats = [(seat.get('seat_id'), _rect_pixels(seat.get('rect'), seat.get('normalized', False), frame_display.shape),
+                      _seat_student_name(layout.assignments.get(seat.get('seat_id'))))
+                     for seat in layout.boxes]
+            if layout_version is not None:
+                cl_logger.info(f"Stream de POSE: distribución de asientos actualizada (versión {layout.version}).")
+            layout_version = layout.version
+
         # Ejecutar MoveNet para obtener keypoints de múltiples personas
         results = movenet(np.expand_dims(frame_display, axis=0))
 
@@ -660,13 +766,11 @@ def generate_pose_frames():
                         highest_hand = (rx_px, ry_px)
 
         # Si se detectó una mano levantada en este frame, intentar asignar a un asiento
-        if highest_hand is not None and seat_boxes:
+        if highest_hand is not None and seats:
             hx_px, hy_px = highest_hand
             # Determinar el asiento con el que colisiona la mano (x,y dentro de la caja verticalmente sobre el asiento)
             selected_seat_id = None
-            for seat in seat_boxes:
-                x, y, w_s, h_s = _rect_pixels(seat.get('rect'), seat.get('normalized', False), frame.shape if 'frame' in locals() else frame_display.shape)
-                seat_id = seat.get('seat_id')
+            for seat_id, (x, y, w_s, h_s), _ in seats:
                 # Considerar la mano como participación si está por encima del top del asiento y en rango horizontal
                 if hx_px >= x and hx_px <= x + w_s and hy_px <= y + h_s:
                     selected_seat_id = seat_id
@@ -678,21 +782,9 @@ def generate_pose_frames():
                     cv2.putText(frame_display, f"{selected_seat_id} +1", (hx_px - 40, hy_px - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
 
         # Dibujar boxes de asientos y etiquetas
-        for seat in seat_boxes:
-            sx, sy, sw, sh = _rect_pixels(seat.get('rect'), seat.get('normalized', False), frame.shape if 'frame' in locals() else frame_display.shape)
-            sid = seat.get('seat_id')
+        for sid, (sx, sy, sw, sh), student_name in seats:
             # Determinar color según si hay mano actual en este asiento
             color = (0, 255, 0)
-            # Obtener nombre del estudiante
-            student_id = seat_assignments.get(sid)
-            student_name = ""
-            if student_id:
-                try:
-                    student = database.get_student_by_id(student_id)
-                    if student:
-                        student_name = f"{student.get('nombre')} {student.get('apellido', '')}".strip()
-                except Exception:
-                    student_name = ""
             pts = participation_counts.get(sid, 0)
             # Dibujar el rectángulo del asiento
             cv2.rectangle(frame_display, (sx, sy), (sx + sw, sy + sh), color, 2)
@@ -711,6 +803,14 @@ def generate_pose_frames():
     cap.release()
     cl_logger.info("Stream de POSE detenido.")
 
+# Una sola captura por stream, compartida por todos los navegadores que lo miran
+ATTENDANCE_STREAM = streaming.FrameBroadcaster("asistencia", generate_attendance_frames)
+POSE_STREAM = streaming.FrameBroadcaster("pose", generate_pose_frames)
+CALIBRATION_STREAM = streaming.FrameBroadcaster("calibración", generate_calibrate_frames)
+
+def get_stream_status():
+    return [stream.status() for stream in (ATTENDANCE_STREAM, POSE_STREAM, CALIBRATION_STREAM)]
+
 def start_attendance_monitoring():
     global attendance_monitoring_active
     if attendance_monitoring_active or pose_monitoring_active: return {"success": False, "message": "Otro monitoreo ya está activo."}
@@ -744,78 +844,328 @@ def delete_student(student_id):
     except Exception as e:
         return {"success": False, "message": f"Error al eliminar: {e}"}
 
-def _record_audio_loop():
-    global audio_frames, is_recording_active, p_audio_instance
-    CHUNK=1024; p_audio_instance = pyaudio.PyAudio()
-    stream = p_audio_instance.open(format=pyaudio.paInt16, channels=1, rate=44100, input=True, frames_per_buffer=CHUNK)
-    audio_frames = []
-    cl_logger.info("Grabación de audio iniciada.")
-    while is_recording_active: audio_frames.append(stream.read(CHUNK))
-    cl_logger.info("Grabación de audio detenida.")
-    stream.stop_stream(); stream.close(); p_audio_instance.terminate()
-
-def start_manual_audio_recording():
-    global is_recording_active, audio_recording_thread
+# --- Grabación de audio en streaming ---
+#
+# El hilo de captura solo lee bloques del micrófono y los deja en una cola
+# acotada; un hilo escritor los vuelca directamente al WAV.  La memoria usada
+# es constante (como mucho AUDIO_QUEUE_MAX_CHUNKS bloques) sin importar la
+# duración de la clase.  La cabecera WAV se actualiza cada
+# WAV_HEADER_PATCH_SECONDS, de modo que si el proceso muere el archivo sigue
+# siendo legible, y recover_incomplete_recordings() corrige el resto al iniciar.
+
+# Se captura directamente a la frecuencia que usa Whisper (16 kHz mono), lo que
+# evita el remuestreo con ffmpeg al transcribir y reduce 2.75x el tamaño del
+# WAV.  Si el micrófono no admite 16 kHz se graba a AUDIO_FALLBACK_RATE y el
+# remuestreo se hace en memoria con NumPy (whisper_processor.load_audio).
+AUDIO_RATE = whisper_processor.WHISPER_SAMPLE_RATE
+AUDIO_FALLBACK_RATE = 44100
+AUDIO_CHUNK = 1024
+AUDIO_CHANNELS = 1
+AUDIO_SAMPLE_WIDTH = 2  # paInt16
+AUDIO_QUEUE_MAX_CHUNKS = 256  # ~16 s de audio a 16 kHz
+WAV_HEADER_PATCH_SECONDS = 5.0
+WAV_HEADER_SIZE = 44
+
+def _wav_header(data_bytes, rate, channels, sample_width):
+    block_align = channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes, b'WAVE', b'fmt ', 16, 1, channels,
+                       rate, rate * block_align, block_align, sample_width * 8, b'data', data_bytes)
+
+class StreamingWavWriter:
+    """Escribe PCM a un archivo WAV a medida que llegan los bloques."""
+
+    def __init__(self, path, rate=AUDIO_RATE, channels=AUDIO_CHANNELS, sample_width=AUDIO_SAMPLE_WIDTH):
+        self.path = path
+        self.rate, self.channels, self.sample_width = rate, channels, sample_width
+        self.data_bytes = 0
+        self._file = open(path, 'wb')
+        self._file.write(_wav_header(0, rate, channels, sample_width))
+        self._last_patch = time.monotonic()
+
+    @property
+    def frames_written(self):
+        return self.data_bytes // (self.channels * self.sample_width)
+
+    def write(self, data):
+        self._file.write(data)
+        self.data_bytes += len(data)
+        if time.monotonic() - self._last_patch >= WAV_HEADER_PATCH_SECONDS:
+            self._patch_header()
+
+    def _patch_header(self):
+        """Reescribe los tamaños RIFF/data con lo escrito hasta ahora y sincroniza a disco."""
+        pos = self._file.tell()
+        self._file.seek(0)
+        self._file.write(_wav_header(self.data_bytes, self.rate, self.channels, self.sample_width))
+        self._file.seek(pos)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_patch = time.monotonic()
+
+    def close(self):
+        if self._file.closed: return
+        self._patch_header()
+        self._file.close()
+
+def repair_wav_header(path):
+    """Ajusta la cabecera de un WAV al tamaño real de sus datos.
+
+    Returns:
+        bool: True si la cabecera estaba desactualizada y se corrigió.
+    """
+    size = os.path.getsize(path)
+    if size < WAV_HEADER_SIZE: return False
+    with open(path, 'r+b') as f:
+        header = f.read(WAV_HEADER_SIZE)
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE' or header[36:40] != b'data':
+            return False
+        block_align = struct.unpack('<H', header[32:34])[0] or 1
+        data_bytes = size - WAV_HEADER_SIZE
+        data_bytes -= data_bytes % block_align
+        if struct.unpack('<I', header[40:44])[0] == data_bytes:
+            return False
+        f.seek(4); f.write(struct.pack('<I', 36 + data_bytes))
+        f.seek(40); f.write(struct.pack('<I', data_bytes))
+    return True
+
+def recover_incomplete_recordings():
+    """Corrige las cabeceras de grabaciones interrumpidas (p. ej. por un cierre abrupto)."""
+    repaired = []
+    for name in os.listdir(RECORDS_DIR):
+        path = os.path.join(RECORDS_DIR, name)
+        if name.endswith('.wav') and os.path.isfile(path):
+            try:
+                if repair_wav_header(path):
+                    repaired.append(path)
+            except OSError as e:
+                cl_logger.warning(f"No se pudo revisar {path}: {e}")
+    for path in repaired:
+        cl_logger.warning(f"Grabación incompleta recuperada: {path}")
+    return repaired
+
+def _open_audio_stream():
+    """Abre el micrófono a AUDIO_RATE, o a AUDIO_FALLBACK_RATE si el dispositivo no lo admite.
+
+    Returns:
+        tuple: (stream, frecuencia de muestreo efectiva).
+    """
+    global p_audio_instance
+    import pyaudio
+    p_audio_instance = pyaudio.PyAudio()
+    for rate in (AUDIO_RATE, AUDIO_FALLBACK_RATE):
+        try:
+            stream = p_audio_instance.open(format=pyaudio.paInt16, channels=AUDIO_CHANNELS, rate=rate, input=True, frames_per_buffer=AUDIO_CHUNK)
+            return stream, rate
+        except (OSError, ValueError) as e:
+            cl_logger.warning(f"El micrófono no admite {rate} Hz ({e}).")
+    p_audio_instance.terminate()
+    raise OSError("No se pudo abrir el micrófono.")
+
+def _record_audio_loop(chunk_queue, stream):
+    global is_recording_active
+    dropped = 0
+    try:
+        cl_logger.info("Grabación de audio iniciada.")
+        while is_recording_active:
+            data = stream.read(AUDIO_CHUNK, exception_on_overflow=False)
+            try:
+                chunk_queue.put(data, timeout=1.0)
+            except queue.Full:
+                dropped += 1
+        cl_logger.info("Grabación de audio detenida.")
+        stream.stop_stream(); stream.close(); p_audio_instance.terminate()
+    except Exception as e:
+        cl_logger.error(f"Error en la captura de audio: {e}")
+        is_recording_active = False
+    finally:
+        if dropped:
+            cl_logger.warning(f"Se descartaron {dropped} bloques de audio por disco lento.")
+        chunk_queue.put(None)
+
+def _write_audio_loop(chunk_queue, wav_writer, live_transcriber=None):
+    try:
+        while True:
+            data = chunk_queue.get()
+            if data is None: break
+            wav_writer.write(data)
+            if live_transcriber: live_transcriber.feed(data)
+    except Exception as e:
+        cl_logger.error(f"Error al escribir audio en {wav_writer.path}: {e}")
+        # Seguir vaciando la cola para no bloquear al hilo de captura
+        while chunk_queue.get() is not None:
+            pass
+    finally:
+        wav_writer.close()
+        if live_transcriber: live_transcriber.finish()
+
+def start_manual_audio_recording(model_size="base"):
+    """Inicia la grabación y, en paralelo, su transcripción en vivo con el modelo indicado."""
+    global is_recording_active, audio_recording_thread, audio_writer_thread, audio_wav_writer, recording_started_at
     if is_recording_active: return {"success": False, "message": "La grabación ya está en curso."}
+    recording_started_at = datetime.datetime.now()
+    wav_filepath = os.path.join(RECORDS_DIR, f"manual_rec_{recording_started_at.strftime('%Y%m%d_%H%M%S')}.wav")
+    try:
+        stream, rate = _open_audio_stream()
+    except OSError as e:
+        return {"success": False, "message": str(e)}
+    try:
+        audio_wav_writer = StreamingWavWriter(wav_filepath, rate=rate)
+    except OSError as e:
+        stream.close(); p_audio_instance.terminate()
+        return {"success": False, "message": f"No se pudo crear el archivo de audio: {e}"}
+    live = whisper_processor.LiveTranscriber(model_size, rate, on_segments=lambda segs: database.save_transcription_segments(wav_filepath, segs))
+    LIVE_TRANSCRIBERS[wav_filepath] = live
+    chunk_queue = queue.Queue(maxsize=AUDIO_QUEUE_MAX_CHUNKS)
     is_recording_active = True
-    audio_recording_thread = threading.Thread(target=_record_audio_loop, daemon=True)
+    audio_writer_thread = threading.Thread(target=_write_audio_loop, args=(chunk_queue, audio_wav_writer, live), daemon=True)
+    audio_writer_thread.start()
+    audio_recording_thread = threading.Thread(target=_record_audio_loop, args=(chunk_queue, stream), daemon=True)
     audio_recording_thread.start()
     return {"success": True, "message": "Grabación de audio iniciada."}
 
 def stop_manual_audio_recording_and_transcribe(model_size="base"):
-    global is_recording_active, audio_frames
+    """Detiene la grabación y encola su transcripción.
+
+    Devuelve inmediatamente con el id del trabajo; el avance se consulta en
+    /api/transcription_jobs/<id> o mediante el evento SocketIO 'transcription_job'.
+    Si hubo transcripción en vivo, el trabajo solo espera la última ventana y
+    usa el modelo elegido al iniciar; `model_size` aplica a la transcripción
+    completa de respaldo.
+    """
+    global is_recording_active
     if not is_recording_active: return {"success": False, "message": "No hay grabación activa."}
     is_recording_active = False
     if audio_recording_thread: audio_recording_thread.join(timeout=5)
-
-    if not audio_frames: return {"success": False, "message": "No se capturó audio."}
-
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename_base = f"manual_rec_{timestamp}"
-    wav_filepath = os.path.join(RECORDS_DIR, f"{filename_base}.wav")
-    with wave.open(wav_filepath, 'wb') as wf:
-        wf.setnchannels(1); wf.setsampwidth(pyaudio.PyAudio().get_sample_size(pyaudio.paInt16)); wf.setframerate(44100); wf.writeframes(b''.join(audio_frames))
-
-    try:
-        model = whisper.load_model(model_size)
-        result = model.transcribe(wav_filepath, language="es")
-        transcribed_text = result["text"] or "No se detectó audio."
-        
-        txt_filepath = os.path.join(TEXTS_DIR, f"{filename_base}.txt")
-        with open(txt_filepath, 'w', encoding='utf-8') as f: f.write(transcribed_text)
-        
-        duration = len(audio_frames) * 1024 / 44100
-        start_time = datetime.datetime.now() - datetime.timedelta(seconds=duration)
-        database.save_recording_metadata("Grabacion Manual", start_time.isoformat(), datetime.datetime.now().isoformat(), wav_filepath, txt_filepath, duration, transcribed_text)
-        return {"success": True, "message": "Grabación finalizada y transcrita."}
-    except Exception as e:
-        return {"success": False, "message": f"Error en transcripción: {e}"}
+    if audio_writer_thread: audio_writer_thread.join(timeout=30)
+
+    wav_filepath = audio_wav_writer.path
+    frames_written = audio_wav_writer.frames_written
+    if not frames_written:
+        LIVE_TRANSCRIBERS.pop(wav_filepath, None)
+        if os.path.exists(wav_filepath): os.remove(wav_filepath)
+        return {"success": False, "message": "No se capturó audio."}
+
+    duration = frames_written / audio_wav_writer.rate
+    job_id = TRANSCRIPTION_JOBS.submit(wav_filepath, model_size, "Grabacion Manual", recording_started_at.isoformat(), duration)
+    if job_id is None:
+        return {"success": False, "message": f"No se pudo encolar la transcripción. El audio quedó guardado en {wav_filepath}."}
+    return {"success": True, "job_id": job_id, "position": TRANSCRIPTION_JOBS.position(job_id),
+            "message": "Grabación finalizada. Transcripción en cola."}
+
+def _run_transcription_job(job, progress):
+    """Transcribe el WAV de un trabajo y guarda texto y metadatos. Devuelve el id de la transcripción."""
+    wav_filepath = job['wav_path']
+    if not os.path.exists(wav_filepath):
+        raise FileNotFoundError(f"No existe el audio {wav_filepath}")
+    filename_base = os.path.splitext(os.path.basename(wav_filepath))[0]
+    transcribed_text = None
+    speech_seconds = skipped_seconds = None
+    live = LIVE_TRANSCRIBERS.pop(wav_filepath, None)
+    if live:
+        progress(live.progress(), "Procesando la última ventana...")
+        while not live.wait(timeout=1.0):
+            progress(live.progress())
+        if live.failed:
+            cl_logger.warning(f"La transcripción en vivo falló ({live.failed}); se transcribe la grabación completa.")
+        elif live.dropped_windows:
+            cl_logger.warning(f"La transcripción en vivo descartó {live.dropped_windows} ventanas; se transcribe la grabación completa.")
+        else:
+            transcribed_text = live.text()
+            speech_seconds, skipped_seconds = round(live.speech_seconds, 2), round(live.skipped_seconds, 2)
+    if transcribed_text is None:
+        # Sin transcripción en vivo (p. ej. tras un reinicio): transcribir el archivo completo
+        database.clear_transcription_segments(wav_filepath)
+        progress(0.0, "Transcribiendo...")
+        audio = whisper_processor.load_audio(wav_filepath)
+        result = whisper_processor.transcribe_recording(job['model_size'], audio, progress_callback=progress, language="es")
+        transcribed_text = result["text"].strip()
+        speech_seconds, skipped_seconds = result['speech_seconds'], result['skipped_seconds']
+        database.save_transcription_segments(wav_filepath, [{'start': round(seg['start'], 2), 'end': round(seg['end'], 2), 'text': seg['text'].strip()} for seg in result.get('segments', [])])
+    transcribed_text = transcribed_text or "No se detectó audio."
+
+    txt_filepath = os.path.join(TEXTS_DIR, f"{filename_base}.txt")
+    with open(txt_filepath, 'w', encoding='utf-8') as f: f.write(transcribed_text)
+
+    start_time = datetime.datetime.fromisoformat(job['start_timestamp'])
+    end_time = start_time + datetime.timedelta(seconds=job['duration_seconds'])
+    transcription_id = database.save_recording_metadata(job['class_name'], start_time.isoformat(), end_time.isoformat(), wav_filepath, txt_filepath, job['duration_seconds'], transcribed_text, speech_seconds, skipped_seconds).result()
+    if not transcription_id:
+        raise RuntimeError("No se pudo guardar la transcripción en la base de datos.")
+    database.link_transcription_segments(wav_filepath, transcription_id).result()
+    audio_archive.ARCHIVER.submit(transcription_id, wav_filepath)
+    return transcription_id
+
+def get_live_transcript():
+    """Texto parcial de la grabación en curso (vacío si no hay grabación)."""
+    if not is_recording_active or not audio_wav_writer:
+        return {"recording": False, "segments": [], "text": ""}
+    live = LIVE_TRANSCRIBERS.get(audio_wav_writer.path)
+    if not live:
+        return {"recording": True, "segments": [], "text": ""}
+    return {"recording": True, "segments": list(live.segments), "text": live.text(), "pending_windows": live.pending_windows()}
+
+TRANSCRIPTION_JOBS = transcription_jobs.TranscriptionJobQueue(_run_transcription_job)
 
 def get_manual_recording_status(): return is_recording_active
 
 def delete_transcription_files(transcription_id):
     try:
-        wav_path, txt_path = database.delete_transcription(transcription_id)
-        if wav_path and os.path.exists(wav_path): os.remove(wav_path)
-        if txt_path and os.path.exists(txt_path): os.remove(txt_path)
+        for path in set(database.delete_transcription(transcription_id)):
+            if path and os.path.exists(path): os.remove(path)
         return {"success": True, "message": "Transcripción eliminada."}
     except Exception as e:
         return {"success": False, "message": f"Error al eliminar archivos: {e}"}
         
-def enhance_transcript_with_llm(transcription_id):
+# Mejora con IA desde el servidor web: se ejecuta en procesos aparte (ver llm_worker)
+LLM_POOL = llm_worker.LLMWorkerPool()
+# Intervalo mínimo entre envíos de texto parcial al navegador
+ENHANCE_EMIT_SECONDS = 0.1
+
+def enhance_transcript_with_llm(transcription_id, on_delta=None, cancel_event=None):
+    """Mejora una transcripción en este mismo proceso (ver llm_processor.enhance_transcription)."""
+    return llm_processor.enhance_transcription(transcription_id, on_delta=on_delta, cancel_event=cancel_event)
+
+def start_transcript_enhancement(transcription_id, on_event):
+    """Encola la mejora en el pool del LLM transmitiendo el texto a medida que se genera.
+
+    on_event(nombre, datos) recibe 'enhance_started' al empezar,
+    'enhance_progress' ({id, chunk, chunks, delta}) varias veces por segundo
+    y un 'enhance_done' final con el resultado (sin el texto, que ya se envió
+    por partes).  Devuelve la respuesta de admisión de LLMWorkerPool.submit.
+    """
     original_text = database.get_transcription_text(transcription_id)
     if not original_text:
-        return {"success": False, "message": "Texto de transcripción no encontrado."}
-    
-    cl_logger.info(f"Iniciando mejora de IA para transcripción ID: {transcription_id}")
-    try:
-        enhanced_text = llm_processor.enrich_text(original_text)
-        database.save_enhanced_text(transcription_id, enhanced_text)
-        cl_logger.info(f"Mejora de IA completada para transcripción ID: {transcription_id}")
-        return {"success": True, "enhanced_text": enhanced_text}
-    except Exception as e:
-        cl_logger.error(f"Error durante la mejora con LLM: {e}")
-        return {"success": False, "message": f"Error del procesador IA: {e}"}
+        return {"success": False, "status": "not_found", "message": "Texto de transcripción no encontrado."}
+    pending = {'delta': [], 'chunk': 0, 'chunks': 0, 'sent': time.monotonic()}
+
+    def flush():
+        if pending['delta']:
+            on_event('enhance_progress', {'id': transcription_id, 'chunk': pending['chunk'], 'chunks': pending['chunks'], 'delta': "".join(pending['delta'])})
+            pending['delta'] = []
+        pending['sent'] = time.monotonic()
+
+    def on_delta(delta, chunk, chunks):
+        pending['delta'].append(delta)
+        pending['chunk'], pending['chunks'] = chunk, chunks
+        if time.monotonic() - pending['sent'] >= ENHANCE_EMIT_SECONDS:
+            flush()
+
+    def on_done(result):
+        flush()
+        if result.get('success'):
+            stats = result['stats']
+            database.save_enhanced_text(transcription_id, result.pop('enhanced_text'), stats).result()
+            cl_logger.info(f"Mejora de IA completada para transcripción ID: {transcription_id} "
+                           f"({stats['chunks']} fragmentos, {stats['tokens_in']} tokens de entrada, {stats['tokens_out']} de salida, {stats['tokens_per_second']} tokens/s)")
+        on_event('enhance_done', dict(result, id=transcription_id))
+
+    cl_logger.info(f"Mejora de IA encolada para transcripción ID: {transcription_id}")
+    return LLM_POOL.submit(transcription_id, original_text,
+                           on_start=lambda: on_event('enhance_started', {'id': transcription_id}),
+                           on_delta=on_delta, on_done=on_done)
+
+def cancel_transcript_enhancement(transcription_id):
+    return LLM_POOL.cancel(transcription_id)
 
 def quick_identify_from_base64(image_b64: str) -> dict:
     """Identifica un estudiante a partir de una imagen base64 enviada desde el navegador.
@@ -832,56 +1182,60 @@ def quick_identify_from_base64(image_b64: str) -> dict:
         img_bytes = base64.b64decode(b64data)
     except Exception as e:
         return {"success": False, "message": f"base64 inválido: {e}"}
+    return quick_identify_from_images([img_bytes])
 
-    # Decodificar a imagen BGR para usar face_recognition
-    np_arr = np.frombuffer(img_bytes, np.uint8)
-    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    if frame is None:
-        return {"success": False, "message": "No se pudo decodificar la imagen."}
+def quick_identify_from_images(images) -> dict:
+    """Mejor coincidencia entre los rostros de una ráfaga de imágenes (JPEG/PNG en bytes).
 
-    # Obtener embeddings registrados
-    students_data = database.get_all_students()
-    if not students_data:
+    Las imágenes se decodifican ya reducidas al tamaño de trabajo del
+    detector; cada una se busca primero alrededor del rostro de la anterior
+    y la ráfaga se deja de procesar en cuanto una coincidencia es segura.
+    Devuelve un dict con keys: success, student_id, student_name,
+    confidence, frames (imágenes procesadas), message.
+    """
+    frames = []
+    for data in images:
+        frame = face_scan.decode_image(data)
+        if frame is None:
+            return {"success": False, "message": "No se pudo decodificar la imagen."}
+        frames.append(frame)
+    if not frames:
+        return {"success": False, "message": "No se recibió ninguna imagen."}
+
+    # Plantillas registradas
+    gallery = get_face_gallery()
+    if not gallery.students:
         return {"success": False, "message": "No hay estudiantes registrados para reconocer."}
 
-    known_face_encodings = []
-    known_metadata = []
-    for s in students_data:
-        nombre = f"{s.get('nombre','')} {s.get('apellido','')}".strip()
-        for emb in s.get('embeddings', []):
-            enc = np.array(emb, dtype=np.float32)
-            if enc.size == 128 or enc.size == 512:
-                known_face_encodings.append(enc)
-                known_metadata.append({'id': s.get('id'), 'nombre': nombre})
-
-    if not known_face_encodings:
-        return {"success": False, "message": "No hay embeddings disponibles."}
-
-    # Detección y codificación del rostro en la imagen
-    rgb = frame[:, :, ::-1]
-    boxes = face_recognition.face_locations(rgb, model='hog')
-    if not boxes:
-        return {"success": False, "message": "No se detectaron rostros."}
-    encodings = face_recognition.face_encodings(rgb, boxes)
-    if not encodings:
-        return {"success": False, "message": "No se pudieron calcular encodings."}
-
-    # Comparar con base conocida: usar distancia mínima
-    import numpy.linalg as LA
-    best_idx = -1
+    best_match = None
     best_dist = 1e9
-    target = encodings[0]
-    for i, enc in enumerate(known_face_encodings):
-        # Asegurar mismo tamaño (algunas bases pueden tener 512)
-        if enc.shape != target.shape:
+    detected = encoded = False
+    roi = None
+    processed = 0
+    for frame in frames:
+        if best_dist <= QUICK_SCAN_CONFIDENT_DISTANCE:
+            break
+        processed += 1
+        # Detección sobre la imagen reducida y codificación sobre el recorte del rostro
+        boxes = face_scan.detect_faces(frame, roi)
+        roi = max(boxes, key=face_scan.box_area) if boxes else None
+        detected = detected or bool(boxes)
+        encodings = [enc for enc in face_scan.encode_faces(frame, boxes) if enc is not None]
+        if not encodings:
             continue
-        d = LA.norm(enc - target)
-        if d < best_dist:
+        encoded = True
+        # Comparar con base conocida: usar distancia mínima (de la primera cara de cada imagen)
+        match, d = gallery.match(encodings[0])
+        if match and d < best_dist:
             best_dist = d
-            best_idx = i
+            best_match = match
 
-    if best_idx == -1:
-        return {"success": False, "message": "No se encontró coincidencia compatible."}
+    if not detected:
+        return {"success": False, "message": "No se detectaron rostros.", "frames": processed}
+    if not encoded:
+        return {"success": False, "message": "No se pudieron calcular encodings.", "frames": processed}
+    if best_match is None:
+        return {"success": False, "message": "No se encontró coincidencia compatible.", "frames": processed}
 
     # Convertir distancia a una pseudo-confianza (heurística)
     # Para encodings 128D (face_recognition), distancias < 0.6 suelen considerarse match
@@ -889,10 +1243,10 @@ def quick_identify_from_base64(image_b64: str) -> dict:
     d = float(best_dist)
     conf = max(0.0, min(1.0, (0.6 - d) / 0.3)) * 100.0
 
-    meta = known_metadata[best_idx]
     return {
         "success": True,
-        "student_id": meta.get('id'),
-        "student_name": meta.get('nombre'),
-        "confidence": round(conf, 2)
+        "student_id": best_match['id'],
+        "student_name": best_match['nombre'],
+        "confidence": round(conf, 2),
+        "frames": processed
     }
@@ -3,7 +3,13 @@ import sqlite3
 import datetime
 import json
 import logging
+import re
 import threading
+import queue
+import time
+import atexit
+import face_gallery
+from concurrent.futures import Future
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 db_logger = logging.getLogger(__name__)
@@ -11,16 +17,149 @@ db_logger = logging.getLogger(__name__)
 DATABASE_NAME = 'asistencia_ia.db'
 db_lock = threading.Lock()
 
+# Parámetros del escritor único: un lote se confirma cuando han pasado
+# WRITE_BATCH_INTERVAL_MS desde la primera escritura pendiente o cuando se
+# acumulan WRITE_BATCH_MAX_ROWS operaciones, lo que ocurra antes.
+WRITE_BATCH_INTERVAL_MS = 50
+WRITE_BATCH_MAX_ROWS = 200
+
+# Límites de la caché del LLM (tabla llm_cache): se descartan las entradas de
+# más de LLM_CACHE_MAX_AGE_DAYS días y, por encima de LLM_CACHE_MAX_ENTRIES,
+# las más antiguas
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_MAX_AGE_DAYS = 90
+
 def _get_db_conn():
     conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
+# --- Escritor único ---
+#
+# Todas las escrituras se encolan y las ejecuta un único hilo que mantiene su
+# propia conexión. Las operaciones pendientes se agrupan en una sola
+# transacción (un único fsync) en lugar de abrir una conexión y confirmar
+# cada fila por separado. Cada operación corre dentro de un SAVEPOINT para
+# que un error en una fila no descarte el resto del lote.
+
+_FLUSH = object()
+_STOP = object()
+
+class _DatabaseWriter:
+    def __init__(self, interval_ms=WRITE_BATCH_INTERVAL_MS, max_rows=WRITE_BATCH_MAX_ROWS):
+        self.interval = interval_ms / 1000.0
+        self.max_rows = max_rows
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, op, default=None):
+        """Encola op(conn) y devuelve un Future con su resultado (o `default` si falla)."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((op, future, default))
+        return future
+
+    def flush(self, timeout=None):
+        """Confirma de inmediato todo lo encolado hasta ahora y espera a que termine."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        future = Future()
+        self._queue.put((_FLUSH, future, None))
+        future.result(timeout=timeout)
+
+    def stop(self, timeout=5):
+        """Vacía la cola pendiente y detiene el hilo escritor."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put((_STOP, None, None))
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        conn = _get_db_conn()
+        conn.isolation_level = None  # transacciones explícitas
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while batch[-1][0] not in (_FLUSH, _STOP) and len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stopping = batch[-1][0] is _STOP
+            self._commit_batch(conn, batch)
+        conn.close()
+
+    def _commit_batch(self, conn, batch):
+        results = []
+        try:
+            conn.execute("BEGIN")
+            for op, future, default in batch:
+                if op is _FLUSH or op is _STOP:
+                    results.append((future, None))
+                    continue
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    results.append((future, op(conn)))
+                    conn.execute("RELEASE write_op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    db_logger.error(f"Error en escritura encolada: {e}")
+                    results.append((future, default))
+            conn.execute("COMMIT")
+        except Exception as e:
+            db_logger.error(f"Error al confirmar lote de escrituras: {e}")
+            try: conn.execute("ROLLBACK")
+            except Exception: pass
+            results = [(future, default) for _, future, default in batch]
+        for future, value in results:
+            if future is not None:
+                future.set_result(value)
+
+_writer = _DatabaseWriter()
+
+def _submit_write(op, default=None):
+    return _writer.submit(op, default)
+
+def flush_writes(timeout=None):
+    """Espera a que todas las escrituras encoladas hasta ahora estén confirmadas."""
+    _writer.flush(timeout)
+
+def shutdown_writer():
+    """Confirma las escrituras pendientes y detiene el hilo escritor."""
+    _writer.stop()
+
+atexit.register(shutdown_writer)
+
+def _add_missing_columns(conn, table, columns):
+    existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
 def _create_tables(conn):
     cursor = conn.cursor()
     cursor.execute("CREATE TABLE IF NOT EXISTS students (id TEXT PRIMARY KEY, nombre TEXT NOT NULL, apellido TEXT NOT NULL, registro_fecha TEXT, imagen_path TEXT)")
     cursor.execute("CREATE TABLE IF NOT EXISTS face_embeddings (student_id TEXT NOT NULL, embedding BLOB NOT NULL, FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE)")
+    # Galería compacta derivada de face_embeddings (ver face_gallery.py)
+    cursor.execute("CREATE TABLE IF NOT EXISTS face_templates (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id TEXT NOT NULL, template BLOB NOT NULL, FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_templates_student ON face_templates (student_id)")
     cursor.execute("CREATE TABLE IF NOT EXISTS attendance (student_id TEXT NOT NULL, periodo TEXT NOT NULL, fecha TEXT NOT NULL, timestamp TEXT NOT NULL, FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE)")
     cursor.execute("CREATE TABLE IF NOT EXISTS participation (student_id TEXT NOT NULL, periodo TEXT NOT NULL, timestamp TEXT NOT NULL, FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE)")
     cursor.execute("""
@@ -43,34 +182,182 @@ def _create_tables(conn):
             text_file_path TEXT,
             duration_seconds REAL NOT NULL,
             transcribed_text TEXT,
-            enhanced_text TEXT
+            enhanced_text TEXT,
+            speech_seconds REAL,
+            skipped_seconds REAL,
+            archive_path TEXT,
+            archived_at TEXT,
+            enhance_chunks INTEGER,
+            enhance_tokens_in INTEGER,
+            enhance_tokens_out INTEGER,
+            enhance_seconds REAL,
+            enhance_tokens_per_second REAL
+        )
+    """)
+    # Bases de datos anteriores: segundos con voz y omitidos por el VAD, audio
+    # archivado y métricas de la mejora con IA
+    _add_missing_columns(conn, 'transcriptions', {
+        'speech_seconds': 'REAL', 'skipped_seconds': 'REAL', 'archive_path': 'TEXT', 'archived_at': 'TEXT',
+        'enhance_chunks': 'INTEGER', 'enhance_tokens_in': 'INTEGER', 'enhance_tokens_out': 'INTEGER',
+        'enhance_seconds': 'REAL', 'enhance_tokens_per_second': 'REAL',
+    })
+    # Índice para la paginación por cursor (keyset) del listado de transcripciones
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcriptions_start ON transcriptions (start_timestamp DESC, id DESC)")
+    # Tablas de agregados diarios (ver "Agregados históricos" más abajo). La
+    # clave empieza por fecha para que las consultas por rango sean un
+    # recorrido contiguo del índice primario.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_daily_student (
+            fecha TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            PRIMARY KEY (fecha, periodo, student_id),
+            FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_daily_period (
+            fecha TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            presentes INTEGER NOT NULL,
+            PRIMARY KEY (fecha, periodo)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS participation_daily_student (
+            fecha TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            participaciones INTEGER NOT NULL,
+            PRIMARY KEY (fecha, periodo, student_id),
+            FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS participation_daily_period (
+            fecha TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            participantes INTEGER NOT NULL,
+            participaciones INTEGER NOT NULL,
+            PRIMARY KEY (fecha, periodo)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transcription_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wav_path TEXT NOT NULL,
+            model_size TEXT NOT NULL,
+            class_name TEXT NOT NULL,
+            start_timestamp TEXT NOT NULL,
+            duration_seconds REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            transcription_id INTEGER,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcription_jobs_status ON transcription_jobs (status, id)")
+    # Segmentos con marca de tiempo. Se guardan por wav_path mientras la
+    # grabación está en curso y se enlazan a su transcripción al finalizar.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transcription_segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transcription_id INTEGER,
+            wav_path TEXT NOT NULL,
+            start_seconds REAL NOT NULL,
+            end_seconds REAL NOT NULL,
+            text TEXT NOT NULL,
+            FOREIGN KEY (transcription_id) REFERENCES transcriptions (id) ON DELETE CASCADE
         )
     """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_segments_wav ON transcription_segments (wav_path, start_seconds)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_segments_transcription ON transcription_segments (transcription_id, start_seconds)")
+    # Caché de generaciones del LLM (ver llm_processor._cache_key)
+    cursor.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, content TEXT NOT NULL, created_at TEXT NOT NULL) WITHOUT ROWID")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)")
+    _create_search_index(conn)
     conn.commit()
 
+def _create_search_index(conn):
+    """Índices FTS5 de contenido externo sobre transcripciones y segmentos.
+
+    Los triggers los mantienen al día en altas, mejoras con IA y borrados
+    (incluidos los borrados en cascada de segmentos).
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS transcriptions_fts USING fts5(transcribed_text, enhanced_text, content='transcriptions', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(text, content='transcription_segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    except sqlite3.OperationalError as e:
+        db_logger.warning(f"SQLite sin FTS5, la búsqueda de transcripciones no estará disponible: {e}")
+        return
+    conn.executescript("""
+        CREATE TRIGGER IF NOT EXISTS transcriptions_fts_ai AFTER INSERT ON transcriptions BEGIN
+            INSERT INTO transcriptions_fts (rowid, transcribed_text, enhanced_text) VALUES (new.id, new.transcribed_text, new.enhanced_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS transcriptions_fts_ad AFTER DELETE ON transcriptions BEGIN
+            INSERT INTO transcriptions_fts (transcriptions_fts, rowid, transcribed_text, enhanced_text) VALUES ('delete', old.id, old.transcribed_text, old.enhanced_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS transcriptions_fts_au AFTER UPDATE OF transcribed_text, enhanced_text ON transcriptions BEGIN
+            INSERT INTO transcriptions_fts (transcriptions_fts, rowid, transcribed_text, enhanced_text) VALUES ('delete', old.id, old.transcribed_text, old.enhanced_text);
+            INSERT INTO transcriptions_fts (rowid, transcribed_text, enhanced_text) VALUES (new.id, new.transcribed_text, new.enhanced_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS segments_fts_ai AFTER INSERT ON transcription_segments BEGIN
+            INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS segments_fts_ad AFTER DELETE ON transcription_segments BEGIN
+            INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS segments_fts_au AFTER UPDATE OF text ON transcription_segments BEGIN
+            INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+    """)
+
 def init_db():
     with db_lock, _get_db_conn() as conn:
+        had_rollups = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_daily_period'").fetchone() is not None
+        had_search = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transcriptions_fts'").fetchone() is not None
+        had_templates = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'face_templates'").fetchone() is not None
         _create_tables(conn)
+        # Bases de datos anteriores a los agregados: poblarlos una vez desde los datos crudos
+        if not had_rollups:
+            _rebuild_rollups(conn)
+            conn.commit()
+        # Igual con el índice de búsqueda
+        if not had_search and conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transcriptions_fts'").fetchone():
+            rebuild_search_index(conn)
+            conn.commit()
+        # Y con la galería compacta de rostros
+        if not had_templates:
+            stats = _rebuild_face_templates(conn)
+            conn.commit()
+            db_logger.info(f"Galería de rostros compactada: {stats['embeddings']} encodings -> {stats['templates']} plantillas.")
+        pruned = _prune_llm_cache(conn)
+        conn.commit()
+        if pruned:
+            db_logger.info(f"Caché del LLM: {pruned} entradas antiguas descartadas.")
 
 def add_student(id, nombre, apellido, imagen_path, embeddings):
-    try:
-        with db_lock, _get_db_conn() as conn:
-            registro_fecha = datetime.date.today().isoformat()
-            conn.execute("INSERT INTO students (id, nombre, apellido, registro_fecha, imagen_path) VALUES (?, ?, ?, ?, ?)", (id, nombre, apellido, registro_fecha, imagen_path))
-            for emb in embeddings:
-                conn.execute("INSERT INTO face_embeddings (student_id, embedding) VALUES (?, ?)", (id, json.dumps(emb)))
-            return True
-    except: return False
+    def op(conn):
+        registro_fecha = datetime.date.today().isoformat()
+        conn.execute("INSERT INTO students (id, nombre, apellido, registro_fecha, imagen_path) VALUES (?, ?, ?, ?, ?)", (id, nombre, apellido, registro_fecha, imagen_path))
+        conn.executemany("INSERT INTO face_embeddings (student_id, embedding) VALUES (?, ?)", [(id, json.dumps(emb)) for emb in embeddings])
+        conn.executemany("INSERT INTO face_templates (student_id, template) VALUES (?, ?)",
+                         [(id, json.dumps(t)) for t in face_gallery.compact_templates(embeddings)])
+        return True
+    return _submit_write(op, default=False).result()
 
 def delete_student_and_data(student_id):
-    try:
-        with db_lock, _get_db_conn() as conn:
-            cursor = conn.execute("SELECT imagen_path FROM students WHERE id = ?", (student_id,))
-            result = cursor.fetchone()
-            imagen_path = result['imagen_path'] if result else None
-            conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
-            return imagen_path
-    except: return None
+    def op(conn):
+        result = conn.execute("SELECT imagen_path FROM students WHERE id = ?", (student_id,)).fetchone()
+        imagen_path = result['imagen_path'] if result else None
+        # Las filas *_daily_student se borran en cascada; los totales por período se descuentan antes
+        _rollup_remove_student(conn, student_id)
+        conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
+        return imagen_path
+    return _submit_write(op).result()
 
 def get_all_students():
     try:
@@ -82,6 +369,39 @@ def get_all_students():
             return list(students.values())
     except: return []
 
+def _rebuild_face_templates(conn, threshold=face_gallery.GALLERY_TEMPLATE_DISTANCE, max_templates=face_gallery.GALLERY_MAX_TEMPLATES):
+    embeddings = {}
+    for row in conn.execute("SELECT student_id, embedding FROM face_embeddings"):
+        embeddings.setdefault(row['student_id'], []).append(json.loads(row['embedding']))
+    rows = [(sid, json.dumps(t)) for sid, embs in embeddings.items() for t in face_gallery.compact_templates(embs, threshold, max_templates)]
+    conn.execute("DELETE FROM face_templates")
+    conn.executemany("INSERT INTO face_templates (student_id, template) VALUES (?, ?)", rows)
+    return {"students": len(embeddings), "embeddings": sum(len(e) for e in embeddings.values()), "templates": len(rows)}
+
+def rebuild_face_templates(threshold=face_gallery.GALLERY_TEMPLATE_DISTANCE, max_templates=face_gallery.GALLERY_MAX_TEMPLATES):
+    """Recalcula la galería compacta desde todos los encodings guardados.
+
+    Returns:
+        dict: students, embeddings y templates, o None si falla.
+    """
+    return _submit_write(lambda conn: _rebuild_face_templates(conn, threshold, max_templates), default=None).result()
+
+def get_face_templates():
+    """Plantillas de la galería compacta: lista de (student_id, nombre completo, plantilla)."""
+    try:
+        with _get_db_conn() as conn:
+            rows = conn.execute("SELECT t.student_id, s.nombre, s.apellido, t.template FROM face_templates t "
+                                "JOIN students s ON s.id = t.student_id ORDER BY t.id")
+            return [(r['student_id'], f"{r['nombre']} {r['apellido'] or ''}".strip(), json.loads(r['template'])) for r in rows]
+    except: return []
+
+def get_face_templates_signature():
+    """Valor que cambia con cada alta, baja o recompactación de la galería (los id no se reutilizan)."""
+    try:
+        with _get_db_conn() as conn:
+            return tuple(conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM face_templates").fetchone())
+    except: return None
+
 def get_student_by_id(id):
     try:
         with _get_db_conn() as conn:
@@ -90,12 +410,28 @@ def get_student_by_id(id):
     except: return None
 
 def add_learning_styles(student_id, kolb_style, felder_styles_dict, vak_style):
-    try:
-        with db_lock, _get_db_conn() as conn:
-            conn.execute("INSERT OR REPLACE INTO learning_styles (student_id, kolb_style, felder_styles, vak_style, completed_date) VALUES (?, ?, ?, ?, ?)",
-                         (student_id, kolb_style, json.dumps(felder_styles_dict), vak_style, datetime.date.today().isoformat()))
-            return True
-    except: return False
+    """Encola el guardado de estilos. Devuelve un Future cuyo resultado es True/False."""
+    params = (student_id, kolb_style, json.dumps(felder_styles_dict), vak_style, datetime.date.today().isoformat())
+    def op(conn):
+        conn.execute("INSERT OR REPLACE INTO learning_styles (student_id, kolb_style, felder_styles, vak_style, completed_date) VALUES (?, ?, ?, ?, ?)", params)
+        return True
+    return _submit_write(op, default=False)
+
+def add_learning_styles_bulk(rows):
+    """Encola el guardado de los estilos de muchos estudiantes en una sola transacción.
+
+    rows: tuplas (student_id, kolb_style, felder_styles_dict, vak_style); las
+    de estudiantes que no existen se omiten.  Devuelve un Future con
+    (guardados, ids desconocidos) o None si falla.
+    """
+    today = datetime.date.today().isoformat()
+    params = [(sid, kolb, json.dumps(felder), vak, today) for sid, kolb, felder, vak in rows]
+    def op(conn):
+        known = {row['id'] for row in conn.execute("SELECT id FROM students")}
+        valid = [p for p in params if p[0] in known]
+        conn.executemany("INSERT OR REPLACE INTO learning_styles (student_id, kolb_style, felder_styles, vak_style, completed_date) VALUES (?, ?, ?, ?, ?)", valid)
+        return len(valid), sorted({p[0] for p in params if p[0] not in known})
+    return _submit_write(op, default=None)
 
 def get_all_students_basic_info():
     try:
@@ -103,10 +439,121 @@ def get_all_students_basic_info():
             return [dict(row) for row in conn.execute("SELECT id, nombre, apellido, registro_fecha FROM students")]
     except: return []
 
+# --- Consultas paginadas (keyset) ---
+#
+# Los listados del dashboard no cargan tablas completas: se piden páginas de
+# tamaño fijo a partir de la última clave vista y solo las columnas
+# solicitadas.  Los mapas siguientes son la lista blanca de campos
+# seleccionables; el valor es la expresión SQL correspondiente.
+
+STUDENT_FIELDS = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'apellido': 'apellido',
+    'registro_fecha': 'registro_fecha',
+    'imagen_path': 'imagen_path',
+}
+STUDENT_DEFAULT_FIELDS = ('id', 'nombre', 'apellido', 'registro_fecha')
+
+TRANSCRIPTION_FIELDS = {
+    'id': 'id',
+    'class_name': 'class_name',
+    'start_timestamp': 'start_timestamp',
+    'end_timestamp': 'end_timestamp',
+    'file_path': 'file_path',
+    'text_file_path': 'text_file_path',
+    'duration_seconds': 'duration_seconds',
+    'speech_seconds': 'speech_seconds',
+    'skipped_seconds': 'skipped_seconds',
+    'has_enhanced': '(enhanced_text IS NOT NULL) AS has_enhanced',
+    'transcribed_text': 'transcribed_text',
+    'enhanced_text': 'enhanced_text',
+    'enhance_chunks': 'enhance_chunks',
+    'enhance_tokens_in': 'enhance_tokens_in',
+    'enhance_tokens_out': 'enhance_tokens_out',
+    'enhance_seconds': 'enhance_seconds',
+    'enhance_tokens_per_second': 'enhance_tokens_per_second',
+}
+TRANSCRIPTION_SUMMARY_FIELDS = ('id', 'class_name', 'start_timestamp', 'end_timestamp', 'file_path', 'text_file_path', 'duration_seconds', 'skipped_seconds', 'has_enhanced')
+
+def _select_list(fields, allowed, required):
+    """Construye la lista de columnas del SELECT.
+
+    Las columnas de `required` (clave del cursor) siempre se incluyen para
+    poder calcular la página siguiente; luego se eliminan si no se pidieron.
+    """
+    cols = list(dict.fromkeys(list(required) + list(fields)))
+    return ", ".join(allowed[f] for f in cols)
+
+def get_students_page(fields=STUDENT_DEFAULT_FIELDS, after_id=None, limit=50):
+    """Devuelve una página de estudiantes ordenada por id.
+
+    Args:
+        fields (iterable): Campos de STUDENT_FIELDS a devolver.
+        after_id (str, opcional): Último id de la página anterior.
+        limit (int): Tamaño máximo de la página.
+
+    Returns:
+        tuple: (lista de dicts, id para la siguiente página o None).
+    """
+    try:
+        sql = f"SELECT {_select_list(fields, STUDENT_FIELDS, ('id',))} FROM students"
+        params = []
+        if after_id is not None:
+            sql += " WHERE id > ?"
+            params.append(after_id)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit + 1)
+        with _get_db_conn() as conn:
+            rows = [dict(r) for r in conn.execute(sql, params)]
+        next_after = rows[limit - 1]['id'] if len(rows) > limit else None
+        return [{k: r[k] for k in fields} for r in rows[:limit]], next_after
+    except Exception as e:
+        db_logger.error(f"Error al paginar estudiantes: {e}")
+        return [], None
+
+def get_transcriptions_page(fields=TRANSCRIPTION_SUMMARY_FIELDS, after=None, limit=20):
+    """Devuelve una página de transcripciones, de la más reciente a la más antigua.
+
+    Args:
+        fields (iterable): Campos de TRANSCRIPTION_FIELDS a devolver.
+        after (tuple, opcional): (start_timestamp, id) del último registro visto.
+        limit (int): Tamaño máximo de la página.
+
+    Returns:
+        tuple: (lista de dicts, clave (start_timestamp, id) siguiente o None).
+    """
+    try:
+        sql = f"SELECT {_select_list(fields, TRANSCRIPTION_FIELDS, ('start_timestamp', 'id'))} FROM transcriptions"
+        params = []
+        if after is not None:
+            sql += " WHERE start_timestamp < ? OR (start_timestamp = ? AND id < ?)"
+            params.extend([after[0], after[0], after[1]])
+        sql += " ORDER BY start_timestamp DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        with _get_db_conn() as conn:
+            rows = [dict(r) for r in conn.execute(sql, params)]
+        next_after = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_after = (last['start_timestamp'], last['id'])
+        return [{k: r[k] for k in fields} for r in rows[:limit]], next_after
+    except Exception as e:
+        db_logger.error(f"Error al paginar transcripciones: {e}")
+        return [], None
+
+def get_transcription_by_id(transcription_id, fields=tuple(TRANSCRIPTION_FIELDS)):
+    """Devuelve los campos pedidos de una transcripción o None si no existe."""
+    try:
+        with _get_db_conn() as conn:
+            row = conn.execute(f"SELECT {_select_list(fields, TRANSCRIPTION_FIELDS, ('id',))} FROM transcriptions WHERE id = ?", (transcription_id,)).fetchone()
+            return {k: row[k] for k in fields} if row else None
+    except: return None
+
 def get_attendance_summary_by_period():
     try:
         with _get_db_conn() as conn:
-            return [dict(row) for row in conn.execute("SELECT periodo, COUNT(DISTINCT student_id) as total FROM attendance WHERE fecha = ? GROUP BY periodo", (datetime.date.today().isoformat(),))]
+            return [dict(row) for row in conn.execute("SELECT periodo, presentes as total FROM attendance_daily_period WHERE fecha = ? ORDER BY periodo", (datetime.date.today().isoformat(),))]
     except: return []
 
 def has_attended_today_in_period(student_id, periodo):
@@ -116,16 +563,18 @@ def has_attended_today_in_period(student_id, periodo):
     except: return False
 
 def record_attendance(student_id, periodo):
-    try:
-        with db_lock, _get_db_conn() as conn:
-            conn.execute("INSERT INTO attendance (student_id, periodo, fecha, timestamp) VALUES (?, ?, ?, ?)", (student_id, periodo, datetime.date.today().isoformat(), datetime.datetime.now().isoformat()))
-    except Exception as e:
-        db_logger.error(f"Error al registrar asistencia para {student_id}: {e}")
+    """Encola un registro de asistencia. Devuelve un Future (True/False)."""
+    params = (student_id, periodo, datetime.date.today().isoformat(), datetime.datetime.now().isoformat())
+    def op(conn):
+        conn.execute("INSERT INTO attendance (student_id, periodo, fecha, timestamp) VALUES (?, ?, ?, ?)", params)
+        _rollup_attendance(conn, student_id, periodo, params[2])
+        return True
+    return _submit_write(op, default=False)
 
 def get_participation_summary_by_period():
     try:
         with _get_db_conn() as conn:
-            return [dict(row) for row in conn.execute("SELECT periodo, COUNT(DISTINCT student_id) as total_participantes, COUNT(student_id) as total_participaciones FROM participation WHERE date(timestamp) = ? GROUP BY periodo", (datetime.date.today().isoformat(),))]
+            return [dict(row) for row in conn.execute("SELECT periodo, participantes as total_participantes, participaciones as total_participaciones FROM participation_daily_period WHERE fecha = ? ORDER BY periodo", (datetime.date.today().isoformat(),))]
     except: return []
 
 # NUEVA FUNCIÓN: Registrar participación
@@ -137,15 +586,217 @@ def record_participation(student_id, periodo):
         periodo (str): Nombre del período de clase (por ejemplo, "Clase 1").
 
     Returns:
-        bool: True si se insertó correctamente, False en caso de error.
+        Future: se resuelve a True si se insertó correctamente, False en caso
+        de error. La escritura se agrupa con otras en el hilo escritor.
+    """
+    params = (student_id, periodo, datetime.datetime.now().isoformat())
+    def op(conn):
+        conn.execute("INSERT INTO participation (student_id, periodo, timestamp) VALUES (?, ?, ?)", params)
+        _rollup_participation(conn, student_id, periodo, params[2][:10])
+        return True
+    return _submit_write(op, default=False)
+
+# --- Agregados históricos ---
+#
+# Las tablas *_daily_* guardan, por día y período, quién asistió y cuántas
+# participaciones hubo.  Se actualizan en la misma transacción que el
+# registro crudo, de modo que las consultas por rango (un trimestre, varios
+# años) leen unas pocas filas por día en lugar de recorrer attendance y
+# participation.  rebuild_rollups() las recalcula desde los datos crudos.
+
+def _rollup_attendance(conn, student_id, periodo, fecha):
+    cur = conn.execute("INSERT OR IGNORE INTO attendance_daily_student (fecha, periodo, student_id) VALUES (?, ?, ?)", (fecha, periodo, student_id))
+    if cur.rowcount == 1:
+        conn.execute("INSERT INTO attendance_daily_period (fecha, periodo, presentes) VALUES (?, ?, 1) "
+                     "ON CONFLICT (fecha, periodo) DO UPDATE SET presentes = presentes + 1", (fecha, periodo))
+
+def _rollup_participation(conn, student_id, periodo, fecha):
+    conn.execute("INSERT INTO participation_daily_student (fecha, periodo, student_id, participaciones) VALUES (?, ?, ?, 1) "
+                 "ON CONFLICT (fecha, periodo, student_id) DO UPDATE SET participaciones = participaciones + 1", (fecha, periodo, student_id))
+    first_today = conn.execute("SELECT participaciones FROM participation_daily_student WHERE fecha = ? AND periodo = ? AND student_id = ?",
+                               (fecha, periodo, student_id)).fetchone()[0] == 1
+    conn.execute("INSERT INTO participation_daily_period (fecha, periodo, participantes, participaciones) VALUES (?, ?, 1, 1) "
+                 "ON CONFLICT (fecha, periodo) DO UPDATE SET participantes = participantes + ?, participaciones = participaciones + 1",
+                 (fecha, periodo, 1 if first_today else 0))
+
+def _rollup_remove_student(conn, student_id):
+    """Descuenta a un estudiante de los totales por día y período (antes de borrar sus filas)."""
+    conn.execute("UPDATE attendance_daily_period SET presentes = presentes - 1 WHERE EXISTS ("
+                 "SELECT 1 FROM attendance_daily_student s WHERE s.student_id = ? "
+                 "AND s.fecha = attendance_daily_period.fecha AND s.periodo = attendance_daily_period.periodo)", (student_id,))
+    conn.execute("UPDATE participation_daily_period SET participantes = participantes - 1, participaciones = participaciones - ("
+                 "SELECT s.participaciones FROM participation_daily_student s WHERE s.student_id = ? "
+                 "AND s.fecha = participation_daily_period.fecha AND s.periodo = participation_daily_period.periodo) "
+                 "WHERE EXISTS (SELECT 1 FROM participation_daily_student s WHERE s.student_id = ? "
+                 "AND s.fecha = participation_daily_period.fecha AND s.periodo = participation_daily_period.periodo)", (student_id, student_id))
+    # Como en rebuild_rollups(): un período sin nadie no tiene fila
+    conn.execute("DELETE FROM attendance_daily_period WHERE presentes <= 0")
+    conn.execute("DELETE FROM participation_daily_period WHERE participantes <= 0")
+
+def _rebuild_rollups(conn, start=None, end=None):
+    start, end = start or '0000-00-00', end or '9999-99-99'
+    for table in ('attendance_daily_student', 'attendance_daily_period', 'participation_daily_student', 'participation_daily_period'):
+        conn.execute(f"DELETE FROM {table} WHERE fecha BETWEEN ? AND ?", (start, end))
+    conn.execute("INSERT INTO attendance_daily_student (fecha, periodo, student_id) "
+                 "SELECT DISTINCT fecha, periodo, student_id FROM attendance WHERE fecha BETWEEN ? AND ?", (start, end))
+    conn.execute("INSERT INTO attendance_daily_period (fecha, periodo, presentes) "
+                 "SELECT fecha, periodo, COUNT(*) FROM attendance_daily_student WHERE fecha BETWEEN ? AND ? GROUP BY fecha, periodo", (start, end))
+    conn.execute("INSERT INTO participation_daily_student (fecha, periodo, student_id, participaciones) "
+                 "SELECT date(timestamp), periodo, student_id, COUNT(*) FROM participation WHERE date(timestamp) BETWEEN ? AND ? "
+                 "GROUP BY date(timestamp), periodo, student_id", (start, end))
+    conn.execute("INSERT INTO participation_daily_period (fecha, periodo, participantes, participaciones) "
+                 "SELECT fecha, periodo, COUNT(*), SUM(participaciones) FROM participation_daily_student WHERE fecha BETWEEN ? AND ? "
+                 "GROUP BY fecha, periodo", (start, end))
+
+def rebuild_rollups(start=None, end=None):
+    """Recalcula los agregados diarios desde attendance y participation.
+
+    Args:
+        start (str, opcional): Fecha ISO inicial (incluida). Sin ella, desde el principio.
+        end (str, opcional): Fecha ISO final (incluida). Sin ella, hasta el final.
+
+    Returns:
+        bool: True si se reconstruyó correctamente.
+    """
+    def op(conn):
+        _rebuild_rollups(conn, start, end)
+        return True
+    return _submit_write(op, default=False).result()
+
+def get_student_stats_range(start, end, periodo=None):
+    """Tasa de asistencia y participaciones por estudiante entre dos fechas (incluidas).
+
+    La tasa es días asistidos / sesiones impartidas, donde una sesión es un
+    (fecha, período) con al menos una asistencia registrada.
+
+    Returns:
+        list: dicts con id, nombre, apellido, asistencias, sesiones,
+        tasa_asistencia (0-1) y participaciones.
+    """
+    try:
+        period_filter, params = ("AND periodo = ?", [periodo]) if periodo else ("", [])
+        with _get_db_conn() as conn:
+            sesiones = conn.execute(f"SELECT COUNT(*) FROM attendance_daily_period WHERE fecha BETWEEN ? AND ? {period_filter}", [start, end] + params).fetchone()[0]
+            rows = conn.execute(f"""
+                SELECT s.id, s.nombre, s.apellido,
+                       COALESCE(a.asistencias, 0) AS asistencias,
+                       COALESCE(p.participaciones, 0) AS participaciones
+                FROM students s
+                LEFT JOIN (SELECT student_id, COUNT(*) AS asistencias FROM attendance_daily_student
+                           WHERE fecha BETWEEN ? AND ? {period_filter} GROUP BY student_id) a ON a.student_id = s.id
+                LEFT JOIN (SELECT student_id, SUM(participaciones) AS participaciones FROM participation_daily_student
+                           WHERE fecha BETWEEN ? AND ? {period_filter} GROUP BY student_id) p ON p.student_id = s.id
+                ORDER BY s.apellido, s.nombre
+            """, [start, end] + params + [start, end] + params)
+            return [dict(r, sesiones=sesiones, tasa_asistencia=(r['asistencias'] / sesiones if sesiones else 0.0)) for r in rows]
+    except Exception as e:
+        db_logger.error(f"Error al consultar estadísticas por estudiante: {e}")
+        return []
+
+def get_period_stats_range(start, end):
+    """Asistencia y participación agregadas por período entre dos fechas (incluidas).
+
+    Returns:
+        list: dicts con periodo, sesiones, asistencia_promedio,
+        tasa_asistencia (respecto a los estudiantes registrados),
+        participaciones y participantes_promedio.
+    """
+    try:
+        with _get_db_conn() as conn:
+            total_students = conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+            rows = conn.execute("""
+                SELECT a.periodo, a.sesiones, a.asistencia_promedio,
+                       COALESCE(p.participaciones, 0) AS participaciones,
+                       COALESCE(p.participantes, 0) * 1.0 / a.sesiones AS participantes_promedio
+                FROM (SELECT periodo, COUNT(*) AS sesiones, AVG(presentes) AS asistencia_promedio
+                      FROM attendance_daily_period WHERE fecha BETWEEN ? AND ? GROUP BY periodo) a
+                LEFT JOIN (SELECT periodo, SUM(participaciones) AS participaciones, SUM(participantes) AS participantes
+                           FROM participation_daily_period WHERE fecha BETWEEN ? AND ? GROUP BY periodo) p ON p.periodo = a.periodo
+                ORDER BY a.periodo
+            """, (start, end, start, end))
+            return [dict(r, tasa_asistencia=(r['asistencia_promedio'] / total_students if total_students else 0.0)) for r in rows]
+    except Exception as e:
+        db_logger.error(f"Error al consultar estadísticas por período: {e}")
+        return []
+
+# --- Exportación en streaming ---
+#
+# Cada conjunto exportable es una consulta con filtro de fechas. Las filas se
+# leen con fetchmany() en bloques de EXPORT_CHUNK_SIZE y se entregan mediante
+# un generador, de modo que la memoria no depende del tamaño de la exportación.
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_QUERIES = {
+    'attendance': (
+        ['student_id', 'nombre', 'apellido', 'periodo', 'fecha', 'timestamp'],
+        "SELECT a.student_id, s.nombre, s.apellido, a.periodo, a.fecha, a.timestamp "
+        "FROM attendance a JOIN students s ON s.id = a.student_id "
+        "WHERE a.fecha BETWEEN ? AND ? ORDER BY a.fecha, a.periodo, a.timestamp"),
+    'participation': (
+        ['student_id', 'nombre', 'apellido', 'periodo', 'fecha', 'timestamp'],
+        "SELECT p.student_id, s.nombre, s.apellido, p.periodo, date(p.timestamp) AS fecha, p.timestamp "
+        "FROM participation p JOIN students s ON s.id = p.student_id "
+        "WHERE date(p.timestamp) BETWEEN ? AND ? ORDER BY p.timestamp"),
+    'learning_styles': (
+        ['student_id', 'nombre', 'apellido', 'kolb_style', 'vak_style', 'completed_date'],
+        "SELECT ls.student_id, s.nombre, s.apellido, ls.kolb_style, ls.vak_style, ls.completed_date, ls.felder_styles "
+        "FROM learning_styles ls JOIN students s ON s.id = ls.student_id "
+        "WHERE ls.completed_date BETWEEN ? AND ? ORDER BY s.apellido, s.nombre"),
+    'students': (
+        ['id', 'nombre', 'apellido', 'registro_fecha'],
+        "SELECT id, nombre, apellido, registro_fecha FROM students "
+        "WHERE registro_fecha BETWEEN ? AND ? ORDER BY id"),
+}
+
+def get_export_columns(dataset):
+    """Devuelve las columnas del conjunto exportado.
+
+    Para learning_styles, cada dimensión Felder del JSON `felder_styles` se
+    expande a una columna `felder_<dimensión>`.
+    """
+    columns = list(EXPORT_QUERIES[dataset][0])
+    if dataset == 'learning_styles':
+        with _get_db_conn() as conn:
+            dims = [r[0] for r in conn.execute("SELECT DISTINCT j.key FROM learning_styles, json_each(learning_styles.felder_styles) j ORDER BY j.key")]
+        columns += [f"felder_{d}" for d in dims]
+    return columns
+
+def iter_export_chunks(dataset, start, end, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Genera en bloques las filas del conjunto `dataset` entre `start` y `end` (fechas ISO, incluidas).
+
+    Cada iteración hace un solo fetchmany(), así quien la consume puede
+    pedir cada bloque fuera del bucle de eventos.
+
+    Args:
+        dataset (str): Clave de EXPORT_QUERIES.
+        start, end (str): Rango de fechas.
+        columns (list): Columnas devueltas por get_export_columns().
+        chunk_size (int): Filas leídas por cada fetchmany().
+
+    Yields:
+        list: Bloque de hasta `chunk_size` filas; cada fila es la lista de
+        valores en el orden de `columns`.
     """
+    _, sql = EXPORT_QUERIES[dataset]
+    conn = _get_db_conn()
     try:
-        with db_lock, _get_db_conn() as conn:
-            conn.execute("INSERT INTO participation (student_id, periodo, timestamp) VALUES (?, ?, ?)",
-                         (student_id, periodo, datetime.datetime.now().isoformat()))
-            return True
-    except Exception:
-        return False
+        cursor = conn.execute(sql, (start, end))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = []
+            for row in rows:
+                record = dict(row)
+                if dataset == 'learning_styles':
+                    felder = json.loads(record.pop('felder_styles') or '{}')
+                    for key, value in felder.items():
+                        record[f"felder_{key}"] = value
+                chunk.append([record.get(c) for c in columns])
+            yield chunk
+    finally:
+        conn.close()
 
 def get_all_students_with_learning_styles():
     try:
@@ -156,13 +807,12 @@ def get_all_students_with_learning_styles():
             return students
     except: return []
     
-def save_recording_metadata(class_name, start_timestamp, end_timestamp, file_path, text_file_path, duration_seconds, transcribed_text):
-    try:
-        with db_lock, _get_db_conn() as conn:
-            conn.execute("INSERT INTO transcriptions (class_name, start_timestamp, end_timestamp, file_path, text_file_path, duration_seconds, transcribed_text) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                         (class_name, start_timestamp, end_timestamp, file_path, text_file_path, duration_seconds, transcribed_text))
-            return True
-    except: return False
+def save_recording_metadata(class_name, start_timestamp, end_timestamp, file_path, text_file_path, duration_seconds, transcribed_text, speech_seconds=None, skipped_seconds=None):
+    """Encola el alta de una transcripción. Devuelve un Future con el id nuevo (o False si falla)."""
+    params = (class_name, start_timestamp, end_timestamp, file_path, text_file_path, duration_seconds, transcribed_text, speech_seconds, skipped_seconds)
+    def op(conn):
+        return conn.execute("INSERT INTO transcriptions (class_name, start_timestamp, end_timestamp, file_path, text_file_path, duration_seconds, transcribed_text, speech_seconds, skipped_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", params).lastrowid
+    return _submit_write(op, default=False)
 
 def get_all_transcriptions():
     try:
@@ -171,14 +821,40 @@ def get_all_transcriptions():
     except: return []
 
 def delete_transcription(transcription_id):
+    """Borra una transcripción. Devuelve (file_path, text_file_path, archive_path) para borrar los archivos."""
+    def op(conn):
+        result = conn.execute("SELECT file_path, text_file_path, archive_path FROM transcriptions WHERE id = ?", (transcription_id,)).fetchone()
+        conn.execute("DELETE FROM transcriptions WHERE id = ?", (transcription_id,))
+        return (result['file_path'], result['text_file_path'], result['archive_path']) if result else (None, None, None)
+    return _submit_write(op, default=(None, None, None)).result()
+
+# --- Archivo comprimido de audio ---
+
+def get_unarchived_transcriptions():
     try:
-        with db_lock, _get_db_conn() as conn:
-            cursor = conn.execute("SELECT file_path, text_file_path FROM transcriptions WHERE id = ?", (transcription_id,))
-            result = cursor.fetchone()
-            file_path, text_file_path = (result['file_path'], result['text_file_path']) if result else (None, None)
-            conn.execute("DELETE FROM transcriptions WHERE id = ?", (transcription_id,))
-            return file_path, text_file_path
-    except: return None, None
+        with _get_db_conn() as conn:
+            return [dict(r) for r in conn.execute("SELECT id, file_path FROM transcriptions WHERE archive_path IS NULL ORDER BY id")]
+    except: return []
+
+def set_transcription_archive(transcription_id, archive_path):
+    """Registra el archivo comprimido de una transcripción. Devuelve un Future con True/False."""
+    def op(conn):
+        return conn.execute("UPDATE transcriptions SET archive_path = ?, archived_at = ? WHERE id = ?",
+                            (archive_path, datetime.datetime.now().isoformat(), transcription_id)).rowcount > 0
+    return _submit_write(op, default=False)
+
+def get_archived_originals(archived_before):
+    """Transcripciones archivadas antes de `archived_before` que aún conservan el WAV original."""
+    try:
+        with _get_db_conn() as conn:
+            return [dict(r) for r in conn.execute("SELECT id, file_path, archive_path FROM transcriptions WHERE archive_path IS NOT NULL AND file_path != archive_path AND archived_at <= ?", (archived_before,))]
+    except: return []
+
+def use_archive_as_original(transcription_id):
+    """Hace que file_path apunte al archivo comprimido (antes de borrar el WAV)."""
+    def op(conn):
+        return conn.execute("UPDATE transcriptions SET file_path = archive_path WHERE id = ? AND archive_path IS NOT NULL", (transcription_id,)).rowcount > 0
+    return _submit_write(op, default=False)
 
 def get_student_details_with_styles(student_id):
     try:
@@ -190,6 +866,159 @@ def get_student_details_with_styles(student_id):
             return student_dict
     except: return None
 
+# --- Trabajos de transcripción ---
+#
+# Estado persistente de la cola de transcripción: status es 'queued',
+# 'running', 'done' o 'error'.  Los trabajos sin terminar se reencolan al
+# reiniciar el servidor.
+
+JOB_FIELDS = ('status', 'progress', 'message', 'transcription_id')
+
+def create_transcription_job(wav_path, model_size, class_name, start_timestamp, duration_seconds):
+    """Registra un trabajo en estado 'queued' y devuelve su id (None si falla)."""
+    now = datetime.datetime.now().isoformat()
+    def op(conn):
+        return conn.execute("INSERT INTO transcription_jobs (wav_path, model_size, class_name, start_timestamp, duration_seconds, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                            (wav_path, model_size, class_name, start_timestamp, duration_seconds, now, now)).lastrowid
+    return _submit_write(op).result()
+
+def update_transcription_job(job_id, **fields):
+    """Encola la actualización de los campos de JOB_FIELDS indicados. Devuelve un Future."""
+    fields = {k: v for k, v in fields.items() if k in JOB_FIELDS}
+    fields['updated_at'] = datetime.datetime.now().isoformat()
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    def op(conn):
+        conn.execute(f"UPDATE transcription_jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+        return True
+    return _submit_write(op, default=False)
+
+def get_transcription_job(job_id):
+    try:
+        with _get_db_conn() as conn:
+            row = conn.execute("SELECT * FROM transcription_jobs WHERE id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+    except: return None
+
+def get_unfinished_transcription_jobs():
+    """Trabajos 'queued' o 'running' en orden de llegada (para reanudar tras un reinicio)."""
+    try:
+        with _get_db_conn() as conn:
+            return [dict(r) for r in conn.execute("SELECT * FROM transcription_jobs WHERE status IN ('queued', 'running') ORDER BY id")]
+    except: return []
+
+def get_recent_transcription_jobs(limit=20):
+    try:
+        with _get_db_conn() as conn:
+            return [dict(r) for r in conn.execute("SELECT * FROM transcription_jobs ORDER BY id DESC LIMIT ?", (limit,))]
+    except: return []
+
+# --- Segmentos de transcripción ---
+
+def save_transcription_segments(wav_path, segments):
+    """Encola el guardado de segmentos ({'start', 'end', 'text'}). Devuelve un Future."""
+    rows = [(wav_path, seg['start'], seg['end'], seg['text']) for seg in segments]
+    def op(conn):
+        conn.executemany("INSERT INTO transcription_segments (wav_path, start_seconds, end_seconds, text) VALUES (?, ?, ?, ?)", rows)
+        return True
+    return _submit_write(op, default=False)
+
+def clear_transcription_segments(wav_path):
+    """Borra los segmentos aún no enlazados de una grabación (antes de retranscribirla)."""
+    def op(conn):
+        conn.execute("DELETE FROM transcription_segments WHERE wav_path = ? AND transcription_id IS NULL", (wav_path,))
+        return True
+    return _submit_write(op, default=False)
+
+def link_transcription_segments(wav_path, transcription_id):
+    """Asocia los segmentos de una grabación a la transcripción creada al finalizar."""
+    def op(conn):
+        conn.execute("UPDATE transcription_segments SET transcription_id = ? WHERE wav_path = ? AND transcription_id IS NULL", (transcription_id, wav_path))
+        return True
+    return _submit_write(op, default=False)
+
+def get_transcription_segments(transcription_id):
+    try:
+        with _get_db_conn() as conn:
+            return [dict(r) for r in conn.execute("SELECT start_seconds, end_seconds, text FROM transcription_segments WHERE transcription_id = ? ORDER BY start_seconds", (transcription_id,))]
+    except: return []
+
+# --- Búsqueda de texto completo ---
+#
+# Se busca primero en transcriptions_fts (texto transcrito y mejorado) y,
+# para las transcripciones encontradas, en segments_fts para ofrecer los
+# instantes exactos del audio.  Los fragmentos resaltados usan los
+# marcadores SEARCH_HIGHLIGHT para que quien los muestre los escape.
+
+SEARCH_HIGHLIGHT = ('\x02', '\x03')
+SEARCH_SNIPPET_TOKENS = 16
+SEARCH_MAX_SEGMENTS = 5
+
+def rebuild_search_index(conn=None):
+    """Reconstruye los índices FTS5 desde las tablas de origen."""
+    if conn is not None:
+        conn.execute("INSERT INTO transcriptions_fts (transcriptions_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO segments_fts (segments_fts) VALUES ('rebuild')")
+        return True
+    return _submit_write(rebuild_search_index, default=False).result()
+
+def fts_query(text, any_term=False):
+    """Convierte texto libre en una consulta FTS5 segura.
+
+    Las frases entre comillas se buscan literalmente y cada palabra suelta
+    como prefijo ("deriv" encuentra "derivadas").  Por defecto deben
+    aparecer todos los términos; con any_term basta con uno.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\w+)', text):
+        if word:
+            terms.append(f'"{word}"*')
+        elif re.findall(r'\w+', phrase):
+            terms.append('"' + " ".join(re.findall(r'\w+', phrase)) + '"')
+    return (" OR " if any_term else " ").join(terms)
+
+def search_transcriptions(query, limit=20):
+    """Busca en las transcripciones, de la más a la menos relevante (BM25).
+
+    Returns:
+        list: dicts con id, class_name, start_timestamp, file_path, snippet,
+        score y segments (hasta SEARCH_MAX_SEGMENTS, con start_seconds,
+        end_seconds y text resaltado, en orden cronológico).
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    start, end = SEARCH_HIGHLIGHT
+    try:
+        with _get_db_conn() as conn:
+            results = [dict(r, segments=[]) for r in conn.execute("""
+                SELECT t.id, t.class_name, t.start_timestamp, t.file_path,
+                       snippet(transcriptions_fts, -1, ?, ?, '…', ?) AS snippet,
+                       -bm25(transcriptions_fts) AS score
+                FROM transcriptions_fts JOIN transcriptions t ON t.id = transcriptions_fts.rowid
+                WHERE transcriptions_fts MATCH ?
+                ORDER BY bm25(transcriptions_fts) LIMIT ?
+            """, (start, end, SEARCH_SNIPPET_TOKENS, match, limit))]
+            if not results:
+                return []
+            by_id = {r['id']: r for r in results}
+            # En segmentos basta un término: la frase buscada puede repartirse entre segmentos
+            segments = conn.execute(f"""
+                SELECT s.transcription_id, s.start_seconds, s.end_seconds, highlight(segments_fts, 0, ?, ?) AS text
+                FROM segments_fts JOIN transcription_segments s ON s.id = segments_fts.rowid
+                WHERE segments_fts MATCH ? AND s.transcription_id IN ({", ".join("?" * len(by_id))})
+                ORDER BY bm25(segments_fts)
+            """, (start, end, fts_query(query, any_term=True), *by_id))
+            for seg in segments:
+                found = by_id[seg['transcription_id']]['segments']
+                if len(found) < SEARCH_MAX_SEGMENTS:
+                    found.append({'start_seconds': seg['start_seconds'], 'end_seconds': seg['end_seconds'], 'text': seg['text']})
+            for r in results:
+                r['segments'].sort(key=lambda seg: seg['start_seconds'])
+            return results
+    except sqlite3.OperationalError as e:
+        db_logger.error(f"Error en la búsqueda de transcripciones: {e}")
+        return []
+
 def get_transcription_text(transcription_id):
     try:
         with _get_db_conn() as conn:
@@ -197,9 +1026,48 @@ def get_transcription_text(transcription_id):
             return result['transcribed_text'] if result else None
     except: return None
 
-def save_enhanced_text(transcription_id, enhanced_text):
+def get_unenhanced_transcriptions(limit=None):
+    """Transcripciones con texto pero sin versión mejorada, de la más antigua a la más reciente."""
+    try:
+        with _get_db_conn() as conn:
+            return [dict(r) for r in conn.execute(
+                """SELECT id, class_name, start_timestamp, length(transcribed_text) AS text_chars FROM transcriptions
+                   WHERE enhanced_text IS NULL AND transcribed_text IS NOT NULL AND transcribed_text != ''
+                   ORDER BY id LIMIT ?""", (-1 if limit is None else limit,))]
+    except: return []
+
+def save_enhanced_text(transcription_id, enhanced_text, stats=None):
+    """Encola el guardado del texto mejorado y, si se indican, sus métricas
+    (chunks, tokens_in, tokens_out, seconds, tokens_per_second).  Devuelve un Future (True/False)."""
+    stats = stats or {}
+    params = (enhanced_text, stats.get('chunks'), stats.get('tokens_in'), stats.get('tokens_out'),
+              stats.get('seconds'), stats.get('tokens_per_second'), transcription_id)
+    def op(conn):
+        conn.execute("""UPDATE transcriptions SET enhanced_text = ?, enhance_chunks = ?, enhance_tokens_in = ?, enhance_tokens_out = ?,
+                        enhance_seconds = ?, enhance_tokens_per_second = ? WHERE id = ?""", params)
+        return True
+    return _submit_write(op, default=False)
+
+def get_llm_cache(key):
     try:
-        with db_lock, _get_db_conn() as conn:
-            conn.execute("UPDATE transcriptions SET enhanced_text = ? WHERE id = ?", (enhanced_text, transcription_id))
-            return True
-    except: return False
\ No newline at end of file
+        with _get_db_conn() as conn:
+            row = conn.execute("SELECT content FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            return row['content'] if row else None
+    except: return None
+
+def _prune_llm_cache(conn):
+    """Aplica LLM_CACHE_MAX_AGE_DAYS y LLM_CACHE_MAX_ENTRIES. Devuelve las entradas borradas."""
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=LLM_CACHE_MAX_AGE_DAYS)).isoformat()
+    deleted = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,)).rowcount
+    deleted += conn.execute("DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                            (LLM_CACHE_MAX_ENTRIES,)).rowcount
+    return deleted
+
+def put_llm_cache(key, content):
+    """Encola el guardado de una generación en la caché, descartando las más antiguas. Devuelve un Future (True/False)."""
+    params = (key, content, datetime.datetime.now().isoformat())
+    def op(conn):
+        conn.execute("INSERT OR REPLACE INTO llm_cache (key, content, created_at) VALUES (?, ?, ?)", params)
+        _prune_llm_cache(conn)
+        return True
+    return _submit_write(op, default=False)
@@ -0,0 +1,152 @@
+"""Mejora con IA por lotes de las transcripciones pendientes.
+
+Procesa, de la más antigua a la más reciente, todas las transcripciones
+que aún no tienen texto mejorado, en este mismo proceso y con el modelo
+cargado una sola vez.  Pensado para ejecutarse fuera del horario de clase
+en lugar de pulsar "Mejorar" una por una desde el panel.
+
+Uso:
+    python enhance_backlog.py --until 06:00
+    python enhance_backlog.py --max-minutes 120 --max-cpu-minutes 480
+    python enhance_backlog.py --dry-run
+
+Programado con cron (de lunes a viernes a las 22:00):
+    0 22 * * 1-5  cd /ruta/al/proyecto && venv/bin/python enhance_backlog.py --until 06:00
+
+Reanudación:
+    Cada transcripción terminada queda guardada en la base de datos, así que
+    la siguiente ejecución continúa con las que faltan.  Si el presupuesto se
+    agota a mitad de una transcripción, la generación se detiene y los
+    fragmentos ya mejorados quedan en la caché del LLM (tabla llm_cache): al
+    retomarla solo se generan los que faltaban.
+
+Presupuesto:
+    --until, --max-minutes y --max-cpu-minutes se pueden combinar; la
+    ejecución termina con el primero que se agote.  El tiempo de CPU incluye
+    todos los hilos de llama.cpp.
+"""
+
+import argparse
+import datetime
+import threading
+import time
+
+import database
+import llm_processor
+
+# Cada cuánto se comprueba el presupuesto durante una generación
+BUDGET_CHECK_SECONDS = 5
+
+
+class Budget:
+    """Límite de tiempo real, hora de fin y tiempo de CPU del proceso."""
+
+    def __init__(self, max_minutes=None, max_cpu_minutes=None, until=None):
+        self.deadline = time.monotonic() + max_minutes * 60 if max_minutes else None
+        self.cpu_limit = time.process_time() + max_cpu_minutes * 60 if max_cpu_minutes else None
+        self.until = until
+
+    def exhausted(self):
+        """Devuelve el motivo si el presupuesto se agotó, o None."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "tiempo máximo alcanzado"
+        if self.cpu_limit is not None and time.process_time() >= self.cpu_limit:
+            return "tiempo de CPU máximo alcanzado"
+        if self.until is not None and datetime.datetime.now() >= self.until:
+            return f"hora de fin alcanzada ({self.until:%H:%M})"
+        return None
+
+    def watch(self, cancel_event, done_event):
+        """Activa cancel_event si el presupuesto se agota antes de done_event."""
+        while not done_event.wait(BUDGET_CHECK_SECONDS):
+            if self.exhausted():
+                cancel_event.set()
+                return
+
+
+def _parse_until(value):
+    """'HH:MM' -> la próxima vez que el reloj marque esa hora."""
+    hour, minute = (int(part) for part in value.split(':'))
+    now = datetime.datetime.now()
+    until = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return until if until > now else until + datetime.timedelta(days=1)
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
+
+
+def run(args):
+    database.init_db()
+    backlog = database.get_unenhanced_transcriptions(args.limit)
+    print(f"Transcripciones pendientes de mejora: {len(backlog)}")
+    if args.dry_run:
+        for record in backlog:
+            print(f"  #{record['id']}  {record['start_timestamp']}  {record['class_name']}  ({record['text_chars']} caracteres)")
+        return
+
+    budget = Budget(args.max_minutes, args.max_cpu_minutes, _parse_until(args.until) if args.until else None)
+    totals = {'done': 0, 'failed': 0, 'tokens_in': 0, 'tokens_out': 0, 'cached_calls': 0, 'seconds': 0.0}
+    started = time.monotonic()
+    stop_reason = None
+    try:
+        for index, record in enumerate(backlog, 1):
+            stop_reason = budget.exhausted()
+            if stop_reason:
+                break
+            cancel_event, done_event = threading.Event(), threading.Event()
+            watcher = threading.Thread(target=budget.watch, args=(cancel_event, done_event), daemon=True)
+            watcher.start()
+            try:
+                result = llm_processor.enhance_transcription(record['id'], cancel_event=cancel_event)
+            finally:
+                done_event.set()
+                watcher.join()
+            if result.get('cancelled'):
+                stop_reason = budget.exhausted() or "cancelada"
+                print(f"[{index}/{len(backlog)}] #{record['id']} interrumpida; se retomará desde la caché.")
+                break
+            if not result['success']:
+                totals['failed'] += 1
+                print(f"[{index}/{len(backlog)}] #{record['id']} falló: {result['message']}")
+                continue
+            stats = result['stats']
+            totals['done'] += 1
+            for key in ('tokens_in', 'tokens_out', 'cached_calls', 'seconds'):
+                totals[key] += stats[key]
+            print(f"[{index}/{len(backlog)}] #{record['id']} {record['class_name']}: {stats['chunks']} fragmentos, "
+                  f"{stats['tokens_out']} tokens en {stats['seconds']:.1f} s ({stats['tokens_per_second'] or '-'} tokens/s, "
+                  f"{stats['cached_calls']} desde caché)")
+    except KeyboardInterrupt:
+        stop_reason = "interrumpido por el usuario"
+    finally:
+        database.flush_writes()
+
+    elapsed = time.monotonic() - started
+    remaining = len(database.get_unenhanced_transcriptions())
+    print()
+    print(f"Fin: {stop_reason or 'backlog completado'}")
+    print(f"Mejoradas: {totals['done']}  Fallidas: {totals['failed']}  Tiempo: {_format_duration(elapsed)}  "
+          f"CPU: {_format_duration(time.process_time())}")
+    if totals['seconds']:
+        print(f"Rendimiento: {totals['tokens_out'] / totals['seconds']:.1f} tokens/s de salida, "
+              f"{totals['tokens_in']} tokens de entrada, "
+              f"{totals['cached_calls']} llamadas servidas desde la caché")
+    estimate = f" (≈{_format_duration(remaining * elapsed / totals['done'])} al ritmo actual)" if totals['done'] and remaining else ""
+    print(f"Pendientes: {remaining}{estimate}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mejora con IA por lotes de las transcripciones pendientes.")
+    parser.add_argument('--until', type=str, default=None, help='Hora (HH:MM) a la que se detiene, p. ej. 06:00.')
+    parser.add_argument('--max-minutes', type=float, default=None, help='Tiempo real máximo de la ejecución.')
+    parser.add_argument('--max-cpu-minutes', type=float, default=None, help='Tiempo de CPU máximo del proceso (suma de todos los hilos).')
+    parser.add_argument('--limit', type=int, default=None, help='Número máximo de transcripciones a procesar.')
+    parser.add_argument('--dry-run', action='store_true', help='Solo lista las transcripciones pendientes.')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
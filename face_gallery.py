@@ -0,0 +1,82 @@
+# face_gallery.py
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fg_logger = logging.getLogger(__name__)
+
+# --- Galería compacta de rostros ---
+#
+# El registro guarda varios encodings por estudiante, tomados con medio
+# segundo de diferencia y casi siempre casi idénticos.  Para reconocer basta
+# con una plantilla por estudiante (el centroide de sus encodings) más los
+# encodings que se alejan de todo lo ya guardado (otra pose, otra luz).  Así
+# el coste de cada comparación crece con el número de estudiantes y no con
+# el de capturas.  Los encodings originales se conservan en face_embeddings
+# y las plantillas (tabla face_templates) se pueden recalcular con
+# compact_gallery.py.
+
+# Un encoding se guarda como plantilla adicional si está a más de esta
+# distancia de todas las ya elegidas (las coincidencias se aceptan hasta 0.6)
+GALLERY_TEMPLATE_DISTANCE = 0.25
+# Plantillas máximas por estudiante, contando el centroide
+GALLERY_MAX_TEMPLATES = 3
+
+
+def compact_templates(encodings, threshold=GALLERY_TEMPLATE_DISTANCE, max_templates=GALLERY_MAX_TEMPLATES):
+    """Centroide de `encodings` más los más alejados, en orden de lejanía.
+
+    Cada encoding adicional es el más alejado de las plantillas ya elegidas y
+    solo se añade si esa distancia supera `threshold`.
+
+    Returns:
+        list[list[float]]: entre 1 y max_templates plantillas (vacía si no
+        hay encodings).
+    """
+    E = np.asarray(encodings, dtype=np.float64)
+    if E.size == 0:
+        return []
+    templates = [E.mean(axis=0)]
+    nearest = np.linalg.norm(E - templates[0], axis=1)
+    while len(templates) < max_templates:
+        i = int(np.argmax(nearest))
+        if nearest[i] <= threshold:
+            break
+        templates.append(E[i])
+        nearest = np.minimum(nearest, np.linalg.norm(E - E[i], axis=1))
+    return [t.tolist() for t in templates]
+
+
+class FaceGallery:
+    """Plantillas de todos los estudiantes en una matriz para compararlas de una vez.
+
+    rows: iterable de (student_id, nombre, encoding).  Se admiten
+    encodings de distinta longitud (128 de face_recognition, 512 de otros
+    modelos); cada consulta se compara con los de su misma longitud.
+    """
+
+    def __init__(self, rows):
+        self.students = []
+        index = {}
+        by_size = {}
+        for student_id, nombre, encoding in rows:
+            if student_id not in index:
+                index[student_id] = len(self.students)
+                self.students.append({'id': student_id, 'nombre': nombre})
+            encoding = np.asarray(encoding, dtype=np.float32)
+            by_size.setdefault(encoding.size, ([], []))
+            by_size[encoding.size][0].append(encoding)
+            by_size[encoding.size][1].append(index[student_id])
+        self._matrices = {size: (np.stack(encs), np.array(owners)) for size, (encs, owners) in by_size.items()}
+        self.templates = sum(len(owners) for _, owners in self._matrices.values())
+        fg_logger.info(f"Galería de rostros: {len(self.students)} estudiantes, {self.templates} plantillas.")
+
+    def match(self, encoding):
+        """(metadatos {id, nombre} del estudiante más cercano, distancia), o (None, inf)."""
+        encoding = np.asarray(encoding, dtype=np.float32)
+        if encoding.size not in self._matrices:
+            return None, float('inf')
+        matrix, owners = self._matrices[encoding.size]
+        distances = np.linalg.norm(matrix - encoding.ravel(), axis=1)
+        i = int(np.argmin(distances))
+        return self.students[owners[i]], float(distances[i])
@@ -0,0 +1,112 @@
+# face_scan.py
+import io
+import cv2
+import numpy as np
+import logging
+from PIL import Image
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fs_logger = logging.getLogger(__name__)
+
+# --- Detección de rostros a resolución adaptativa ---
+#
+# El detector HOG recorre la imagen entera a todas las escalas, así que su
+# coste crece con los píxeles: a resolución completa es el paso más lento de
+# cada frame.  Por eso:
+# 1. Sin pista previa se detecta sobre el frame reducido a FACE_DETECT_WIDTH.
+# 2. Si hay un rostro del frame anterior (ROI) se busca solo en un recorte
+#    alrededor de él, escalado para que el rostro mida unos
+#    FACE_ROI_FACE_PIXELS; si ahí no aparece se vuelve al frame completo.
+# 3. El encoding se calcula sobre un recorte del rostro a resolución
+#    completa: los puntos de referencia afinan la caja aproximada del
+#    detector y no se convierte a RGB el frame entero.
+
+# Ancho de trabajo del detector sobre el frame completo
+FACE_DETECT_WIDTH = 640
+# Veces que el detector amplía la imagen reducida (rostros pequeños)
+FACE_DETECT_UPSAMPLE = 1
+# Margen alrededor del rostro anterior, en fracciones de su tamaño
+FACE_ROI_MARGIN = 0.6
+# Tamaño al que se lleva el rostro dentro del ROI (la ventana HOG es de 80 px)
+FACE_ROI_FACE_PIXELS = 120
+# Margen del recorte sobre el que se calcula el encoding
+FACE_ENCODE_MARGIN = 0.25
+# Factores de reducción que OpenCV aplica al decodificar (JPEG a escala 1/2, 1/4, 1/8)
+_REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def decode_image(data):
+    """JPEG/PNG en bytes -> imagen BGR, o None si no se puede decodificar.
+
+    Si la imagen es más ancha que el detector, se decodifica ya reducida (el
+    JPEG se descomprime directamente a 1/2, 1/4 u 1/8) al mayor factor que
+    conserve al menos FACE_DETECT_WIDTH de ancho.
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    try:
+        width = Image.open(io.BytesIO(data)).size[0]
+    except Exception:
+        width = 0
+    for factor, flag in _REDUCED_DECODE_FLAGS:
+        if width // factor >= FACE_DETECT_WIDTH:
+            return cv2.imdecode(buffer, flag)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def expand_box(box, margin, shape):
+    """Caja (top, right, bottom, left) agrandada `margin` veces su tamaño por lado y recortada a la imagen."""
+    top, right, bottom, left = box
+    dy, dx = (bottom - top) * margin, (right - left) * margin
+    height, width = shape[:2]
+    return (max(0, int(top - dy)), min(width, int(right + dx)), min(height, int(bottom + dy)), max(0, int(left - dx)))
+
+
+def _rgb_scaled(image, scale):
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def _detect(image_bgr, scale, upsample, top=0, left=0, shape=None):
+    """Detecta sobre image_bgr escalada y devuelve las cajas en coordenadas del frame original."""
+    import face_recognition
+    height, width = (shape or image_bgr.shape)[:2]
+    found = face_recognition.face_locations(_rgb_scaled(image_bgr, scale), number_of_times_to_upsample=upsample, model='hog')
+    return [(max(0, top + int(t / scale)), min(width, left + int(r / scale)),
+             min(height, top + int(b / scale)), max(0, left + int(l / scale))) for t, r, b, l in found]
+
+
+def detect_faces(frame_bgr, roi=None):
+    """Rostros de frame_bgr como cajas (top, right, bottom, left) a resolución completa.
+
+    Args:
+        roi: caja de un rostro del frame anterior; si se da, se busca primero
+            solo a su alrededor.
+    """
+    if roi is not None:
+        top, right, bottom, left = expand_box(roi, FACE_ROI_MARGIN, frame_bgr.shape)
+        if bottom > top and right > left:
+            scale = min(1.0, FACE_ROI_FACE_PIXELS / max(1, roi[1] - roi[3]))
+            boxes = _detect(frame_bgr[top:bottom, left:right], scale, 0, top, left, frame_bgr.shape)
+            if boxes:
+                return boxes
+    scale = min(1.0, FACE_DETECT_WIDTH / frame_bgr.shape[1])
+    return _detect(frame_bgr, scale, FACE_DETECT_UPSAMPLE)
+
+
+def encode_faces(frame_bgr, boxes):
+    """Encoding de cada caja (o None si no se pudo), calculado sobre un recorte del rostro."""
+    import face_recognition
+    encodings = []
+    for box in boxes:
+        top, right, bottom, left = expand_box(box, FACE_ENCODE_MARGIN, frame_bgr.shape)
+        crop = cv2.cvtColor(frame_bgr[top:bottom, left:right], cv2.COLOR_BGR2RGB)
+        local = (box[0] - top, box[1] - left, box[2] - top, box[3] - left)
+        found = face_recognition.face_encodings(crop, [local])
+        encodings.append(found[0] if found else None)
+    return encodings
+
+
+def box_area(box):
+    top, right, bottom, left = box
+    return max(0, bottom - top) * max(0, right - left)
@@ -0,0 +1,228 @@
+# group_formation.py
+import time
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+gf_logger = logging.getLogger(__name__)
+
+# --- Formación de grupos balanceados por estilos de aprendizaje ---
+#
+# Cada estudiante se describe con un vector one-hot de sus estilos (Kolb,
+# VAK y el polo de cada dimensión de Felder).  El objetivo es que cada grupo
+# tenga de cada estilo la misma proporción que la clase entera: se minimiza
+# la suma de los cuadrados de (conteo del grupo - tamaño del grupo ×
+# proporción global) sobre grupos y estilos.  Los tamaños de grupo difieren
+# como mucho en uno y los intercambios los conservan.
+#
+# 1. Semilla voraz: cada estudiante, empezando por los perfiles menos
+#    frecuentes, va al grupo con hueco cuyo déficit de estilos mejor cubre
+#    (un producto matriz-vector por estudiante).
+# 2. Búsqueda local: intercambios de dos estudiantes de grupos distintos.
+#    Los estudiantes con el mismo perfil son intercambiables, así que se
+#    trabaja con la matriz de conteos grupo × perfil y la mejora de todos los
+#    intercambios posibles de un grupo se evalúa de una vez con NumPy.
+
+# Peso de cada familia de estilos en el objetivo (Felder tiene 4 dimensiones)
+GROUP_STYLE_WEIGHTS = {'kolb': 1.0, 'vak': 1.0, 'felder': 0.5}
+# Tiempo máximo de la búsqueda local
+GROUP_TIME_BUDGET_SECONDS = 2.0
+# Intercambios seguidos que se aplican a un mismo grupo antes de pasar al siguiente
+GROUP_MAX_SWAPS_PER_VISIT = 16
+
+
+def _style_columns(students):
+    """Columnas one-hot: lista de (familia, clave, valor) presentes en los datos."""
+    columns = set()
+    for s in students:
+        if s.get('kolb_style'):
+            columns.add(('kolb', 'kolb', s['kolb_style']))
+        if s.get('vak_style'):
+            columns.add(('vak', 'vak', s['vak_style']))
+        for dim, pole in (s.get('felder_styles') or {}).items():
+            columns.add(('felder', dim, pole))
+    return sorted(columns)
+
+
+def _profile_key(student):
+    felder = student.get('felder_styles') or {}
+    return (student.get('kolb_style') or '', student.get('vak_style') or '', tuple(sorted(felder.items())))
+
+
+def _profile_matrix(students):
+    """Agrupa a los estudiantes por perfil de estilos.
+
+    Returns:
+        tuple: (índice de perfil de cada estudiante, matriz perfil × columna
+        ya ponderada, columnas).
+    """
+    columns = _style_columns(students)
+    col_index = {c: i for i, c in enumerate(columns)}
+    profiles, profile_of = {}, np.empty(len(students), dtype=np.int64)
+    for i, s in enumerate(students):
+        profile_of[i] = profiles.setdefault(_profile_key(s), len(profiles))
+    X = np.zeros((len(profiles), len(columns)))
+    for (kolb, vak, felder), p in profiles.items():
+        if kolb:
+            X[p, col_index[('kolb', 'kolb', kolb)]] = 1
+        if vak:
+            X[p, col_index[('vak', 'vak', vak)]] = 1
+        for dim, pole in felder:
+            X[p, col_index[('felder', dim, pole)]] = 1
+    weights = np.array([GROUP_STYLE_WEIGHTS.get(family, 1.0) for family, _, _ in columns])
+    return profile_of, X * np.sqrt(weights), columns
+
+
+def seed_groups(profile_of, X, sizes, targets, rng):
+    """Reparto inicial voraz: cada estudiante va al grupo con hueco donde más reduce el objetivo.
+
+    Se reparten primero los perfiles menos frecuentes, que son los que más
+    cuesta equilibrar; dentro de cada perfil el orden lo fija `rng`.
+    """
+    frequency = np.bincount(profile_of)
+    order = rng.permutation(len(profile_of))
+    order = order[np.argsort(frequency[profile_of[order]], kind='stable')]
+    D = -targets
+    free = sizes.astype(np.float64)
+    group_of = np.empty(len(profile_of), dtype=np.int64)
+    for student in order:
+        x = X[profile_of[student]]
+        score = D @ x
+        score[free == 0] = np.inf
+        g = int(np.argmin(score))
+        group_of[student] = g
+        D[g] += x
+        free[g] -= 1
+    return group_of
+
+
+def _local_search(counts, X, targets, deadline):
+    """Aplica intercambios que reducen el objetivo hasta un óptimo local o hasta `deadline`.
+
+    counts (grupo × perfil) se modifica en el sitio.  Para un estudiante de
+    perfil p del grupo a y otro de perfil q del grupo b, con D = conteos -
+    objetivo y d = x_q - x_p, el cambio del objetivo es
+        2 (D_a·d - D_b·d + |d|²)
+    y con DX = D Xᵀ (grupo × perfil) y G = X Xᵀ se calcula a la vez para
+    todos los perfiles de a y todos los pares (b, q) presentes.  Devuelve
+    (intercambios, pasadas, completado).
+    """
+    D = counts @ X - targets
+    DX = D @ X.T
+    G = X @ X.T
+    sq = np.diag(G)
+    swaps = sweeps = 0
+    improved = True
+    while improved:
+        improved = False
+        sweeps += 1
+        for a in np.argsort(-np.einsum('ij,ij->i', D, D)):
+            for _ in range(GROUP_MAX_SWAPS_PER_VISIT):
+                if time.monotonic() >= deadline:
+                    return swaps, sweeps, False
+                present = np.flatnonzero(counts[a])
+                B, Q = np.nonzero(counts)
+                outside = B != a
+                B, Q = B[outside], Q[outside]
+                if not present.size or not B.size:
+                    break
+                # delta[k, u]: sacar un perfil present[k] de a y traer un Q[u] desde el grupo B[u]
+                delta = ((DX[a, Q] - DX[B, Q] + sq[Q])[None, :]
+                         + (sq[present] - DX[a, present])[:, None]
+                         + DX[:, present][B].T - 2 * G[np.ix_(present, Q)])
+                k, u = np.unravel_index(np.argmin(delta), delta.shape)
+                if delta[k, u] >= -1e-9:
+                    break
+                p, b, q = present[k], B[u], Q[u]
+                counts[a, p] -= 1; counts[a, q] += 1
+                counts[b, q] -= 1; counts[b, p] += 1
+                d = X[q] - X[p]
+                D[a] += d; D[b] -= d
+                DX[a] += G[q] - G[p]; DX[b] -= G[q] - G[p]
+                swaps += 1
+                improved = True
+    return swaps, sweeps, True
+
+
+def _assign(profile_of, seed_group_of, counts):
+    """Traduce los conteos finales a un grupo por estudiante, moviendo lo mínimo desde la semilla."""
+    group_of = seed_group_of.copy()
+    quota = counts.copy()
+    overflow = []
+    for student, (p, g) in enumerate(zip(profile_of, seed_group_of)):
+        if quota[g, p] > 0:
+            quota[g, p] -= 1
+        else:
+            overflow.append(student)
+    for student in overflow:
+        p = profile_of[student]
+        g = int(np.flatnonzero(quota[:, p])[0])
+        quota[g, p] -= 1
+        group_of[student] = g
+    return group_of
+
+
+def _imbalance(counts, X, targets, columns):
+    """Máxima desviación (en estudiantes) entre el conteo de un estilo en un grupo y su objetivo, por familia."""
+    weights = np.array([GROUP_STYLE_WEIGHTS.get(family, 1.0) for family, _, _ in columns])
+    deviation = np.abs(counts @ X - targets) / np.sqrt(weights)
+    families = np.array([family for family, _, _ in columns])
+    return {family: round(float(deviation[:, families == family].max()), 2) for family in sorted(GROUP_STYLE_WEIGHTS) if family in families}
+
+
+def form_groups(students, num_groups, seed=None, time_budget=GROUP_TIME_BUDGET_SECONDS):
+    """Reparte `students` en `num_groups` grupos balanceados por tamaño y estilos.
+
+    Args:
+        students (list[dict]): con kolb_style, vak_style y felder_styles
+            (dict dimensión -> polo), como los devuelve
+            database.get_all_students_with_learning_styles().
+        seed (int, opcional): semilla del orden inicial; con la misma semilla,
+            los mismos datos y una búsqueda que termina dentro del
+            presupuesto, el resultado es idéntico.  Sin ella se elige una.
+        time_budget (float): segundos máximos de búsqueda local.
+
+    Returns:
+        tuple: (lista de grupos con los dicts de los estudiantes, métricas).
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**32)
+    rng = np.random.default_rng(seed)
+    started = time.monotonic()
+    profile_of, X, columns = _profile_matrix(students)
+    sizes = np.full(num_groups, len(students) // num_groups)
+    sizes[rng.permutation(num_groups)[:len(students) % num_groups]] += 1
+    targets = sizes[:, None] * (np.bincount(profile_of, minlength=X.shape[0]) @ X / len(students))[None, :]
+    seed_group_of = seed_groups(profile_of, X, sizes, targets, rng)
+    counts = np.zeros((num_groups, X.shape[0]), dtype=np.int64)
+    np.add.at(counts, (seed_group_of, profile_of), 1)
+    initial = float(((counts @ X - targets) ** 2).sum())
+    seeded = time.monotonic()
+    if num_groups > 1:
+        swaps, sweeps, converged = _local_search(counts, X, targets, seeded + time_budget)
+    else:
+        # Con un solo grupo no hay intercambios posibles
+        swaps, sweeps, converged = 0, 0, True
+    group_of = _assign(profile_of, seed_group_of, counts)
+    groups = [[] for _ in range(num_groups)]
+    for student, g in zip(students, group_of):
+        groups[g].append(student)
+    stats = {
+        "seed": seed,
+        "students": len(students),
+        "groups": num_groups,
+        "profiles": int(X.shape[0]),
+        "size_min": int(sizes.min()),
+        "size_max": int(sizes.max()),
+        "objective_initial": round(initial, 3),
+        "objective_final": round(float(((counts @ X - targets) ** 2).sum()), 3),
+        "max_deviation": _imbalance(counts, X, targets, columns),
+        "swaps": swaps,
+        "sweeps": sweeps,
+        "converged": converged,
+        "seed_seconds": round(seeded - started, 3),
+        "search_seconds": round(time.monotonic() - seeded, 3),
+    }
+    gf_logger.info(f"Grupos formados: {num_groups} grupos de {len(students)} estudiantes, objetivo "
+                   f"{stats['objective_initial']} -> {stats['objective_final']} ({swaps} intercambios, {stats['search_seconds']} s).")
+    return groups, stats
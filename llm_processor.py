@@ -1,6 +1,11 @@
 # llm_processor.py
 import os
-from llama_cpp import Llama
+import re
+import json
+import time
+import hashlib
+import threading
+import database
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -8,32 +13,264 @@ llm_logger = logging.getLogger(__name__)
 
 MODEL_NAME = "Phi-3-mini-4k-instruct-q4.gguf"
 MODEL_PATH = os.path.join("modelos", MODEL_NAME)
+# Ventana de contexto del modelo (Phi-3-mini-4k admite 4096 tokens)
+LLM_CONTEXT_TOKENS = 4096
 LLM_INSTANCE = None
+# Una sola generación a la vez sobre la instancia compartida
+LLM_LOCK = threading.Lock()
+_LOAD_LOCK = threading.Lock()
+
+# --- Mejora por fragmentos ---
+#
+# Una clase real no cabe en el contexto del modelo.  La transcripción se
+# divide en fragmentos de hasta ENRICH_CHUNK_TOKENS cortando en fin de frase;
+# cada fragmento se mejora por separado junto con un breve resumen de lo
+# anterior (que se actualiza tras cada fragmento) y los resultados se unen en
+# orden.  El prompt de sistema + resumen + fragmento + respuesta deben caber
+# en LLM_CONTEXT_TOKENS.
+ENRICH_CHUNK_TOKENS = 700
+ENRICH_MAX_OUTPUT_TOKENS = 1400
+SUMMARY_MAX_TOKENS = 160
+
+ENRICH_SYSTEM_PROMPT = """Eres un asistente académico experto. Tu tarea es tomar un fragmento de la transcripción de una clase y enriquecerlo. No lo resumas.
+Tu objetivo es expandir los conceptos clave, añadir contexto histórico o práctico relevante, explicar términos técnicos con analogías claras y, en general, hacer el contenido más detallado y educativo para un estudiante.
+Corrige posibles errores gramaticales o de transcripción de forma sutil. Si se indica lo tratado antes en la clase, úsalo solo como contexto y no lo repitas. Responde únicamente con el texto mejorado del fragmento, en español."""
+
+SUMMARY_SYSTEM_PROMPT = """Resume en pocas frases, en español, de qué trata la clase hasta ahora, a partir del resumen anterior y del nuevo fragmento. Responde solo con el resumen."""
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+
+# Formato de chat de Phi-3.  El prompt se arma aquí (y no con
+# create_chat_completion) para conocer exactamente los tokens del prefijo
+# BOS + bloque de sistema, que es idéntico en todas las llamadas con el mismo
+# prompt de sistema.
+CHAT_SYSTEM_TEMPLATE = "<|system|>\n{system}<|end|>\n"
+CHAT_USER_TEMPLATE = "<|user|>\n{user}<|end|>\n<|assistant|>\n"
+CHAT_STOP = ["<|end|>", "<|endoftext|>"]
+ENRICH_TEMPERATURE = 0.2
+
+
+class EnrichmentCancelled(Exception):
+    """La mejora se canceló a mitad de la generación."""
+
 
 def _load_model():
     global LLM_INSTANCE
-    if LLM_INSTANCE is None:
+    with _LOAD_LOCK:
+        if LLM_INSTANCE is not None:
+            return LLM_INSTANCE
         if not os.path.exists(MODEL_PATH):
             raise FileNotFoundError(f"El modelo no se encontró en {MODEL_PATH}")
         llm_logger.info("Cargando modelo LLM...")
         try:
-            LLM_INSTANCE = Llama(model_path=MODEL_PATH, n_gpu_layers=-1, n_ctx=2048, verbose=False)
+            # llama_cpp se importa aquí: los procesos del pool de Whisper también importan este módulo
+            from llama_cpp import Llama
+            LLM_INSTANCE = Llama(model_path=MODEL_PATH, n_gpu_layers=-1, n_ctx=LLM_CONTEXT_TOKENS, verbose=False)
             llm_logger.info("✅ Modelo LLM cargado exitosamente.")
         except Exception as e:
             llm_logger.error(f"Error al cargar el modelo LLM: {e}")
             raise
-    return LLM_INSTANCE
+        return LLM_INSTANCE
+
+
+def count_tokens(llm, text):
+    return len(llm.tokenize(text.encode('utf-8'), add_bos=False))
+
+
+def _tokenize_chat(llm, text):
+    return llm.tokenize(text.encode('utf-8'), add_bos=False, special=True)
+
+
+# --- Reutilización del prefijo de sistema ---
+#
+# El prompt de sistema se evalúa una sola vez por proceso: el estado del
+# contexto (caché KV) justo después del prefijo se guarda con save_state() y
+# se restaura con load_state() antes de cada llamada.  llama.cpp detecta que
+# los tokens ya evaluados coinciden con el inicio del prompt nuevo y solo
+# evalúa el resto.
+
+_PREFIX_STATES = {}  # prompt de sistema -> (tokens, estado, segundos de evaluación)
+
+
+def _restore_prefix(llm, system_prompt):
+    """Deja el contexto con el prefijo de sistema evaluado.
+
+    Returns:
+        tuple: (tokens del prefijo, segundos de evaluación ahorrados; 0 la
+        primera vez, cuando el prefijo se evalúa y se guarda).
+    """
+    entry = _PREFIX_STATES.get(system_prompt)
+    if entry is None:
+        tokens = [llm.token_bos()] + _tokenize_chat(llm, CHAT_SYSTEM_TEMPLATE.format(system=system_prompt))
+        started = time.perf_counter()
+        llm.reset()
+        llm.eval(tokens)
+        eval_seconds = time.perf_counter() - started
+        _PREFIX_STATES[system_prompt] = (tokens, llm.save_state(), eval_seconds)
+        llm_logger.info(f"Prefijo de sistema evaluado y guardado ({len(tokens)} tokens, {eval_seconds:.2f} s).")
+        return tokens, 0.0
+    tokens, state, eval_seconds = entry
+    started = time.perf_counter()
+    llm.load_state(state)
+    return tokens, max(0.0, eval_seconds - (time.perf_counter() - started))
+
+
+# --- Caché de resultados ---
+#
+# Cada generación se guarda en la tabla llm_cache con una clave que depende
+# del modelo, los parámetros, el prompt de sistema y la entrada.  Volver a
+# mejorar la misma transcripción repite la misma cadena de llamadas
+# (fragmentos y resúmenes), así que se sirve entera desde la caché; si solo
+# cambia el final del texto, los primeros fragmentos también se reutilizan.
+
+def _cache_key(system_prompt, user_content, max_tokens):
+    payload = json.dumps([MODEL_NAME, LLM_CONTEXT_TOKENS, ENRICH_TEMPERATURE, max_tokens, system_prompt, user_content])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def split_into_chunks(text, max_tokens, count):
+    """Divide `text` en fragmentos de hasta max_tokens cortando en fin de frase.
+
+    Una frase que por sí sola supera el límite (p. ej. una transcripción sin
+    puntuación) se corta entre palabras.  `count(texto)` devuelve sus tokens.
+    """
+    pieces = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if not sentence:
+            continue
+        tokens = count(sentence)
+        if tokens <= max_tokens:
+            pieces.append((sentence, tokens))
+            continue
+        current, current_tokens = [], 0
+        for word in sentence.split():
+            word_tokens = count(" " + word)
+            if current and current_tokens + word_tokens > max_tokens:
+                pieces.append((" ".join(current), current_tokens))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append((" ".join(current), current_tokens))
+    chunks, current, current_tokens = [], [], 0
+    for sentence, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _chat(llm, system_prompt, user_content, max_tokens, stats, on_delta=None, cancel_event=None):
+    """Genera con streaming, pasando cada trozo de texto a on_delta.
+
+    Si la misma llamada ya se hizo, devuelve el resultado de la caché.
+    Comprueba cancel_event entre tokens; al cerrar el generador llama.cpp
+    deja de generar.
+    """
+    key = _cache_key(system_prompt, user_content, max_tokens)
+    cached = database.get_llm_cache(key)
+    if cached is not None:
+        stats['cached_calls'] += 1
+        if on_delta:
+            on_delta(cached)
+        return cached
+    prefix, saved = _restore_prefix(llm, system_prompt)
+    prompt = prefix + _tokenize_chat(llm, CHAT_USER_TEMPLATE.format(user=user_content))
+    stats['prompt_eval_saved_seconds'] += saved
+    if saved:
+        llm_logger.info(f"Prefijo de sistema reutilizado: {len(prefix)} tokens, {saved:.2f} s de evaluación ahorrados.")
+    stream = llm.create_completion(prompt=prompt, max_tokens=max_tokens, temperature=ENRICH_TEMPERATURE, stop=CHAT_STOP, stream=True)
+    parts = []
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                raise EnrichmentCancelled()
+            delta = chunk['choices'][0]['text']
+            if delta:
+                parts.append(delta)
+                if on_delta:
+                    on_delta(delta)
+    finally:
+        stream.close()
+    content = "".join(parts).strip()
+    stats['tokens_in'] += len(prompt)
+    stats['tokens_out'] += count_tokens(llm, content)
+    database.put_llm_cache(key, content)
+    return content
+
+
+def enrich_text(text_to_enhance: str, on_delta=None, cancel_event=None):
+    """Mejora una transcripción completa fragmento a fragmento.
+
+    Args:
+        on_delta (callable, opcional): on_delta(texto, fragmento, total) con
+            cada trozo generado del texto final (no de los resúmenes).
+        cancel_event (threading.Event, opcional): si se activa, la generación
+            se detiene y se lanza EnrichmentCancelled.
+
+    Returns:
+        tuple: (texto mejorado, estadísticas) con chunks, tokens_in,
+        tokens_out, seconds, tokens_per_second (de salida), cached_calls
+        (llamadas servidas desde la caché) y prompt_eval_saved_seconds.
+    Raises:
+        EnrichmentCancelled: si se canceló.
+        Exception: si el modelo no carga o falla la generación.
+    """
+    with LLM_LOCK:
+        if cancel_event is not None and cancel_event.is_set():
+            raise EnrichmentCancelled()
+        return _enrich_chunks(_load_model(), text_to_enhance, on_delta, cancel_event)
+
+
+def _enrich_chunks(llm, text_to_enhance, on_delta, cancel_event):
+    overhead = count_tokens(llm, ENRICH_SYSTEM_PROMPT) + SUMMARY_MAX_TOKENS + 64
+    chunk_tokens = min(ENRICH_CHUNK_TOKENS, LLM_CONTEXT_TOKENS - overhead - ENRICH_MAX_OUTPUT_TOKENS)
+    chunks = split_into_chunks(text_to_enhance, chunk_tokens, lambda t: count_tokens(llm, t))
+    stats = {'chunks': len(chunks), 'tokens_in': 0, 'tokens_out': 0, 'cached_calls': 0, 'prompt_eval_saved_seconds': 0.0}
+    started = time.monotonic()
+    enriched, summary = [], ""
+    for i, chunk in enumerate(chunks, 1):
+        context = f"Lo tratado antes en la clase: {summary}\n\n" if summary else ""
+        emit = (lambda delta, i=i: on_delta(delta, i, len(chunks))) if on_delta else None
+        if emit and i > 1:
+            emit("\n\n")
+        enriched.append(_chat(llm, ENRICH_SYSTEM_PROMPT, f"{context}Fragmento {i} de {len(chunks)}:\n{chunk}",
+                              ENRICH_MAX_OUTPUT_TOKENS, stats, emit, cancel_event))
+        if i < len(chunks):
+            summary = _chat(llm, SUMMARY_SYSTEM_PROMPT, f"Resumen anterior: {summary or '(ninguno)'}\n\nNuevo fragmento:\n{chunk}",
+                            SUMMARY_MAX_TOKENS, stats, cancel_event=cancel_event)
+        llm_logger.info(f"Fragmento {i}/{len(chunks)} mejorado.")
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    stats['tokens_per_second'] = round(stats['tokens_out'] / stats['seconds'], 2) if stats['seconds'] else None
+    stats['prompt_eval_saved_seconds'] = round(stats['prompt_eval_saved_seconds'], 2)
+    return "\n\n".join(enriched), stats
+
+
+def enhance_transcription(transcription_id, on_delta=None, cancel_event=None):
+    """Mejora la transcripción `transcription_id` y guarda el resultado con sus métricas.
+
+    Returns:
+        dict: success, enhanced_text y stats (ver enrich_text); si se canceló,
+        cancelled=True; si falla, message.
+    """
+    original_text = database.get_transcription_text(transcription_id)
+    if not original_text:
+        return {"success": False, "message": "Texto de transcripción no encontrado."}
 
-def enrich_text(text_to_enhance: str) -> str:
+    llm_logger.info(f"Iniciando mejora de IA para transcripción ID: {transcription_id}")
     try:
-        llm = _load_model()
-        system_prompt = """Eres un asistente académico experto. Tu tarea es tomar la siguiente transcripción de una clase y enriquecerla. No la resumas. 
-        Tu objetivo es expandir los conceptos clave, añadir contexto histórico o práctico relevante, explicar términos técnicos con analogías claras y, en general, hacer el contenido más detallado y educativo para un estudiante.
-        Corrige posibles errores gramaticales o de transcripción de forma sutil. Responde únicamente con el texto mejorado, en español."""
-        
-        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": text_to_enhance}]
-        response = llm.create_chat_completion(messages=messages, max_tokens=2048)
-        return response['choices'][0]['message']['content']
+        enhanced_text, stats = enrich_text(original_text, on_delta=on_delta, cancel_event=cancel_event)
+        database.save_enhanced_text(transcription_id, enhanced_text, stats).result()
+        llm_logger.info(f"Mejora de IA completada para transcripción ID: {transcription_id} "
+                        f"({stats['chunks']} fragmentos, {stats['tokens_in']} tokens de entrada, {stats['tokens_out']} de salida, {stats['tokens_per_second']} tokens/s)")
+        return {"success": True, "enhanced_text": enhanced_text, "stats": stats}
+    except EnrichmentCancelled:
+        llm_logger.info(f"Mejora de IA cancelada para transcripción ID: {transcription_id}")
+        return {"success": False, "cancelled": True, "message": "Mejora cancelada."}
     except Exception as e:
-        llm_logger.error(f"Error durante el procesamiento del LLM: {e}")
-        return f"Error al procesar el texto con la IA. Detalles técnicos: {e}"
\ No newline at end of file
+        llm_logger.error(f"Error durante la mejora con LLM: {e}")
+        return {"success": False, "message": f"Error del procesador IA: {e}"}
@@ -0,0 +1,248 @@
+# llm_worker.py
+import threading
+import collections
+import multiprocessing
+import queue
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+lw_logger = logging.getLogger(__name__)
+
+# Procesos con el LLM cargado (cada uno con su propia copia del modelo)
+LLM_WORKERS = 1
+# Peticiones que pueden esperar turno; por encima se rechazan en lugar de acumularse
+LLM_QUEUE_MAX = 8
+# Peticiones recientes sobre las que se calculan las latencias
+LATENCY_WINDOW = 100
+
+
+def _worker_main(conn):
+    """Bucle del proceso trabajador: recibe tareas por `conn` y devuelve deltas y resultados.
+
+    Un hilo lee la conexión para poder recibir cancelaciones mientras el
+    hilo principal está generando.
+    """
+    import database
+    import llm_processor
+
+    tasks = queue.Queue()
+    cancel_events = {}
+
+    def listen():
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                msg = ('stop',)
+            if msg[0] == 'task':
+                cancel_events[msg[1]] = threading.Event()
+                tasks.put(msg)
+            elif msg[0] == 'cancel':
+                event = cancel_events.get(msg[1])
+                if event:
+                    event.set()
+            elif msg[0] == 'stop':
+                tasks.put(None)
+                return
+
+    threading.Thread(target=listen, name="llm-listener", daemon=True).start()
+    while True:
+        msg = tasks.get()
+        if msg is None:
+            break
+        _, request_id, text = msg
+        try:
+            enhanced_text, stats = llm_processor.enrich_text(
+                text, on_delta=lambda delta, chunk, chunks: conn.send(('delta', request_id, delta, chunk, chunks)),
+                cancel_event=cancel_events[request_id])
+            result = {"success": True, "enhanced_text": enhanced_text, "stats": stats}
+        except llm_processor.EnrichmentCancelled:
+            result = {"success": False, "cancelled": True, "message": "Mejora cancelada."}
+        except Exception as e:
+            result = {"success": False, "message": f"Error del procesador IA: {e}"}
+        database.flush_writes()
+        cancel_events.pop(request_id, None)
+        conn.send(('done', request_id, result))
+
+
+class _Request:
+    def __init__(self, request_id, text, on_start, on_delta, on_done):
+        self.id = request_id
+        self.text = text
+        self.on_start = on_start
+        self.on_delta = on_delta
+        self.on_done = on_done
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+
+
+class LLMWorkerPool:
+    """Ejecuta la mejora con IA en procesos aparte, fuera de los hilos de Flask.
+
+    Las peticiones esperan en una cola acotada (LLM_QUEUE_MAX); cada proceso
+    toma la siguiente cuando queda libre.  Si un proceso muere se arranca
+    otro; su petición se repite una vez en el nuevo si aún no había enviado
+    texto, y si no se marca como fallida.  Los callbacks se llaman desde
+    hilos del pool: on_start(), on_delta(texto, fragmento, total) y
+    on_done(resultado).  `target` es la función del proceso trabajador.
+    """
+
+    def __init__(self, workers=LLM_WORKERS, queue_max=LLM_QUEUE_MAX, target=_worker_main):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.target = target
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._slots = []
+        self._counters = collections.Counter()
+        self._wait_times = collections.deque(maxlen=LATENCY_WINDOW)
+        self._run_times = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        if self._slots:
+            return
+        for index in range(self.workers):
+            slot = {'index': index, 'process': None, 'conn': None, 'send_lock': threading.Lock(),
+                    'request': None, 'restarts': -1}
+            self._spawn(slot)
+            self._slots.append(slot)
+            threading.Thread(target=self._feeder, args=(slot,), name=f"llm-feeder-{index}", daemon=True).start()
+
+    def _spawn(self, slot):
+        if slot['conn'] is not None:
+            slot['conn'].close()
+            slot['process'].join(timeout=1)
+        ctx = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=self.target, args=(child_conn,), name=f"llm-worker-{slot['index']}", daemon=True)
+        process.start()
+        child_conn.close()
+        slot.update(process=process, conn=parent_conn, restarts=slot['restarts'] + 1)
+        lw_logger.info(f"Proceso LLM {slot['index']} iniciado (pid {process.pid}).")
+
+    def submit(self, request_id, text, on_start=None, on_delta=None, on_done=None):
+        """Encola una petición.
+
+        Returns:
+            dict: success, status ('running', 'queued', 'duplicate' o
+            'rejected'), position (1 = la siguiente) y message.
+        """
+        with self._cond:
+            if request_id in self._active_ids():
+                return {"success": False, "status": "duplicate", "message": "Ya hay una mejora en curso para esta transcripción."}
+            if len(self._pending) >= self.queue_max:
+                self._counters['rejected'] += 1
+                return {"success": False, "status": "rejected", "message": "El procesador IA está saturado; inténtalo en unos minutos."}
+            self._pending.append(_Request(request_id, text, on_start, on_delta, on_done))
+            position = len(self._pending)
+            idle = any(slot['request'] is None for slot in self._slots)
+            self._cond.notify()
+        if idle and position == 1:
+            return {"success": True, "status": "running", "position": 0, "message": "Mejora iniciada."}
+        return {"success": True, "status": "queued", "position": position, "message": f"En cola (posición {position})."}
+
+    def _active_ids(self):
+        return {r.id for r in self._pending} | {slot['request'].id for slot in self._slots if slot['request']}
+
+    def position(self, request_id):
+        with self._cond:
+            for i, r in enumerate(self._pending):
+                if r.id == request_id:
+                    return i + 1
+        return 0
+
+    def cancel(self, request_id):
+        with self._cond:
+            for r in self._pending:
+                if r.id == request_id:
+                    self._pending.remove(r)
+                    self._counters['cancelled'] += 1
+                    break
+            else:
+                r = None
+                slot = next((s for s in self._slots if s['request'] and s['request'].id == request_id), None)
+        if r is not None:
+            if r.on_done:
+                r.on_done({"success": False, "cancelled": True, "message": "Mejora cancelada."})
+            return {"success": True, "message": "Mejora cancelada."}
+        if slot is None:
+            return {"success": False, "message": "No hay una mejora en curso para esta transcripción."}
+        with slot['send_lock']:
+            slot['conn'].send(('cancel', request_id))
+        return {"success": True, "message": "Cancelando la mejora..."}
+
+    def _feeder(self, slot):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                request = self._pending.popleft()
+                slot['request'] = request
+            request.started_at = time.monotonic()
+            self._wait_times.append(request.started_at - request.enqueued_at)
+            if request.on_start:
+                request.on_start()
+            result = self._run(slot, request)
+            self._run_times.append(time.monotonic() - request.started_at)
+            self._counters['completed' if result.get('success') else 'cancelled' if result.get('cancelled') else 'failed'] += 1
+            with self._cond:
+                slot['request'] = None
+            if request.on_done:
+                try:
+                    request.on_done(result)
+                except Exception as e:
+                    lw_logger.error(f"Error al finalizar la petición LLM {request.id}: {e}")
+
+    def _run(self, slot, request):
+        if not slot['process'].is_alive():
+            lw_logger.warning(f"El proceso LLM {slot['index']} terminó mientras estaba libre; se reinicia.")
+            self._spawn(slot)
+        for attempt in (1, 2):
+            relayed = False
+            try:
+                with slot['send_lock']:
+                    slot['conn'].send(('task', request.id, request.text))
+                while True:
+                    msg = slot['conn'].recv()
+                    if msg[0] == 'delta':
+                        relayed = True
+                        if request.on_delta:
+                            request.on_delta(*msg[2:])
+                    elif msg[0] == 'done':
+                        return msg[2]
+            except (EOFError, OSError) as e:
+                lw_logger.error(f"El proceso LLM {slot['index']} terminó inesperadamente ({e}); se reinicia.")
+                self._spawn(slot)
+            # Si no llegó texto al navegador se puede repetir sin duplicarlo; los
+            # fragmentos ya generados se sirven desde la caché del LLM
+            if relayed or attempt == 2:
+                return {"success": False, "message": "El proceso del LLM terminó inesperadamente."}
+            lw_logger.info(f"Se repite la petición LLM {request.id} en el proceso nuevo.")
+
+    def status(self):
+        """Salud de los procesos, ocupación de la cola y latencias recientes (en segundos)."""
+        def summary(values):
+            if not values:
+                return None
+            ordered = sorted(values)
+            return {"avg": round(sum(ordered) / len(ordered), 2), "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 2), "max": round(ordered[-1], 2)}
+        now = time.monotonic()
+        with self._cond:
+            workers = [{
+                "index": slot['index'],
+                "pid": slot['process'].pid,
+                "alive": slot['process'].is_alive(),
+                "restarts": slot['restarts'],
+                "request_id": slot['request'].id if slot['request'] else None,
+                "running_seconds": round(now - slot['request'].started_at, 1) if slot['request'] and slot['request'].started_at else None,
+            } for slot in self._slots]
+            queued = len(self._pending)
+        return {
+            "workers": workers,
+            "queued": queued,
+            "queue_max": self.queue_max,
+            "counters": dict(self._counters),
+            "wait_seconds": summary(self._wait_times),
+            "run_seconds": summary(self._run_times),
+        }
@@ -0,0 +1,180 @@
+# seat_store.py
+import os
+import json
+import time
+import atexit
+import threading
+import collections
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ss_logger = logging.getLogger(__name__)
+
+SEATS_FILE = os.path.join('data', 'seats.json')
+SEAT_ASSIGNMENTS_FILE = os.path.join('data', 'seat_assignments.json')
+# Tras la última edición se espera este tiempo antes de escribir a disco, de
+# modo que una ráfaga de cambios (dibujar varias cajas seguidas) se guarda una vez
+SEAT_SAVE_DEBOUNCE_SECONDS = 0.5
+# Cada cuánto se comprueba si los archivos cambiaron desde fuera
+# (p. ej. calibrate_seats.py o una edición manual)
+SEAT_WATCH_SECONDS = 1.0
+
+# Distribución publicada: no se modifica nunca; cada cambio publica otra con
+# version + 1.  boxes es una tupla de dicts {seat_id, rect, normalized} y
+# assignments un dict seat_id -> student_id.
+SeatLayout = collections.namedtuple('SeatLayout', 'version boxes assignments')
+
+
+def _read_json(path, default, expected_type):
+    """Contenido del archivo, `default` si no existe o None si no se pudo leer."""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, expected_type):
+            return data
+        ss_logger.warning(f"{path} no tiene el formato esperado.")
+    except Exception as e:
+        ss_logger.warning(f"No se pudo cargar {path}: {e}")
+    return None
+
+
+def write_json_atomic(path, data):
+    """Escribe en un temporal del mismo directorio y lo renombra: nunca queda un archivo a medias."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+class SeatLayoutStore:
+    """Distribución de asientos en memoria con versión, guardado diferido y recarga en caliente.
+
+    Los lectores (los streams de pose y calibración, la API) toman
+    current() en cada uso y comparan la versión para saber si cambió.  Las
+    ediciones pasan por update(), que publica una distribución nueva y
+    programa la escritura atómica de ambos archivos.  Un hilo en segundo
+    plano hace esas escrituras y detecta los cambios hechos desde fuera.
+    """
+
+    def __init__(self, seats_file=SEATS_FILE, assignments_file=SEAT_ASSIGNMENTS_FILE):
+        self.seats_file = seats_file
+        self.assignments_file = assignments_file
+        self._layout = None
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._save_due = None
+        self._signatures = None
+        self._thread = None
+
+    def start(self):
+        """Carga la distribución y arranca el hilo de guardado y vigilancia."""
+        self.current()
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._worker, name="seat-store", daemon=True)
+            self._thread.start()
+
+    def current(self):
+        layout = self._layout
+        if layout is None:
+            with self._lock:
+                if self._layout is None:
+                    self._load()
+                layout = self._layout
+        return layout
+
+    def reload(self):
+        """Vuelve a leer los archivos (descarta ediciones aún no guardadas)."""
+        with self._lock:
+            self._save_due = None
+            self._load()
+            return self._layout
+
+    def _load(self):
+        # Un archivo ilegible (p. ej. a medio escribir por otro programa)
+        # conserva lo que ya había; se vuelve a leer cuando cambie otra vez
+        boxes = _read_json(self.seats_file, [], list)
+        assignments = _read_json(self.assignments_file, {}, dict)
+        if boxes is None:
+            boxes = list(self._layout.boxes) if self._layout else []
+        if assignments is None:
+            assignments = dict(self._layout.assignments) if self._layout else {}
+        self._signatures = (_file_signature(self.seats_file), _file_signature(self.assignments_file))
+        self._publish(boxes, assignments)
+
+    def _publish(self, boxes, assignments):
+        version = self._layout.version + 1 if self._layout else 1
+        self._layout = SeatLayout(version, tuple(boxes), assignments)
+
+    def update(self, change):
+        """Aplica change(boxes, assignments) sobre copias y publica el resultado.
+
+        change recibe una lista de dicts de asiento (copias, se pueden
+        modificar) y el dict de asignaciones, y devuelve lo que debe devolver
+        update().  Si change devuelve None o False no se publica nada.
+        """
+        with self._lock:
+            layout = self.current()
+            boxes = [dict(seat) for seat in layout.boxes]
+            assignments = dict(layout.assignments)
+            result = change(boxes, assignments)
+            if result is None or result is False:
+                return result
+            self._publish(boxes, assignments)
+            self._save_due = time.monotonic() + SEAT_SAVE_DEBOUNCE_SECONDS
+            self._cond.notify()
+            return result
+
+    def flush(self):
+        """Escribe ya las ediciones pendientes."""
+        with self._lock:
+            if self._save_due is not None:
+                self._save()
+
+    def _save(self):
+        layout = self._layout
+        self._save_due = None
+        try:
+            write_json_atomic(self.seats_file, list(layout.boxes))
+            write_json_atomic(self.assignments_file, layout.assignments)
+            self._signatures = (_file_signature(self.seats_file), _file_signature(self.assignments_file))
+            ss_logger.info(f"Distribución de asientos guardada (versión {layout.version}, {len(layout.boxes)} asientos).")
+        except Exception as e:
+            ss_logger.warning(f"No se pudo guardar la distribución de asientos: {e}")
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                timeout = SEAT_WATCH_SECONDS
+                if self._save_due is not None:
+                    timeout = max(0.0, min(timeout, self._save_due - time.monotonic()))
+                self._cond.wait(timeout)
+                if self._save_due is not None and time.monotonic() >= self._save_due:
+                    self._save()
+                signatures = (_file_signature(self.seats_file), _file_signature(self.assignments_file))
+                if signatures != self._signatures:
+                    if self._save_due is not None:
+                        # Hay ediciones sin guardar: prevalecen sobre el cambio externo
+                        ss_logger.warning("Los archivos de asientos cambiaron desde fuera con ediciones pendientes; se sobrescribirán.")
+                        self._signatures = signatures
+                    else:
+                        self._load()
+                        ss_logger.info(f"Distribución de asientos recargada desde disco (versión {self._layout.version}).")
+
+
+SEAT_STORE = SeatLayoutStore()
+atexit.register(SEAT_STORE.flush)
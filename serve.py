@@ -0,0 +1,48 @@
+"""Servidor de producción de AI-Classroom.
+
+Sirve la aplicación con el servidor WSGI de gevent: cada conexión (páginas,
+API, SocketIO y espectadores de los streams de vídeo) es un greenlet, así
+que los navegadores con un stream abierto no ocupan un hilo cada uno.  La
+cámara de cada stream la lee un único hilo y el trabajo bloqueante de las
+peticiones (cámara, reconocimiento facial, grupos) se ejecuta en un grupo
+de hilos (ver streaming.py).
+
+Uso:
+    python serve.py                          # gevent en 0.0.0.0:5000
+    python serve.py --port 8000
+    python serve.py --mode threading         # servidor de desarrollo (= python app.py)
+
+Requiere el paquete gevent; si no está instalado se usa el modo threading.
+"""
+
+import argparse
+import logging
+
+import streaming
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+sv_logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de producción de AI-Classroom.")
+    parser.add_argument('--mode', choices=streaming.SERVER_MODES, default='gevent', help='Modelo de servicio.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    try:
+        streaming.configure(args.mode)
+    except ImportError:
+        sv_logger.warning("gevent no está instalado; se usa el servidor threading de desarrollo.")
+        streaming.configure('threading')
+
+    # app.py crea SocketIO con streaming.SERVER_MODE al importarse
+    import app
+    app.socketio.run(app.app, debug=False, host=args.host, port=args.port, allow_unsafe_werkzeug=True)
+
+
+# Los procesos hijos creados con 'spawn' vuelven a importar este módulo como
+# __mp_main__: no deben arrancar otro servidor.
+if __name__ == '__main__':
+    main()
@@ -12,17 +12,31 @@ document.addEventListener('DOMContentLoaded', function () {
 
     const cardsContainer = document.getElementById('assignCards');
 
+    // Recorre todas las páginas de /api/students_list siguiendo next_cursor
+    async function fetchAllStudents() {
+        const students = [];
+        let cursor = null;
+        do {
+            const params = new URLSearchParams({ fields: 'id,nombre,apellido', limit: '500' });
+            if (cursor) params.set('cursor', cursor);
+            const res = await fetch(`/api/students_list?${params}`);
+            const page = await res.json();
+            students.push(...(page.students || []));
+            cursor = page.next_cursor;
+        } while (cursor);
+        return students;
+    }
+
     // Cargar todos los datos necesarios y construir las tarjetas de asientos
     async function loadAssignTable() {
         try {
-            const [seatBoxesRes, assignmentsRes, studentsRes] = await Promise.all([
+            const [seatBoxesRes, assignmentsRes, students] = await Promise.all([
                 fetch('/api/seat_boxes'),
                 fetch('/api/seat_assignments'),
-                fetch('/api/students_list')
+                fetchAllStudents()
             ]);
             const seatBoxes = await seatBoxesRes.json();
             const seatAssignments = await assignmentsRes.json();
-            const students = await studentsRes.json();
 
             // Construir mapa de estudiantes
             const studentMap = {};
@@ -65,55 +65,54 @@ document.addEventListener('DOMContentLoaded', function () {
         }).catch(err => console.error("Error cargando resumen de participación:", err));
     }
 
-    function loadStudentList() {
-        fetch(`/api/students_list?t=${Date.now()}`, {
-            headers: { 'Accept': 'application/json' },
-            cache: 'no-store'
-        })
+    // Paginación por cursor: cada listado guarda el cursor de la página siguiente
+    // y muestra una fila "Cargar más" mientras el servidor devuelva next_cursor.
+    let studentCursor = null;
+    let transcriptionCursor = null;
+
+    function loadMoreRow(colspan, id) {
+        return `<tr class="load-more-row"><td colspan="${colspan}" class="text-center"><button id="${id}" class="btn btn-sm btn-outline-secondary">Cargar más</button></td></tr>`;
+    }
+
+    function loadStudentList(append = false) {
+        const params = new URLSearchParams({ fields: 'id,nombre,apellido,registro_fecha', limit: '50' });
+        if (append && studentCursor) params.set('cursor', studentCursor);
+        fetch(`/api/students_list?${params}`, { headers: { 'Accept': 'application/json' } })
         .then(res => {
             if (!res.ok) throw new Error(`HTTP ${res.status}`);
             return res.json();
         })
         .then(payload => {
-            // Soporta: [..] o {students:[..]}
-            const list =
-                (Array.isArray(payload) && payload) ||
-                (Array.isArray(payload.students) && payload.students) ||
-                (Array.isArray(payload.data) && payload.data) ||
-                (Array.isArray(payload.results) && payload.results) ||
-                [];
-                console.log('students_list payload keys:', Object.keys(payload || {}), 'count:', list.length);
+            const list = payload.students || [];
+            studentCursor = payload.next_cursor;
             const tbody = document.querySelector('#studentListTable tbody');
 
-            // Normaliza campos frecuentes
-            const norm = s => {
-                const id = s.id ?? s.student_id ?? s.uid ?? s._id ?? '';
-                const nombre = s.nombre ?? s.first_name ?? s.name ?? s.nombres ?? '';
-                const apellido = s.apellido ?? s.last_name ?? s.surname ?? s.apellidos ?? '';
-                const full = (s.nombre_completo ?? `${nombre} ${apellido}`)?.trim() || (s.full_name ?? '');
-                const rawDate = s.registro_fecha ?? s.fecha_registro ?? s.created_at ?? s.createdAt ?? s.registro ?? s.created ?? null;
-                const dateStr = rawDate
-                    ? (isNaN(Date.parse(rawDate)) ? String(rawDate) : new Date(rawDate).toLocaleString())
-                    : '-';
-                return { id, full, dateStr };
-            };
-
             const rows = list.map(s => {
-                const n = norm(s);
+                const full = `${s.nombre || ''} ${s.apellido || ''}`.trim();
+                const dateStr = s.registro_fecha
+                    ? (isNaN(Date.parse(s.registro_fecha)) ? String(s.registro_fecha) : new Date(s.registro_fecha).toLocaleString())
+                    : '-';
                 return `
                     <tr>
-                        <td>${n.id}</td>
-                        <td><a href="/student/${n.id}" class="text-info text-decoration-none">${n.full}</a></td>
-                        <td>${n.dateStr}</td>
-                        <td><button class="btn btn-sm btn-outline-danger del-btn" data-id="${n.id}"><i class="fas fa-trash"></i></button></td>
+                        <td>${s.id}</td>
+                        <td><a href="/student/${s.id}" class="text-info text-decoration-none">${full}</a></td>
+                        <td>${dateStr}</td>
+                        <td><button class="btn btn-sm btn-outline-danger del-btn" data-id="${s.id}"><i class="fas fa-trash"></i></button></td>
                     </tr>`;
             });
 
-            tbody.innerHTML = rows.length
-                ? rows.join('')
-                : `<tr><td colspan="4" class="text-center text-muted">
-                      No hay estudiantes. <small class="d-block text-muted">payload keys: ${Object.keys(payload).join(', ') || 'array vacío'}</small>
-                   </td></tr>`;
+            tbody.querySelectorAll('.load-more-row').forEach(r => r.remove());
+            if (append) {
+                tbody.insertAdjacentHTML('beforeend', rows.join(''));
+            } else {
+                tbody.innerHTML = rows.length
+                    ? rows.join('')
+                    : '<tr><td colspan="4" class="text-center text-muted">No hay estudiantes.</td></tr>';
+            }
+            if (studentCursor) {
+                tbody.insertAdjacentHTML('beforeend', loadMoreRow(4, 'moreStudentsBtn'));
+                document.getElementById('moreStudentsBtn').addEventListener('click', () => loadStudentList(true));
+            }
             attachStudentDeleteEvents();
         })
         .catch(err => {
@@ -123,24 +122,135 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
-    function loadTranscriptions() {
-        fetch('/api/transcriptions').then(res => res.json()).then(data => {
+    function loadTranscriptions(append = false) {
+        // Solo el resumen: los textos completos se piden bajo demanda por id.
+        const params = new URLSearchParams({ limit: '20' });
+        if (append && transcriptionCursor) params.set('cursor', transcriptionCursor);
+        fetch(`/api/transcriptions?${params}`).then(res => res.json()).then(payload => {
+            const data = payload.transcriptions || [];
+            transcriptionCursor = payload.next_cursor;
             const tbody = document.querySelector('#transcriptionsTable tbody');
-            tbody.innerHTML = data.length ? data.map(t => {
+            const rows = data.map(t => {
                 const textLink = t.text_file_path ? `<a href="${t.text_file_path}" target="_blank" class="btn btn-sm btn-outline-warning m-1"><i class="fas fa-file-alt me-1"></i>Ver Texto</a>` : '';
-                const audioLink = t.file_path ? `<a href="${t.file_path}" download class="btn btn-sm btn-outline-info m-1"><i class="fas fa-download me-1"></i>Audio</a>` : '';
-                const enhanceBtn = t.enhanced_text 
-                    ? `<button class="btn btn-sm btn-success m-1 view-enhanced-btn" data-text="${escape(t.enhanced_text)}"><i class="fas fa-check"></i> Ver Mejora</button>`
+                const audioLink = t.file_path ? `<a href="${t.file_path}?inline=1" target="_blank" class="btn btn-sm btn-outline-info m-1"><i class="fas fa-play me-1"></i>Escuchar</a><a href="${t.file_path}" download class="btn btn-sm btn-outline-info m-1"><i class="fas fa-download"></i></a>` : '';
+                const enhanceBtn = t.has_enhanced
+                    ? `<button class="btn btn-sm btn-success m-1 view-enhanced-btn" data-id="${t.id}"><i class="fas fa-check"></i> Ver Mejora</button>`
                     : `<button class="btn btn-sm btn-outline-primary m-1 enhance-btn" data-id="${t.id}"><i class="fas fa-magic"></i> Mejorar con IA</button>`;
                 const deleteBtn = `<button class="btn btn-sm btn-outline-danger m-1 del-trans-btn" data-id="${t.id}"><i class="fas fa-trash"></i></button>`;
-                return `<tr><td>${t.class_name}</td><td>${new Date(t.start_timestamp).toLocaleString()}</td><td>${Math.round(t.duration_seconds)}s</td><td class="action-buttons">${textLink}${audioLink}${enhanceBtn}${deleteBtn}</td></tr>`;
-            }).join('') : '<tr><td colspan="4" class="text-center text-muted">No hay grabaciones.</td></tr>';
+                return `<tr><td>${t.class_name}</td><td>${new Date(t.start_timestamp).toLocaleString()}</td><td>${Math.round(t.duration_seconds)}s${t.skipped_seconds ? ` <small title="Silencio omitido al transcribir">(${Math.round(t.skipped_seconds)}s sin voz)</small>` : ''}</td><td class="action-buttons">${textLink}${audioLink}${enhanceBtn}${deleteBtn}</td></tr>`;
+            });
+            tbody.querySelectorAll('.load-more-row').forEach(r => r.remove());
+            if (append) {
+                tbody.insertAdjacentHTML('beforeend', rows.join(''));
+            } else {
+                tbody.innerHTML = rows.length ? rows.join('') : '<tr><td colspan="4" class="text-center text-muted">No hay grabaciones.</td></tr>';
+            }
+            if (transcriptionCursor) {
+                tbody.insertAdjacentHTML('beforeend', loadMoreRow(4, 'moreTranscriptionsBtn'));
+                document.getElementById('moreTranscriptionsBtn').addEventListener('click', () => loadTranscriptions(true));
+            }
             attachTranscriptionEvents();
         }).catch(err => console.error("Error cargando transcripciones:", err));
     }
 
+    // Mejora con IA: el texto llega por SocketIO mientras se genera
+    const socket = io();
+    const enhancedTextBody = document.getElementById('enhancedTextBody');
+    const enhanceProgress = document.getElementById('enhanceProgress');
+    const cancelEnhanceBtn = document.getElementById('cancelEnhanceBtn');
+    let streamingEnhancementId = null;
+
+    socket.on('enhance_started', data => {
+        if (data.id === streamingEnhancementId) enhanceProgress.textContent = 'Generando...';
+    });
+
+    socket.on('enhance_progress', data => {
+        if (data.id !== streamingEnhancementId) return;
+        enhancedTextBody.innerText += data.delta;
+        enhanceProgress.textContent = `Fragmento ${data.chunk} de ${data.chunks}`;
+    });
+
+    socket.on('enhance_done', data => {
+        if (data.id === streamingEnhancementId) {
+            cancelEnhanceBtn.classList.add('d-none');
+            enhanceProgress.textContent = data.success
+                ? `${data.stats.chunks} fragmentos · ${data.stats.tokens_per_second ?? "-"} tokens/s · ${data.stats.cached_calls} desde caché · ${data.stats.prompt_eval_saved_seconds} s de prompt ahorrados`
+                : data.message;
+            streamingEnhancementId = null;
+        }
+        if (data.success) showToast('Transcripción mejorada con éxito.', 'success');
+        else showToast(data.cancelled ? data.message : `Error: ${data.message}`, data.cancelled ? 'warning' : 'danger');
+        loadTranscriptions();
+    });
+
+    cancelEnhanceBtn.addEventListener('click', () => {
+        if (streamingEnhancementId === null) return;
+        cancelEnhanceBtn.disabled = true;
+        fetch(`/api/enhance_transcription/${streamingEnhancementId}/cancel`, { method: 'POST' })
+            .then(res => res.json()).then(data => showToast(data.message, data.success ? 'info' : 'danger'))
+            .finally(() => { cancelEnhanceBtn.disabled = false; });
+    });
+
+    // Búsqueda de texto completo: cada resultado enlaza al instante del audio
+    const transcriptSearch = document.getElementById('transcriptSearch');
+    const transcriptSearchResults = document.getElementById('transcriptSearchResults');
+    let transcriptSearchTimer = null;
+
+    function formatSeconds(s) {
+        const m = Math.floor(s / 60);
+        return `${m}:${String(Math.floor(s % 60)).padStart(2, '0')}`;
+    }
+
+    function searchTranscripts() {
+        const q = transcriptSearch.value.trim();
+        if (!q) {
+            transcriptSearchResults.classList.add('hidden');
+            transcriptSearchResults.innerHTML = '';
+            return;
+        }
+        fetch(`/api/search?${new URLSearchParams({ q, limit: '10' })}`).then(res => res.json()).then(payload => {
+            const results = payload.results || [];
+            transcriptSearchResults.innerHTML = results.length ? results.map(r => {
+                const segments = r.segments.map(seg => seg.audio_url
+                    ? `<li><a href="${seg.audio_url}" target="_blank" class="text-blue-600">${formatSeconds(seg.start_seconds)}</a> ${seg.text}</li>`
+                    : `<li>${formatSeconds(seg.start_seconds)} ${seg.text}</li>`).join('');
+                return `<div class="border-b py-2"><div class="font-semibold">${r.class_name} <span class="font-normal text-gray-500">${new Date(r.start_timestamp).toLocaleString()}</span></div>`
+                    + `<div class="text-gray-700">${r.snippet}</div>${segments ? `<ul class="mt-1 ms-3">${segments}</ul>` : ''}</div>`;
+            }).join('') : '<div class="text-muted">Sin resultados.</div>';
+            transcriptSearchResults.classList.remove('hidden');
+        }).catch(err => console.error("Error en la búsqueda:", err));
+    }
+
+    if (transcriptSearch) {
+        transcriptSearch.addEventListener('input', () => {
+            clearTimeout(transcriptSearchTimer);
+            transcriptSearchTimer = setTimeout(searchTranscripts, 300);
+        });
+    }
+
+    const questionnaireCsvInput = document.getElementById('questionnaireCsvInput');
+    if (questionnaireCsvInput) {
+        questionnaireCsvInput.addEventListener('change', () => {
+            const file = questionnaireCsvInput.files[0];
+            if (!file) return;
+            const body = new FormData();
+            body.append('file', file);
+            fetch('/api/questionnaires/import', { method: 'POST', body })
+            .then(res => res.json())
+            .then(data => {
+                let message = data.message;
+                if (data.unknown_students && data.unknown_students.length) message += ` ${data.unknown_students.length} IDs no registrados: ${data.unknown_students.slice(0, 5).join(', ')}${data.unknown_students.length > 5 ? '…' : ''}.`;
+                if (data.errors && data.errors.length) message += ` ${data.errors.length} avisos: ${data.errors[0]}`;
+                showToast(message, data.success ? (data.errors.length || data.unknown_students.length ? 'warning' : 'success') : 'danger');
+            })
+            .catch(() => showToast('Error de conexión al importar los cuestionarios.', 'danger'))
+            .finally(() => { questionnaireCsvInput.value = ''; });
+        });
+    }
+
     function attachStudentDeleteEvents() {
-        document.querySelectorAll('.del-btn').forEach(btn => {
+        document.querySelectorAll('.del-btn:not([data-bound])').forEach(btn => {
+            btn.dataset.bound = '1';
             btn.addEventListener('click', function() {
                 const studentId = this.dataset.id;
                 if (confirm(`¿Eliminar al estudiante ${studentId}? Esta acción no se puede deshacer.`)) {
@@ -154,7 +264,8 @@ document.addEventListener('DOMContentLoaded', function () {
     }
     
     function attachTranscriptionEvents() {
-        document.querySelectorAll('.del-trans-btn').forEach(btn => {
+        document.querySelectorAll('.del-trans-btn:not([data-bound])').forEach(btn => {
+            btn.dataset.bound = '1';
             btn.addEventListener('click', function() {
                 const transcriptionId = this.dataset.id;
                 if (confirm(`¿Eliminar esta transcripción y sus archivos de audio/texto?`)) {
@@ -166,16 +277,20 @@ document.addEventListener('DOMContentLoaded', function () {
             });
         });
         
-        document.querySelectorAll('.enhance-btn').forEach(btn => {
+        document.querySelectorAll('.enhance-btn:not([data-bound])').forEach(btn => {
+            btn.dataset.bound = '1';
             btn.addEventListener('click', async function() {
-                const transcriptionId = this.dataset.id;
+                const transcriptionId = Number(this.dataset.id);
                 this.innerHTML = `<span class="spinner-border spinner-border-sm"></span> Procesando...`;
                 this.disabled = true;
                 const response = await fetch(`/api/enhance_transcription/${transcriptionId}`, { method: 'POST' });
                 const data = await response.json();
                 if (data.success) {
-                    showToast('Transcripción mejorada con éxito.', 'success');
-                    loadTranscriptions();
+                    streamingEnhancementId = transcriptionId;
+                    enhancedTextBody.innerText = '';
+                    enhanceProgress.textContent = data.status === 'queued' ? `En cola (posición ${data.position})` : 'Generando...';
+                    cancelEnhanceBtn.classList.remove('d-none');
+                    enhancedTextModal.show();
                 } else {
                     showToast(`Error: ${data.message}`, 'danger');
                     this.innerHTML = `<i class="fas fa-magic"></i> Mejorar con IA`;
@@ -184,10 +299,16 @@ document.addEventListener('DOMContentLoaded', function () {
             });
         });
 
-        document.querySelectorAll('.view-enhanced-btn').forEach(btn => {
-            btn.addEventListener('click', function() {
-                const text = unescape(this.dataset.text);
-                document.getElementById('enhancedTextBody').innerText = text;
+        document.querySelectorAll('.view-enhanced-btn:not([data-bound])').forEach(btn => {
+            btn.dataset.bound = '1';
+            btn.addEventListener('click', async function() {
+                const res = await fetch(`/api/transcriptions/${this.dataset.id}?fields=enhanced_text`);
+                if (!res.ok) { showToast('No se pudo cargar el texto mejorado.', 'danger'); return; }
+                const data = await res.json();
+                streamingEnhancementId = null;
+                enhanceProgress.textContent = '';
+                cancelEnhanceBtn.classList.add('d-none');
+                enhancedTextBody.innerText = data.enhanced_text || '';
                 enhancedTextModal.show();
             });
         });
@@ -210,9 +331,9 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
-    async function handleMonitorAction(url, actionName, videoSrc = null, modalTitle = "Monitoreo en Vivo") {
+    async function handleMonitorAction(url, actionName, videoSrc = null, modalTitle = "Monitoreo en Vivo", fetchOptions = {}) {
         try {
-            const response = await fetch(url, { method: 'POST' });
+            const response = await fetch(url, { method: 'POST', ...fetchOptions });
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
             const data = await response.json();
 
@@ -252,7 +373,10 @@ document.addEventListener('DOMContentLoaded', function () {
 
     document.getElementById('startRecordingBtn').addEventListener('click', async () => {
         setRecordingUI(true); // feedback inmediato
-        await handleMonitorAction('/start_manual_recording', 'iniciar grabación');
+        // El modelo se elige al iniciar: la transcripción avanza mientras se graba
+        const formData = new FormData();
+        formData.append('model_size', document.getElementById('whisperModelSelect').value);
+        await handleMonitorAction('/start_manual_recording', 'iniciar grabación', null, undefined, { body: formData });
     });
     document.getElementById('stopRecordingBtn').addEventListener('click', async () => {
         const btn = document.getElementById('stopRecordingBtn');
@@ -267,8 +391,8 @@ document.addEventListener('DOMContentLoaded', function () {
         try {
             const data = await fetch('/stop_manual_recording', { method: 'POST', body: formData }).then(res => res.json());
             showToast(data.message, data.success ? 'success' : 'warning');
-            if (data.success) {
-                loadTranscriptions();
+            if (data.success && data.job_id) {
+                watchTranscriptionJob(data.job_id);
             }
         } catch (error) {
             showToast('Error de conexión al detener la grabación.', 'danger');
@@ -278,6 +402,30 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
+    // La transcripción corre en segundo plano: se consulta su estado hasta que termina
+    function watchTranscriptionJob(jobId) {
+        const statusEl = document.getElementById('transcriptionJobStatus');
+        const poll = async () => {
+            try {
+                const job = await fetch(`/api/transcription_jobs/${jobId}`).then(res => res.json());
+                if (job.status === 'queued') {
+                    if (statusEl) statusEl.textContent = `En cola (posición ${job.position || '-'})`;
+                } else if (job.status === 'running') {
+                    if (statusEl) statusEl.textContent = `Transcribiendo ${Math.round((job.progress || 0) * 100)}%`;
+                } else {
+                    if (statusEl) statusEl.textContent = '';
+                    showToast(job.message || 'Transcripción finalizada.', job.status === 'done' ? 'success' : 'danger');
+                    if (job.status === 'done') loadTranscriptions();
+                    return;
+                }
+            } catch (err) {
+                console.error('Error consultando trabajo de transcripción:', err);
+            }
+            setTimeout(poll, 2000);
+        };
+        poll();
+    }
+
     function loadAllData() {
         loadAttendanceSummary();
         loadParticipationSummary();
@@ -285,6 +433,10 @@ document.addEventListener('DOMContentLoaded', function () {
         loadTranscriptions();
     }
     loadAllData();
+    // Retomar el seguimiento de transcripciones que sigan en curso
+    fetch('/api/transcription_jobs?limit=5').then(res => res.json()).then(jobs => {
+        jobs.filter(j => j.status === 'queued' || j.status === 'running').forEach(j => watchTranscriptionJob(j.id));
+    }).catch(() => {});
     // refresco breve tras altas recientes
     setTimeout(loadStudentList, 2000);
     setTimeout(loadStudentList, 5000);
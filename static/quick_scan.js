@@ -6,14 +6,26 @@ document.addEventListener('DOMContentLoaded', function () {
 let mediaStream = null;
 const videoEl = document.getElementById('cameraPreview');
 
+// Ráfaga que se envía en una sola petición a /api/quick_scan_frames
+const BURST_FRAMES = 4;
+const BURST_INTERVAL_MS = 150;
+const BURST_MAX_WIDTH = 1280;
+
+// Devuelve true si la cámara del navegador quedó lista (requiere https o localhost)
 async function startCamera() {
+    if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) return false;
     try {
         mediaStream = await navigator.mediaDevices.getUserMedia({ video: { facingMode: "user" }, audio: false });
         videoEl.srcObject = mediaStream;
         videoEl.style.display = 'block';
+        if (!videoEl.videoWidth) {
+            await new Promise(resolve => videoEl.addEventListener('loadedmetadata', resolve, { once: true }));
+        }
+        return true;
     } catch (e) {
         console.error(e);
-        showToast('No se pudo acceder a la cámara del navegador.', 'danger');
+        stopCamera();
+        return false;
     }
 }
 
@@ -28,14 +40,33 @@ function stopCamera() {
     }
 }
 
-function snapshotAsBase64() {
-    if (!videoEl || !videoEl.videoWidth) return null;
+// Frame actual de la cámara como JPEG binario (sin pasar por base64)
+function snapshotAsBlob() {
+    if (!videoEl || !videoEl.videoWidth) return Promise.resolve(null);
+    const scale = Math.min(1, BURST_MAX_WIDTH / videoEl.videoWidth);
     const canvas = document.createElement('canvas');
-    canvas.width = videoEl.videoWidth;
-    canvas.height = videoEl.videoHeight;
-    const c = canvas.getContext('2d');
-    c.drawImage(videoEl, 0, 0);
-    return canvas.toDataURL('image/jpeg', 0.9);
+    canvas.width = Math.round(videoEl.videoWidth * scale);
+    canvas.height = Math.round(videoEl.videoHeight * scale);
+    canvas.getContext('2d').drawImage(videoEl, 0, 0, canvas.width, canvas.height);
+    return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.85));
+}
+
+// Captura una ráfaga con la cámara del navegador y la identifica en una sola
+// petición.  Devuelve null si no hay cámara en el navegador.
+async function scanWithBrowserCamera() {
+    if (!(await startCamera())) return null;
+    const form = new FormData();
+    try {
+        for (let i = 0; i < BURST_FRAMES; i++) {
+            if (i) await new Promise(resolve => setTimeout(resolve, BURST_INTERVAL_MS));
+            const blob = await snapshotAsBlob();
+            if (blob) form.append('frames', blob, `frame${i}.jpg`);
+        }
+    } finally {
+        stopCamera();
+    }
+    const res = await fetch('/api/quick_scan_frames', { method: 'POST', body: form });
+    return res.json();
 }
 
     const toastElement = document.getElementById('action-toast');
@@ -62,11 +93,25 @@ function snapshotAsBase64() {
     let recognizedStudentId = null;
     let studentsMap = {};
 
+    // Recorre todas las páginas de /api/students_list siguiendo next_cursor
+    async function fetchAllStudents() {
+        const students = [];
+        let cursor = null;
+        do {
+            const params = new URLSearchParams({ fields: 'id,nombre,apellido', limit: '500' });
+            if (cursor) params.set('cursor', cursor);
+            const res = await fetch(`/api/students_list?${params}`);
+            const page = await res.json();
+            students.push(...(page.students || []));
+            cursor = page.next_cursor;
+        } while (cursor);
+        return students;
+    }
+
     // Cargar lista de estudiantes para selección manual
     async function loadStudents() {
         try {
-            const res = await fetch('/api/students_list');
-            const students = await res.json();
+            const students = await fetchAllStudents();
             studentsMap = {};
             manualSelect.innerHTML = '<option value="">Seleccione un estudiante</option>';
             students.forEach(s => {
@@ -102,8 +147,12 @@ function snapshotAsBase64() {
         scanMessage.innerHTML = '<div class="text-info"><span class="spinner-border spinner-border-sm"></span> Escaneando... Por favor, mire a la cámara.</div>';
 
         try {
-            const res = await fetch('/api/quick_scan', { method: 'POST' });
-            const data = await res.json();
+            // Cámara del navegador si está disponible; si no, la del servidor
+            let data = await scanWithBrowserCamera();
+            if (!data) {
+                const res = await fetch('/api/quick_scan', { method: 'POST' });
+                data = await res.json();
+            }
             scanMessage.innerHTML = '';
             scanResult.classList.remove('d-none');
             if (data.success) {
@@ -0,0 +1,168 @@
+# streaming.py
+import threading
+import functools
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+st_logger = logging.getLogger(__name__)
+
+# --- Modo de servicio y difusión de los streams MJPEG ---
+#
+# 'threading': servidor de desarrollo de Werkzeug, un hilo del sistema por
+#   conexión (python app.py).
+# 'gevent': servidor WSGI de gevent; cada conexión (peticiones, SocketIO y
+#   espectadores de los streams) es un greenlet del bucle de eventos del hilo
+#   principal (python serve.py).  No se parchea la biblioteca estándar: los
+#   servicios en segundo plano (escritor de la base de datos, trabajos de
+#   transcripción, grabación, LLM) siguen en hilos del sistema.  Por eso el
+#   trabajo bloqueante de una petición pasa por run_blocking() y las llamadas
+#   desde esos hilos al bucle (socketio.emit) por threadsafe().
+#
+# En los dos modos la cámara de cada stream la lee un único hilo productor
+# (FrameBroadcaster); los espectadores solo reciben su último frame.
+SERVER_MODES = ('threading', 'gevent')
+SERVER_MODE = 'threading'
+# Hilos del sistema para el trabajo bloqueante de las peticiones en modo gevent
+BLOCKING_POOL_SIZE = 8
+# Cada cuánto mira un espectador si el productor publicó un frame nuevo
+STREAM_POLL_SECONDS = 0.02
+
+_hub = None
+_hub_thread = None
+
+
+def configure(mode):
+    """Fija el modo de servicio.  Debe llamarse antes de importar app.py y desde el hilo que servirá."""
+    global SERVER_MODE, _hub, _hub_thread
+    if mode not in SERVER_MODES:
+        raise ValueError(f"Modo de servidor desconocido: {mode}")
+    if mode == 'gevent':
+        import gevent
+        _hub = gevent.get_hub()
+        _hub.threadpool.maxsize = BLOCKING_POOL_SIZE
+        _hub_thread = threading.get_ident()
+    else:
+        _hub = _hub_thread = None
+    SERVER_MODE = mode
+    st_logger.info(f"Modo de servidor: {mode}.")
+
+
+def _in_event_loop():
+    return _hub is not None and threading.get_ident() == _hub_thread
+
+
+def sleep(seconds):
+    """Espera sin bloquear el bucle de eventos si se llama desde él."""
+    if _in_event_loop():
+        import gevent
+        gevent.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Ejecuta fn(*args, **kwargs) fuera del bucle de eventos y devuelve su resultado.
+
+    Para cámara, reconocimiento facial, cálculo con NumPy o esperas a la
+    base de datos dentro de una petición.  Fuera del bucle (modo threading,
+    hilos en segundo plano) se llama directamente.
+    """
+    if not _in_event_loop():
+        return fn(*args, **kwargs)
+    return _hub.threadpool.apply(fn, args, kwargs)
+
+
+def threadsafe(fn):
+    """Devuelve una versión de fn que se puede llamar desde cualquier hilo.
+
+    En modo gevent las llamadas desde otro hilo se ejecutan en un greenlet
+    del bucle (no devuelven resultado); en modo threading es fn.
+    """
+    if _hub is None:
+        return fn
+    import gevent
+    hub = _hub
+
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        if _in_event_loop():
+            return fn(*args, **kwargs)
+        hub.loop.run_callback_threadsafe(gevent.spawn, functools.partial(fn, *args, **kwargs))
+    return call
+
+
+class FrameBroadcaster:
+    """Un productor por stream y cualquier número de espectadores.
+
+    `source` es una función generadora que produce los fragmentos
+    multipart/x-mixed-replace (como core_logic.generate_pose_frames).  El
+    primer espectador arranca un hilo que la recorre y publica el último
+    fragmento; cada espectador envía el más reciente que no haya enviado ya,
+    así que uno lento se salta frames en lugar de frenar la captura.  El hilo
+    termina cuando termina la fuente (al detener el monitoreo), aunque no
+    quede nadie mirando.
+    """
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self._lock = threading.Lock()
+        self._running = False
+        self._frame = None
+        self._seq = 0
+        self._viewers = 0
+        self._frames = 0
+        self._started_at = None
+
+    def _produce(self):
+        st_logger.info(f"Stream {self.name}: captura iniciada.")
+        try:
+            for chunk in self.source():
+                with self._lock:
+                    self._frame = chunk
+                    self._seq += 1
+                    self._frames += 1
+        except Exception:
+            st_logger.exception(f"Stream {self.name}: error en la captura.")
+        finally:
+            with self._lock:
+                self._running = False
+                self._frame = None
+            st_logger.info(f"Stream {self.name}: captura detenida.")
+
+    def stream(self):
+        """Generador para Response(): los frames del productor para un espectador."""
+        with self._lock:
+            self._viewers += 1
+            if not self._running:
+                self._running = True
+                self._frame = None
+                self._frames = 0
+                self._started_at = time.monotonic()
+                threading.Thread(target=self._produce, name=f"stream-{self.name}", daemon=True).start()
+        sent = None
+        try:
+            while True:
+                with self._lock:
+                    seq, frame, running = self._seq, self._frame, self._running
+                if frame is not None and seq != sent:
+                    sent = seq
+                    yield frame
+                elif not running:
+                    return
+                else:
+                    sleep(STREAM_POLL_SECONDS)
+        finally:
+            with self._lock:
+                self._viewers -= 1
+
+    def status(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._running and self._started_at else 0
+            return {
+                "name": self.name,
+                "running": self._running,
+                "viewers": self._viewers,
+                "fps": round(self._frames / elapsed, 1) if elapsed else None,
+            }
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """database apuntando a una base vacía en tmp_path, con su propio hilo escritor."""
+    import database
+
+    database.shutdown_writer()
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'test.db'))
+    database.init_db()
+    yield database
+    database.shutdown_writer()
@@ -0,0 +1,33 @@
+import group_formation
+
+_KOLB = ["Activo/Divergente", "Asimilativo", "Convergente", "Acomodador"]
+_VAK = ["Visual", "Auditivo", "Kinestésico"]
+
+
+def _students(count):
+    return [{"id": str(i), "kolb_style": _KOLB[i % len(_KOLB)], "vak_style": _VAK[i % len(_VAK)],
+             "felder_styles": {"Visual/Verbal": "Visual" if i % 2 else "Verbal"}} for i in range(count)]
+
+
+def test_single_group_keeps_everyone_together():
+    students = _students(7)
+    groups, stats = group_formation.form_groups(students, 1, seed=0)
+    assert [len(g) for g in groups] == [7]
+    assert stats['swaps'] == 0 and stats['converged']
+
+
+def test_small_class_by_group_size_forms_one_group(monkeypatch):
+    import core_logic
+
+    # Menos de 1.5 × group_size estudiantes: se redondea a un solo grupo
+    monkeypatch.setattr(core_logic.database, 'get_all_students_with_learning_styles', lambda: _students(5))
+    groups, stats, error = core_logic.form_smart_groups(group_size=4, seed=0)
+    assert error is None
+    assert [len(g) for g in groups] == [5]
+
+
+def test_every_student_is_assigned_once():
+    students = _students(23)
+    groups, stats = group_formation.form_groups(students, 4, seed=1)
+    assert sorted(s['id'] for g in groups for s in g) == sorted(s['id'] for s in students)
+    assert stats['size_max'] - stats['size_min'] <= 1
@@ -0,0 +1,30 @@
+import datetime
+
+
+def _insert(db, key, created_at):
+    db._submit_write(lambda conn: conn.execute("INSERT INTO llm_cache (key, content, created_at) VALUES (?, ?, ?)",
+                                               (key, key, created_at.isoformat()))).result()
+
+
+def test_put_keeps_only_the_newest_entries(db, monkeypatch):
+    monkeypatch.setattr(db, 'LLM_CACHE_MAX_ENTRIES', 3)
+    for i in range(5):
+        assert db.put_llm_cache(f"k{i}", f"v{i}").result()
+    assert [db.get_llm_cache(f"k{i}") for i in range(5)] == [None, None, "v2", "v3", "v4"]
+
+
+def test_put_drops_expired_entries(db):
+    _insert(db, "viejo", datetime.datetime.now() - datetime.timedelta(days=db.LLM_CACHE_MAX_AGE_DAYS + 1))
+    db.put_llm_cache("nuevo", "y").result()
+    assert db.get_llm_cache("viejo") is None
+    assert db.get_llm_cache("nuevo") == "y"
+
+
+def test_init_db_prunes_existing_cache(db, monkeypatch):
+    now = datetime.datetime.now()
+    _insert(db, "viejo", now - datetime.timedelta(days=db.LLM_CACHE_MAX_AGE_DAYS + 1))
+    for i in range(3):
+        _insert(db, f"k{i}", now - datetime.timedelta(minutes=3 - i))
+    monkeypatch.setattr(db, 'LLM_CACHE_MAX_ENTRIES', 2)
+    db.init_db()
+    assert [db.get_llm_cache(k) for k in ("viejo", "k0", "k1", "k2")] == [None, None, "k1", "k2"]
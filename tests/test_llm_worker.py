@@ -0,0 +1,80 @@
+import functools
+import os
+import threading
+
+import llm_worker
+
+
+def _echo_worker(conn):
+    """Trabajador de prueba: devuelve el texto en mayúsculas."""
+    while True:
+        msg = conn.recv()
+        if msg[0] == 'task':
+            conn.send(('done', msg[1], {"success": True, "enhanced_text": msg[2].upper()}))
+
+
+def _crash_once_worker(marker, send_delta, conn):
+    """Como _echo_worker, pero el primer proceso muere al recibir su primera tarea."""
+    while True:
+        msg = conn.recv()
+        if msg[0] != 'task':
+            continue
+        if not os.path.exists(marker):
+            open(marker, 'w').close()
+            if send_delta:
+                conn.send(('delta', msg[1], "parcial", 1, 2))
+            os._exit(1)
+        conn.send(('done', msg[1], {"success": True, "enhanced_text": msg[2].upper()}))
+
+
+def _enhance(pool, request_id, text, deltas=None):
+    done = threading.Event()
+    results = []
+    pool.submit(request_id, text, on_delta=(lambda *d: deltas.append(d)) if deltas is not None else None,
+                on_done=lambda result: (results.append(result), done.set()))
+    assert done.wait(60)
+    return results[0]
+
+
+def _stop(pool):
+    for slot in pool._slots:
+        slot['process'].kill()
+
+
+def test_idle_worker_death_is_respawned_before_the_next_request():
+    pool = llm_worker.LLMWorkerPool(workers=1, target=_echo_worker)
+    pool.start()
+    try:
+        assert _enhance(pool, 1, "hola")['enhanced_text'] == "HOLA"
+        process = pool._slots[0]['process']
+        process.kill()
+        process.join()
+        assert _enhance(pool, 2, "adiós")['enhanced_text'] == "ADIÓS"
+        worker = pool.status()['workers'][0]
+        assert worker['restarts'] == 1 and worker['pid'] != process.pid
+    finally:
+        _stop(pool)
+
+
+def test_request_is_retried_once_when_the_worker_dies_before_sending_text(tmp_path):
+    pool = llm_worker.LLMWorkerPool(workers=1, target=functools.partial(_crash_once_worker, str(tmp_path / "marker"), False))
+    pool.start()
+    try:
+        assert _enhance(pool, 1, "hola") == {"success": True, "enhanced_text": "HOLA"}
+        assert pool.status()['workers'][0]['restarts'] == 1
+    finally:
+        _stop(pool)
+
+
+def test_request_is_not_retried_after_text_was_sent(tmp_path):
+    pool = llm_worker.LLMWorkerPool(workers=1, target=functools.partial(_crash_once_worker, str(tmp_path / "marker"), True))
+    pool.start()
+    try:
+        deltas = []
+        result = _enhance(pool, 1, "hola", deltas)
+        assert not result['success']
+        assert deltas == [("parcial", 1, 2)]
+        # El proceso nuevo atiende las peticiones siguientes
+        assert _enhance(pool, 2, "otra")['enhanced_text'] == "OTRA"
+    finally:
+        _stop(pool)
@@ -0,0 +1,122 @@
+# transcription_jobs.py
+import threading
+import collections
+import time
+import database
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+tj_logger = logging.getLogger(__name__)
+
+# Número de transcripciones que se ejecutan a la vez. Cada una usa todos los
+# núcleos disponibles, así que más de una suele empeorar el tiempo total.
+TRANSCRIPTION_WORKERS = 1
+# Intervalo mínimo entre actualizaciones de progreso persistidas/emitidas
+PROGRESS_REPORT_SECONDS = 1.0
+
+
+class TranscriptionJobQueue:
+    """Cola de trabajos de transcripción con un número fijo de hilos trabajadores.
+
+    El estado de cada trabajo vive en la tabla transcription_jobs, por lo que
+    los trabajos pendientes sobreviven a un reinicio.  `handler(job, progress)`
+    hace el trabajo real y devuelve el id de la transcripción creada;
+    `progress(fraccion, mensaje=None)` informa el avance.
+    """
+
+    def __init__(self, handler, workers=TRANSCRIPTION_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._threads = []
+
+    def add_listener(self, fn):
+        """Registra fn(job_dict) para cada cambio de estado o progreso (p. ej. para SocketIO)."""
+        self._listeners.append(fn)
+
+    def _notify(self, job_id, **fields):
+        database.update_transcription_job(job_id, **fields)
+        payload = dict(fields, id=job_id, position=self.position(job_id))
+        for fn in self._listeners:
+            try:
+                fn(payload)
+            except Exception as e:
+                tj_logger.warning(f"Error notificando trabajo {job_id}: {e}")
+
+    def start(self):
+        """Arranca los trabajadores y reencola los trabajos que quedaron sin terminar."""
+        if self._threads:
+            return
+        for job in database.get_unfinished_transcription_jobs():
+            if job['id'] in self._pending:
+                continue
+            if job['status'] == 'running':
+                database.update_transcription_job(job['id'], status='queued', progress=0, message="Reanudado tras reinicio.")
+            self._enqueue(job['id'])
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"transcription-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _enqueue(self, job_id):
+        with self._cond:
+            self._pending.append(job_id)
+            self._cond.notify()
+
+    def submit(self, wav_path, model_size, class_name, start_timestamp, duration_seconds):
+        """Persiste un trabajo nuevo y lo encola. Devuelve el id del trabajo (None si falla)."""
+        job_id = database.create_transcription_job(wav_path, model_size, class_name, start_timestamp, duration_seconds)
+        if job_id is None:
+            return None
+        self._enqueue(job_id)
+        return job_id
+
+    def position(self, job_id):
+        """Posición en la cola (1 = el siguiente) o 0 si ya no está pendiente."""
+        with self._cond:
+            try:
+                return self._pending.index(job_id) + 1
+            except ValueError:
+                return 0
+
+    def get_status(self, job_id):
+        job = database.get_transcription_job(job_id)
+        if job:
+            job['position'] = self.position(job_id)
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job_id = self._pending.popleft()
+            job = database.get_transcription_job(job_id)
+            if not job or job['status'] not in ('queued', 'running'):
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job['id']
+        self._notify(job_id, status='running', progress=0.0, message="Transcribiendo...")
+        last_report = [0.0]
+
+        def progress(fraction, message=None):
+            now = time.monotonic()
+            if now - last_report[0] >= PROGRESS_REPORT_SECONDS or message:
+                last_report[0] = now
+                fields = {'progress': round(fraction, 3)}
+                if message:
+                    fields['message'] = message
+                self._notify(job_id, **fields)
+
+        started = time.monotonic()
+        try:
+            transcription_id = self.handler(job, progress)
+            self._notify(job_id, status='done', progress=1.0, transcription_id=transcription_id,
+                         message=f"Transcripción completada en {time.monotonic() - started:.1f} s.")
+        except Exception as e:
+            tj_logger.error(f"Error en el trabajo de transcripción {job_id}: {e}")
+            self._notify(job_id, status='error', message=f"Error en transcripción: {e}")
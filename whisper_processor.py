@@ -0,0 +1,702 @@
+# whisper_processor.py
+import atexit
+import bisect
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import contextlib
+import importlib
+import queue
+import wave
+from collections import OrderedDict
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+wp_logger = logging.getLogger(__name__)
+
+# Tamaño que se precarga en segundo plano al arrancar el servidor (None = no precargar)
+WHISPER_DEFAULT_MODEL = "base"
+# Memoria máxima para los pesos de modelos residentes. Al superarla se
+# descartan los modelos usados hace más tiempo (LRU); el modelo recién pedido
+# siempre se conserva aunque por sí solo supere el presupuesto.
+WHISPER_MEMORY_BUDGET_MB = 2048
+
+
+def _model_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def _release_gpu_memory():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+class WhisperModelRegistry:
+    """Mantiene modelos Whisper cargados en memoria, indexados por tamaño.
+
+    Cada modelo tiene además su propio lock: `transcribe` instala hooks de
+    caché en el modelo durante la decodificación, así que dos transcripciones
+    no deben usar la misma instancia a la vez.
+    """
+
+    def __init__(self, memory_budget_mb=WHISPER_MEMORY_BUDGET_MB):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._models = OrderedDict()  # size -> (model, bytes, lock)
+        self._loading = {}            # size -> threading.Event
+        self._lock = threading.Lock()
+
+    def _get_entry(self, size):
+        while True:
+            with self._lock:
+                if size in self._models:
+                    self._models.move_to_end(size)
+                    return self._models[size]
+                event = self._loading.get(size)
+                owner = event is None
+                if owner:
+                    event = self._loading[size] = threading.Event()
+            if not owner:
+                # Otro hilo ya lo está cargando: esperar y volver a mirar
+                event.wait()
+                continue
+            try:
+                wp_logger.info(f"Cargando modelo Whisper '{size}'...")
+                model = _whisper().load_model(size)
+                entry = (model, _model_bytes(model), threading.Lock())
+                with self._lock:
+                    self._models[size] = entry
+                    self._evict(keep=size)
+                wp_logger.info(f"✅ Modelo Whisper '{size}' residente ({entry[1] / 2**20:.0f} MB).")
+                return entry
+            finally:
+                with self._lock:
+                    self._loading.pop(size).set()
+
+    def _evict(self, keep):
+        evicted = False
+        while sum(e[1] for e in self._models.values()) > self.memory_budget and len(self._models) > 1:
+            oldest = next(s for s in self._models if s != keep)
+            self._models.pop(oldest)
+            evicted = True
+            wp_logger.info(f"Modelo Whisper '{oldest}' descartado por presupuesto de memoria.")
+        if evicted:
+            _release_gpu_memory()
+
+    def get(self, size):
+        """Devuelve el modelo del tamaño pedido, cargándolo si no está residente."""
+        return self._get_entry(size)[0]
+
+    @contextlib.contextmanager
+    def acquire(self, size):
+        """Context manager que entrega el modelo con uso exclusivo mientras dure el bloque."""
+        model, _, lock = self._get_entry(size)
+        with lock:
+            yield model
+
+    def preload(self, size):
+        """Carga el modelo en un hilo en segundo plano."""
+        def _load():
+            try:
+                self.get(size)
+            except Exception as e:
+                wp_logger.warning(f"No se pudo precargar el modelo Whisper '{size}': {e}")
+        threading.Thread(target=_load, name=f"whisper-preload-{size}", daemon=True).start()
+
+    def loaded_models(self):
+        """Lista de (tamaño, MB) de los modelos residentes, del menos al más reciente."""
+        with self._lock:
+            return [(size, round(e[1] / 2**20, 1)) for size, e in self._models.items()]
+
+
+MODEL_REGISTRY = WhisperModelRegistry()
+
+
+# --- Progreso de transcripción ---
+#
+# whisper.transcribe no acepta un callback de progreso, pero avanza una barra
+# tqdm por cada ventana decodificada.  Sustituimos esa barra por una que
+# reenvía el avance al callback registrado en el hilo que llama a transcribe(),
+# lo que permite varias transcripciones simultáneas con su propio progreso.
+
+_progress_local = threading.local()
+
+
+class _ProgressBar:
+    def __init__(self, *args, total=None, **kwargs):
+        self.total = total or 0
+        self.n = 0
+        self._callback = getattr(_progress_local, 'callback', None)
+
+    def update(self, n=1):
+        self.n += n
+        if self._callback and self.total:
+            self._callback(min(1.0, self.n / self.total))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _TqdmShim:
+    tqdm = _ProgressBar
+
+
+_whisper_module = None
+
+
+def _whisper():
+    """El paquete whisper, importado en la primera llamada con el seguimiento de progreso instalado.
+
+    No se importa con este módulo porque arrastra torch, y los procesos hijos
+    creados con 'spawn' (pool de Whisper, proceso del LLM) importan este
+    módulo al reejecutar app.py.
+    """
+    global _whisper_module
+    if _whisper_module is None:
+        import whisper
+        try:
+            # whisper/__init__.py hace "from .transcribe import transcribe", así que el
+            # atributo whisper.transcribe es la función: el módulo se pide por nombre
+            importlib.import_module('whisper.transcribe').tqdm = _TqdmShim
+        except Exception as e:
+            wp_logger.warning(f"No se pudo instalar el seguimiento de progreso de Whisper: {e}")
+        _whisper_module = whisper
+    return _whisper_module
+
+
+def transcribe(model, audio, progress_callback=None, **kwargs):
+    """Ejecuta model.transcribe informando el avance (0-1) a progress_callback."""
+    _progress_local.callback = progress_callback
+    try:
+        return model.transcribe(audio, **kwargs)
+    finally:
+        _progress_local.callback = None
+
+
+# --- Transcripción en vivo ---
+#
+# Durante la grabación el audio se corta en ventanas de LIVE_WINDOW_SECONDS
+# que se solapan LIVE_OVERLAP_SECONDS.  Cada ventana se transcribe en un hilo
+# aparte y sus segmentos se cosen al texto acumulado: de cada ventana solo se
+# conservan los segmentos cuyo punto medio cae fuera de la mitad del solape
+# que ya cubre la ventana vecina, y se recortan las palabras repetidas en la
+# frontera.  Al detener la grabación solo queda pendiente la última ventana.
+
+WHISPER_SAMPLE_RATE = 16000
+LIVE_WINDOW_SECONDS = 30.0
+LIVE_OVERLAP_SECONDS = 5.0
+# Ventanas máximas en espera.  Si la transcripción va más lenta que la
+# grabación (solo CPU, modelo grande) se descarta la más antigua en lugar de
+# acumular audio sin límite; al detener se transcribe entonces la grabación
+# completa (ver dropped_windows).
+LIVE_MAX_PENDING_WINDOWS = 4
+# Palabras máximas que se comparan para eliminar repeticiones en la frontera
+OVERLAP_MATCH_WORDS = 12
+
+
+def pcm16_to_float32(data, rate):
+    """Convierte PCM int16 mono a float32 en [-1, 1] a 16 kHz, como lo espera Whisper."""
+    audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+    if rate != WHISPER_SAMPLE_RATE and audio.size:
+        n_out = int(round(audio.size * WHISPER_SAMPLE_RATE / rate))
+        positions = np.arange(n_out, dtype=np.float64) * (rate / WHISPER_SAMPLE_RATE)
+        audio = np.interp(positions, np.arange(audio.size), audio).astype(np.float32)
+    return audio
+
+
+# Bloque de lectura al cargar WAV (en frames de origen)
+LOAD_BLOCK_FRAMES = 1 << 20
+
+
+def load_audio(path):
+    """Carga un archivo como float32 mono a 16 kHz listo para model.transcribe().
+
+    Los WAV PCM de 16 bits (lo que graba el sistema) se leen y, si hace falta,
+    se remuestrean en memoria por bloques con interpolación lineal.  Cualquier
+    otro formato (grabaciones antiguas u otros códecs) se decodifica con
+    whisper.load_audio, que usa ffmpeg.
+    """
+    try:
+        wf = wave.open(path, 'rb')
+    except (wave.Error, EOFError):
+        return _whisper().load_audio(path)
+    with wf:
+        if wf.getsampwidth() != 2:
+            return _whisper().load_audio(path)
+        rate, channels, n_frames = wf.getframerate(), wf.getnchannels(), wf.getnframes()
+        ratio = rate / WHISPER_SAMPLE_RATE
+        out = np.empty(int(n_frames / ratio) + 1, dtype=np.float32)
+        n_out, consumed, carry = 0, 0, None
+        while True:
+            data = wf.readframes(LOAD_BLOCK_FRAMES)
+            if not data:
+                break
+            x = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            if channels > 1:
+                x = x.reshape(-1, channels).mean(axis=1)
+            if rate == WHISPER_SAMPLE_RATE:
+                out[n_out:n_out + x.size] = x
+                n_out += x.size
+                continue
+            # Se antepone la última muestra del bloque anterior para interpolar en la frontera
+            base = consumed - (1 if carry is not None else 0)
+            consumed += x.size
+            if carry is not None:
+                x = np.concatenate(([carry], x))
+            end = min(out.size, int((base + x.size - 1) / ratio) + 1)
+            if end > n_out:
+                positions = np.arange(n_out, end) * ratio
+                out[n_out:end] = np.interp(positions, base + np.arange(x.size), x)
+                n_out = end
+            carry = x[-1]
+        return out[:n_out]
+
+
+# --- Detección de voz (VAD) ---
+#
+# En clase hay tramos largos de silencio o ruido de fondo (trabajo en grupo,
+# ejercicios) que Whisper procesa igual que la voz.  detect_speech() calcula
+# la energía por tramas de VAD_FRAME_SECONDS, estima el piso de ruido de la
+# grabación (percentil bajo) y marca como voz lo que lo supera en
+# VAD_THRESHOLD_DB.  Las regiones de voz se unen con un pequeño silencio
+# intermedio, se transcribe solo ese audio compacto y las marcas de tiempo se
+# devuelven a la línea de tiempo original.
+
+VAD_FRAME_SECONDS = 0.03
+VAD_THRESHOLD_DB = 12.0
+# Nivel absoluto mínimo (dBFS) para considerar voz, aunque el piso de ruido sea muy bajo
+VAD_MIN_LEVEL_DB = -50.0
+VAD_NOISE_PERCENTILE = 10
+# Silencios más cortos que esto no se recortan (pausas entre frases)
+VAD_MIN_SILENCE_SECONDS = 1.5
+# Regiones más cortas que esto se descartan (golpes, clics)
+VAD_MIN_SPEECH_SECONDS = 0.25
+# Margen que se conserva alrededor de cada región para no cortar palabras
+VAD_PADDING_SECONDS = 0.3
+# Silencio intercalado entre regiones al unirlas
+VAD_JOIN_GAP_SECONDS = 0.3
+
+
+def detect_speech(audio, rate=WHISPER_SAMPLE_RATE):
+    """Devuelve las regiones con voz de `audio` como lista de (inicio, fin) en segundos."""
+    frame = int(VAD_FRAME_SECONDS * rate)
+    n_frames = audio.size // frame
+    if n_frames == 0:
+        return []
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-10)
+    threshold = max(np.percentile(energy_db, VAD_NOISE_PERCENTILE) + VAD_THRESHOLD_DB, VAD_MIN_LEVEL_DB)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (energy_db > threshold).astype(np.int8), [0]))))
+    frame_seconds = frame / rate
+    runs = []
+    for start, end in zip(edges[::2] * frame_seconds, edges[1::2] * frame_seconds):
+        if runs and start - runs[-1][1] < VAD_MIN_SILENCE_SECONDS:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    duration = audio.size / rate
+    regions = []
+    for start, end in runs:
+        if end - start < VAD_MIN_SPEECH_SECONDS:
+            continue
+        start, end = max(0.0, start - VAD_PADDING_SECONDS), min(duration, end + VAD_PADDING_SECONDS)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def gate_silence(audio, regions, rate=WHISPER_SAMPLE_RATE):
+    """Une las regiones de voz en un solo array.
+
+    Devuelve (audio_compacto, timeline), donde timeline es una lista de
+    (inicio_compacto, inicio_original, duración) para restore_timestamp().
+    """
+    gap = np.zeros(int(VAD_JOIN_GAP_SECONDS * rate), dtype=np.float32)
+    pieces, timeline, position = [], [], 0
+    for start, end in regions:
+        if pieces:
+            pieces.append(gap)
+            position += gap.size
+        chunk = audio[int(start * rate):int(end * rate)]
+        timeline.append((position / rate, start, chunk.size / rate))
+        pieces.append(chunk)
+        position += chunk.size
+    compact = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+    return compact, timeline
+
+
+def restore_timestamp(t, timeline):
+    """Convierte un instante del audio compacto al instante original."""
+    i = max(0, bisect.bisect_right([entry[0] for entry in timeline], t) - 1)
+    compact_start, original_start, length = timeline[i]
+    return original_start + min(max(t - compact_start, 0.0), length)
+
+
+def _restore_segments(segments, timeline):
+    return [dict(seg, start=restore_timestamp(seg['start'], timeline), end=restore_timestamp(seg['end'], timeline))
+            for seg in segments]
+
+
+def transcribe_speech(model, audio, progress_callback=None, regions=None, **kwargs):
+    """Como transcribe(), pero solo sobre las regiones con voz.
+
+    Los segmentos conservan las marcas de tiempo del audio original y el
+    resultado incluye 'speech_seconds' y 'skipped_seconds'.  `regions` permite
+    reutilizar una detección ya hecha.
+    """
+    duration = audio.size / WHISPER_SAMPLE_RATE
+    regions = detect_speech(audio) if regions is None else regions
+    speech_seconds = sum(end - start for start, end in regions)
+    if not regions:
+        result = {'text': '', 'segments': []}
+    else:
+        compact, timeline = gate_silence(audio, regions)
+        result = transcribe(model, compact, progress_callback=progress_callback, **kwargs)
+        result['segments'] = _restore_segments(result.get('segments', []), timeline)
+    result['speech_seconds'] = round(speech_seconds, 2)
+    result['skipped_seconds'] = round(duration - speech_seconds, 2)
+    wp_logger.info(f"VAD: {result['skipped_seconds']:.0f} s de {duration:.0f} s sin voz omitidos.")
+    return result
+
+
+def trim_repeated_prefix(previous_text, text, max_words=OVERLAP_MATCH_WORDS):
+    """Quita de `text` las palabras iniciales que repiten el final de `previous_text`."""
+    prev = previous_text.split()[-max_words:]
+    words = text.split()
+    norm = lambda w: w.strip('.,;:¿?¡!"\'').lower()
+    for n in range(min(len(prev), len(words)), 0, -1):
+        if [norm(w) for w in prev[-n:]] == [norm(w) for w in words[:n]]:
+            return " ".join(words[n:])
+    return text
+
+
+class LiveTranscriber:
+    """Transcribe un flujo PCM int16 por ventanas solapadas mientras se graba.
+
+    feed() recibe bloques desde el hilo escritor, finish() encola la última
+    ventana, y wait() espera a que no quede nada por procesar.  Si hay más de
+    LIVE_MAX_PENDING_WINDOWS ventanas en espera se descarta la más antigua y
+    dropped_windows lo indica: el texto en vivo queda incompleto.  on_segments,
+    si se indica, recibe cada lote de segmentos nuevos
+    ({'start', 'end', 'text'} en segundos absolutos desde el inicio).  Las
+    ventanas pasan por el VAD y las que no tienen voz no se transcriben.
+    """
+
+    def __init__(self, model_size, rate, on_segments=None, language="es",
+                 window_seconds=LIVE_WINDOW_SECONDS, overlap_seconds=LIVE_OVERLAP_SECONDS):
+        self.model_size = model_size
+        self.rate = rate
+        self.language = language
+        self.on_segments = on_segments
+        self.segments = []
+        self.failed = None
+        self.dropped_windows = 0
+        # Segundos con voz y sin voz, contando de cada ventana solo su parte propia (sin solape)
+        self.speech_seconds = 0.0
+        self.skipped_seconds = 0.0
+        self._bytes_per_second = rate * 2
+        self._window_bytes = int(window_seconds * rate) * 2
+        self._overlap_bytes = int(overlap_seconds * rate) * 2
+        self._overlap_seconds = overlap_seconds
+        self._buffer = bytearray()
+        self._buffer_start = 0.0
+        self._windows = queue.Queue(maxsize=LIVE_MAX_PENDING_WINDOWS)
+        self._submitted = 0
+        self._processed = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="whisper-live", daemon=True)
+        self._thread.start()
+
+    def feed(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self._window_bytes:
+            self._submit(bytes(self._buffer[:self._window_bytes]), final=False)
+            advance = self._window_bytes - self._overlap_bytes
+            del self._buffer[:advance]
+            self._buffer_start += advance / self._bytes_per_second
+
+    def _submit(self, data, final):
+        self._submitted += 1
+        item = (self._buffer_start, data, final)
+        while True:
+            try:
+                self._windows.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                oldest_start, _, _ = self._windows.get_nowait()
+            except queue.Empty:
+                continue
+            self.dropped_windows += 1
+            wp_logger.warning(f"Transcripción en vivo atrasada ({self.pending_windows()} ventanas en espera): "
+                              f"se descarta la ventana de {oldest_start:.0f} s; al detener se transcribirá la grabación completa.")
+
+    def finish(self):
+        """Encola el audio restante como ventana final."""
+        if self._buffer:
+            self._submit(bytes(self._buffer), final=True)
+            self._buffer = bytearray()
+        self._windows.put(None)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def progress(self):
+        return (self._processed + self.dropped_windows) / self._submitted if self._submitted else 0.0
+
+    def pending_windows(self):
+        return self._submitted - self._processed - self.dropped_windows
+
+    def text(self):
+        return " ".join(seg['text'] for seg in self.segments).strip()
+
+    def _run(self):
+        while True:
+            item = self._windows.get()
+            if item is None:
+                break
+            if self.failed:
+                continue
+            start, data, final = item
+            try:
+                audio = pcm16_to_float32(data, self.rate)
+                duration = len(data) / self._bytes_per_second
+                regions = detect_speech(audio)
+                self._account(start, duration, final, regions)
+                segments = []
+                if regions:
+                    compact, timeline = gate_silence(audio, regions)
+                    with acquire_model(self.model_size) as model:
+                        result = model.transcribe(compact, language=self.language, condition_on_previous_text=False)
+                    segments = _restore_segments(result.get('segments', []), timeline)
+                kept = self._stitch(start, duration, segments, final)
+                self.segments.extend(kept)
+                if kept and self.on_segments:
+                    self.on_segments(kept)
+            except Exception as e:
+                wp_logger.error(f"Error en la transcripción en vivo: {e}")
+                self.failed = e
+            self._processed += 1
+        self._done.set()
+
+    def _owned_span(self, start, duration, final):
+        """Intervalo absoluto del que esta ventana es responsable (el resto lo cubre la vecina)."""
+        lo = start + self._overlap_seconds / 2 if start > 0 else 0.0
+        hi = float('inf') if final else start + duration - self._overlap_seconds / 2
+        return lo, hi
+
+    def _account(self, start, duration, final, regions):
+        lo, hi = self._owned_span(start, duration, final)
+        lo, hi = lo - start, min(hi - start, duration)
+        speech = sum(max(0.0, min(end, hi) - max(begin, lo)) for begin, end in regions)
+        self.speech_seconds += speech
+        self.skipped_seconds += max(0.0, hi - lo - speech)
+
+    def _stitch(self, start, duration, segments, final):
+        lo, hi = self._owned_span(start, duration, final)
+        previous = self.segments[-1]['text'] if self.segments else ""
+        kept = []
+        for seg in segments:
+            seg_start, seg_end = start + seg['start'], start + seg['end']
+            if not lo <= (seg_start + seg_end) / 2 < hi:
+                continue
+            text = seg['text'].strip()
+            if not kept and previous:
+                text = trim_repeated_prefix(previous, text)
+            if text:
+                kept.append({'start': round(seg_start, 2), 'end': round(seg_end, 2), 'text': text})
+        return kept
+
+
+def acquire_model(size):
+    return MODEL_REGISTRY.acquire(size)
+
+
+def preload_default_model():
+    if WHISPER_DEFAULT_MODEL:
+        MODEL_REGISTRY.preload(WHISPER_DEFAULT_MODEL)
+
+
+# --- Transcripción paralela de grabaciones largas ---
+#
+# model.transcribe recorre la grabación de forma secuencial sobre un único
+# modelo.  Para grabaciones largas, las regiones de voz se agrupan en tramos
+# que terminan en un silencio y se reparten entre procesos, cada uno con su
+# propio modelo.  Los resultados se unen en orden y con las marcas de tiempo
+# originales.
+
+# Procesos de transcripción (0 = automático: núcleos / WHISPER_THREADS_PER_WORKER
+# en CPU, 1 con GPU).  Con 1 la transcripción es secuencial.
+WHISPER_PROCESS_WORKERS = 0
+WHISPER_THREADS_PER_WORKER = 4
+# Grabaciones con menos voz que esto se transcriben en el proceso principal
+PARALLEL_MIN_SECONDS = 600
+# Duración de voz máxima y mínima de cada tramo
+PARALLEL_CHUNK_SECONDS = 300
+PARALLEL_MIN_CHUNK_SECONDS = 60
+# Margen alrededor del punto de corte en el que se busca la trama más silenciosa
+PARALLEL_CUT_SEARCH_SECONDS = 10
+
+
+def parallel_workers():
+    if WHISPER_PROCESS_WORKERS:
+        return WHISPER_PROCESS_WORKERS
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return 1
+    except Exception:
+        pass
+    return max(1, (os.cpu_count() or 1) // WHISPER_THREADS_PER_WORKER)
+
+
+def _quietest_point(audio, start, end, rate=WHISPER_SAMPLE_RATE):
+    """Instante (s) de la trama de menor energía entre start y end."""
+    frame = int(VAD_FRAME_SECONDS * rate)
+    lo, hi = int(start * rate), int(end * rate)
+    n_frames = (hi - lo) // frame
+    if n_frames < 1:
+        return (start + end) / 2
+    energy = np.mean(np.square(audio[lo:lo + n_frames * frame].reshape(n_frames, frame)), axis=1)
+    return (lo + (int(np.argmin(energy)) + 0.5) * frame) / rate
+
+
+def split_at_silence(audio, regions, chunk_seconds, rate=WHISPER_SAMPLE_RATE):
+    """Agrupa las regiones de voz en tramos de hasta ~chunk_seconds de voz.
+
+    Los tramos se separan en los silencios entre regiones; una región más
+    larga que 1.5 veces el tramo se corta en su trama más silenciosa.
+    """
+    pieces = []
+    for start, end in regions:
+        while end - start > 1.5 * chunk_seconds:
+            target = start + chunk_seconds
+            cut = _quietest_point(audio, target - PARALLEL_CUT_SEARCH_SECONDS, target + PARALLEL_CUT_SEARCH_SECONDS, rate)
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+    chunks, length = [[]], 0.0
+    for start, end in pieces:
+        if chunks[-1] and length + (end - start) > chunk_seconds:
+            chunks.append([])
+            length = 0.0
+        chunks[-1].append((start, end))
+        length += end - start
+    return [chunk for chunk in chunks if chunk]
+
+
+_worker_model = None
+
+
+def _pool_init(model_size, threads):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    _worker_model = _whisper().load_model(model_size)
+
+
+def _pool_transcribe(audio, kwargs):
+    result = _worker_model.transcribe(audio, **kwargs)
+    return result['text'], [{'start': seg['start'], 'end': seg['end'], 'text': seg['text']} for seg in result.get('segments', [])]
+
+
+class ParallelTranscriber:
+    """Pool de procesos con un modelo Whisper cargado en cada uno.
+
+    El pool se conserva entre transcripciones y se recrea si cambia el
+    tamaño de modelo o el número de procesos.  Se usa 'spawn' porque el
+    proceso principal ya tiene hilos (y quizá CUDA) inicializados.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._key = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self, model_size, workers):
+        if self._key != (model_size, workers):
+            self.shutdown()
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_pool_init, initargs=(model_size, threads))
+            self._key = (model_size, workers)
+            wp_logger.info(f"Pool de {workers} procesos Whisper '{model_size}' creado ({threads} hilos cada uno).")
+        return self._pool
+
+    def transcribe(self, model_size, audio, regions, workers, progress_callback=None, **kwargs):
+        speech = sum(end - start for start, end in regions)
+        chunk_seconds = min(PARALLEL_CHUNK_SECONDS, max(PARALLEL_MIN_CHUNK_SECONDS, speech / (2 * workers)))
+        chunks = split_at_silence(audio, regions, chunk_seconds)
+        with self._lock:
+            pool = self._get_pool(model_size, workers)
+            futures = {}
+            for index, chunk in enumerate(chunks):
+                compact, timeline = gate_silence(audio, chunk)
+                futures[pool.submit(_pool_transcribe, compact, kwargs)] = (index, timeline, compact.size)
+            total = sum(size for _, _, size in futures.values())
+            done, results = 0, [None] * len(chunks)
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    index, timeline, size = futures[future]
+                    text, segments = future.result()
+                    results[index] = (text, _restore_segments(segments, timeline))
+                    done += size
+                    if progress_callback:
+                        progress_callback(done / total)
+            except BrokenProcessPool:
+                # Un proceso murió (p. ej. sin memoria): descartar el pool para que se recree
+                self.shutdown()
+                raise
+        return {
+            'text': " ".join(text.strip() for text, _ in results if text.strip()),
+            'segments': [seg for _, segments in results for seg in segments],
+        }
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._key = None
+
+
+PARALLEL_TRANSCRIBER = ParallelTranscriber()
+atexit.register(PARALLEL_TRANSCRIBER.shutdown)
+
+
+def transcribe_recording(model_size, audio, progress_callback=None, workers=None, **kwargs):
+    """Transcribe una grabación completa saltando el silencio.
+
+    Si hay suficiente voz y más de un proceso disponible, los tramos se
+    transcriben en paralelo; si no, se usa el modelo residente del registro.
+    El resultado tiene el mismo formato que transcribe_speech().
+    """
+    workers = workers or parallel_workers()
+    regions = detect_speech(audio)
+    speech_seconds = sum(end - start for start, end in regions)
+    if workers <= 1 or speech_seconds < PARALLEL_MIN_SECONDS:
+        with acquire_model(model_size) as model:
+            return transcribe_speech(model, audio, progress_callback=progress_callback, regions=regions, **kwargs)
+    result = PARALLEL_TRANSCRIBER.transcribe(model_size, audio, regions, workers, progress_callback=progress_callback, **kwargs)
+    result['speech_seconds'] = round(speech_seconds, 2)
+    result['skipped_seconds'] = round(audio.size / WHISPER_SAMPLE_RATE - speech_seconds, 2)
+    wp_logger.info(f"Transcripción paralela: {speech_seconds:.0f} s de voz en {workers} procesos.")
+    return result